@@ -62,15 +62,20 @@ USER_AGENTS  = [
 ]
 
 
-# Define the pricing for models without Batch API
+# Per-token prices for every model, the one table all cost figures come from (see metering.py).
+# "batch_input"/"batch_output" are the Batch API rates (50% of the regular ones), for models that have it.
 PRICING = {
     "gpt-4o-mini": {
         "input": 0.150 / 1_000_000,  # $0.150 per 1M input tokens
         "output": 0.600 / 1_000_000, # $0.600 per 1M output tokens
+        "batch_input": 0.075 / 1_000_000,
+        "batch_output": 0.300 / 1_000_000,
     },
     "gpt-4o-2024-08-06": {
         "input": 2.5 / 1_000_000,  # $2.5 per 1M input tokens
         "output": 10 / 1_000_000, # $10 per 1M output tokens
+        "batch_input": 1.25 / 1_000_000,
+        "batch_output": 5 / 1_000_000,
     },
     "gemini-1.5-flash": {
         "input": 0.075 / 1_000_000,  # $0.075 per 1M input tokens
@@ -98,15 +103,191 @@ HEADLESS_OPTIONS = ["--disable-gpu", "--disable-dev-shm-usage","--window-size=19
 
 
 HEADLESS_OPTIONS_DOCKER = ["--headless=new","--no-sandbox","--disable-gpu", "--disable-dev-shm-usage","--disable-software-rasterizer","--disable-setuid-sandbox","--remote-debugging-port=9222","--disable-search-engine-choice-screen"]
+# Network blocking profiles for headless Chrome (see resource_blocking.py).
+# resource_types are blocked by file extension, url_patterns use DevTools wildcards.
+AD_AND_ANALYTICS_PATTERNS = [
+    "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*", "*adservice.google.*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*amazon-adsystem.com*", "*facebook.net*",
+    "*connect.facebook.com*", "*hotjar.com*", "*scorecardresearch.com*", "*criteo.*", "*taboola.com*",
+    "*outbrain.com*", "*nr-data.net*", "*newrelic.com*", "*segment.io*", "*optimizely.com*",
+    "*clarity.ms*", "*quantserve.com*", "*adnxs.com*", "*bing.com/bat*",
+]
+
+BLOCKING_PROFILES = {
+    "none": {"resource_types": [], "url_patterns": []},
+    # Listing extraction only needs the DOM: drop images, media, fonts, ads and trackers
+    "listing": {"resource_types": ["image", "media", "font"], "url_patterns": AD_AND_ANALYTICS_PATTERNS},
+    # Also drop stylesheets; fastest, but breaks sites whose lazy loading depends on layout
+    "text": {"resource_types": ["image", "media", "font", "stylesheet"], "url_patterns": AD_AND_ANALYTICS_PATTERNS},
+}
+DEFAULT_BLOCKING_PROFILE = "listing"
+
 #in case you don't need to open the website
 ##HEADLESS_OPTIONS=HEADLESS_OPTIONS+[ "--headless=new"]
 
-#number of scrolls
+#number of scrolls in a row that bring no new content before the scroll engine stops
 NUMBER_SCROLL=2
 
+# Adaptive scrolling settings (see scroll_engine.py)
+SCROLL_MAX_SECONDS = 20         # total time budget for scrolling one page
+SCROLL_MAX_STEPS = 30           # hard cap on scrolls per page
+SCROLL_QUIET_MS = 400           # DOM and network must be quiet this long after a scroll
+SCROLL_SETTLE_TIMEOUT_MS = 4000 # stop waiting for quiet after this long
+SCROLL_PROFILES_FILE = "scroll_profiles.json"  # learned per-domain scroll settings
+
+# Multi-URL scrape pipeline settings (see pipeline.py)
+PIPELINE_FETCH_WORKERS = 2      # keep in line with DRIVER_POOL_SIZE
+PIPELINE_CONVERT_WORKERS = 2
+PIPELINE_EXTRACT_WORKERS = 4    # concurrent LLM calls
+PIPELINE_PERSIST_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 8         # pages buffered between two stages
+
+# Chrome WebDriver pool settings (see driver_pool.py)
+DRIVER_POOL_SIZE = 2            # number of warm headless drivers kept alive
+DRIVER_MAX_PAGES = 50           # recycle a driver after this many pages
+DRIVER_MAX_RSS_MB = 1500        # recycle a driver when Chrome uses more memory than this
+DRIVER_ACQUIRE_TIMEOUT = 120    # seconds to wait for a free driver
+
+# Local folder for caches and learned per-domain settings
+CACHE_DIR = ".cache"
+
+# HTML to markdown conversion (see content_extraction.py)
+CHARS_PER_TOKEN = 4             # rough estimate used for size reports
+MAIN_CONTENT_MIN_SHARE = 0.5    # a main-content container must hold at least this share of the page text
+
+# Chunked extraction settings (see chunking.py)
+EXTRACTION_CHUNK_TOKENS = 12000 # markdown tokens per extraction call
+EXTRACTION_CHUNK_WORKERS = 6    # chunks of one page extracted concurrently
+ASYNC_SCRAPE_CONCURRENCY = 24   # pages extracted at once by scrape_pages_async
+
+# Plain-HTTP fast path settings (see http_fetcher.py)
+HTTP_TIMEOUT = 15               # seconds per request
+HTTP_POOL_MAXSIZE = 16          # keep-alive connections kept per host
+HTTP_RETRIES = 2                # retries on connection errors and 502/503/504
+JS_MIN_TEXT_CHARS = 500         # less visible text than this means the page is rendered client-side
+JS_MARKER_TEXT_CHARS = 3000     # "enable JavaScript" markers only count on pages smaller than this
+FETCH_MODES_FILE = "fetch_modes.json"  # per-domain record of which fetch path worked
+
+# On-disk fetch cache settings (see fetch_cache.py)
+FETCH_CACHE_ENABLED = True
+FETCH_CACHE_DIR = "fetch"       # sub-folder of CACHE_DIR
+FETCH_CACHE_TTL = 6 * 60 * 60   # seconds a cached page is served without revalidation
+FETCH_CACHE_MAX_MB = 500        # least recently used pages are evicted above this size
+
+# Extraction result cache settings (see extraction_cache.py)
+EXTRACTION_CACHE_ENABLED = True
+EXTRACTION_CACHE_FILE = "extractions.sqlite"  # in CACHE_DIR
+EXTRACTION_CACHE_TTL = 7 * 24 * 60 * 60  # seconds an extraction result is reused
+EXTRACTION_CACHE_MAX_MB = 200   # least recently used results are evicted above this size
+EXTRACTION_PROMPT_VERSION = 1   # bump when the extraction prompt changes to invalidate cached results
+
+# Pagination detection (see pagination_heuristics.py)
+PAGINATION_HEURISTICS_ENABLED = True
+PAGINATION_MIN_CONFIDENCE = 0.75  # below this the LLM is asked instead
+PAGINATION_PARAMS = ["page", "p", "pg", "pn", "paged", "page_no", "pagenumber", "pageindex", "start", "offset",
+                     "from", "skip"]
+PAGINATION_OFFSET_PARAMS = ["start", "offset", "from", "skip"]  # count items, not pages
+PAGINATION_CURSOR_PARAMS = ["cursor", "after", "before", "token", "page_token", "pagetoken", "continuation"]
+PAGINATION_MAX_PAGES = 100      # page URLs expanded from a template whose last page is unknown
+PAGINATION_LINKS_ONLY = True    # send the model the page's ranked links instead of its whole markdown
+PAGINATION_LINK_LIMIT = 40      # links sent, best pagination candidates first (see link_graph.py)
+PAGINATION_CACHE_ENABLED = True
+PAGINATION_CACHE_FILE = "pagination_cache.json"  # LLM pagination results per domain and path shape, in CACHE_DIR
+PAGINATION_CACHE_TTL = 30 * 24 * 60 * 60  # seconds a cached result is reused
+
+# Crawl frontier (see crawl_frontier.py)
+FRONTIER_DIR = "frontiers"      # one SQLite state file per crawl job, in CACHE_DIR
+FRONTIER_DOMAIN_DELAY = 1.0     # seconds between two requests to the same domain
+FRONTIER_MAX_PAGES = 1000       # pages a job queues at most
+FRONTIER_MAX_DEPTH = 100        # pagination hops from a start URL
+FRONTIER_MAX_ATTEMPTS = 3       # tries per page before it is marked failed
+FRONTIER_BLOOM_CAPACITY = 1_000_000  # URLs the in-memory Bloom filter is sized for
+FRONTIER_BLOOM_ERROR = 0.001    # its false positive rate at capacity (they only cost a SQLite lookup)
+URL_TRACKING_PARAMS = ["utm_*", "gclid", "gbraid", "wbraid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid",
+                       "mc_eid", "igshid", "_ga", "_gl", "_hsenc", "_hsmi", "ref_", "spm"]
+
+# Token and cost metering (see metering.py)
+METERING_ENABLED = True
+METERING_DIR = "metering"       # one JSON Lines ledger per run, in CACHE_DIR
+METERING_RUN_BUDGET = None      # dollars; a warning is logged once a run's LLM spend passes it
+
+# Batch extraction settings (see batch_extraction.py)
+BATCH_DIR = "batches"           # batch input/output files, in CACHE_DIR
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = 30        # seconds between status checks
+BATCH_MAX_WAIT = 25 * 60 * 60   # give up on a batch after this many seconds
+
+# Learned per-domain extraction templates (see wrapper_induction.py)
+TEMPLATES_ENABLED = True
+TEMPLATES_FILE = "extraction_templates.json"  # in CACHE_DIR
+TEMPLATE_MIN_LISTINGS = 3       # a template must reproduce at least this many listings
+TEMPLATE_MIN_AGREEMENT = 0.8    # share of LLM listings a template must reproduce to be trusted
+TEMPLATE_MIN_FIELD_COVERAGE = 0.6  # share of field values a template must fill on a page to be used
+TEMPLATE_VERIFY_EVERY = 10      # re-check every Nth templated page against the LLM
+
+# Cross-page boilerplate removal (see boilerplate_filter.py)
+BOILERPLATE_ENABLED = True
+BOILERPLATE_FILE = "boilerplate.json"  # per-domain shingle counts, in CACHE_DIR
+BOILERPLATE_SHINGLE_WORDS = 5   # words per shingle
+BOILERPLATE_MIN_PAGES = 3       # a shingle must appear on at least this many pages of a domain...
+BOILERPLATE_MIN_PAGE_SHARE = 0.6  # ...and on at least this share of them to count as repeated
+BOILERPLATE_BLOCK_SHARE = 0.7   # a block is removed when this share of its shingles is repeated
+BOILERPLATE_MIN_WORDS = 8       # shorter blocks are always kept
+BOILERPLATE_MAX_SHINGLES = 50000  # shingle counts kept per domain
+BOILERPLATE_SAVE_EVERY = 25     # newly learned pages between saves of BOILERPLATE_FILE (and once at exit)
+
+# Typed listing fields (see schema_registry.py). A field can declare its type as "price:money";
+# otherwise the first hint whose pattern matches the field name decides, falling back to text.
+FIELD_TYPES = ["text", "money", "rating", "int", "url"]
+FIELD_TYPE_HINTS = [
+    (r"price|cost|amount|fee|salary", "money"),
+    (r"count|quantity|qty|number_of|num_|reviews|bedrooms|bathrooms", "int"),
+    (r"rating|stars|score", "rating"),
+    (r"url|link|href", "url"),
+]
+
 
 LLAMA_MODEL_FULLNAME="lmstudio-community/Meta-Llama-3.1-8B-Instruct-GGUF"
 GROQ_LLAMA_MODEL_FULLNAME="llama-3.1-70b-versatile"
+LLAMA_BASE_URL = "http://localhost:1234/v1"  # LM Studio's OpenAI-compatible server
+
+# LLM gateway settings (see llm_gateway.py)
+LLM_TIMEOUT = 120               # seconds per request
+LLM_MAX_RETRIES = 4             # retries on 429, 5xx, timeouts and connection errors
+LLM_BACKOFF_BASE = 0.5          # first retry waits up to this many seconds, doubling each time
+LLM_BACKOFF_MAX = 30            # cap on a single backoff wait
+LLM_MAX_CONNECTIONS = 20        # pooled keep-alive connections per provider
+
+# Model router settings (see model_router.py)
+AUTO_MODEL = "auto"             # selected_model value that lets the router pick a model per request
+ROUTER_CANDIDATES = ["gpt-4o-mini", "gemini-1.5-flash", "Groq Llama3.1 70b"]
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o-2024-08-06": 128000,
+    "gemini-1.5-flash": 1000000,
+    "Llama3.1 8B": 8192,        # LM Studio's default context length
+    "Groq Llama3.1 70b": 131072,
+}
+MODEL_RATE_LIMIT_TPM = {        # tokens per minute a model accepts; a single larger request is rejected outright
+    "Groq Llama3.1 70b": 6000,  # free tier
+}
+ROUTER_LATENCY_PRIORS = {       # seconds per extraction call, used until a model has enough samples
+    "gpt-4o-mini": 10,
+    "gpt-4o-2024-08-06": 15,
+    "gemini-1.5-flash": 8,
+    "Llama3.1 8B": 40,
+    "Groq Llama3.1 70b": 5,
+}
+ROUTER_MIN_SAMPLES = 5          # calls before observed latency replaces the prior
+ROUTER_SECONDS_VALUE = 0.0002   # dollars a second of latency is worth when comparing models
+ROUTER_MAX_ERROR_RATE = 0.5     # models failing more often than this are skipped
+ROUTER_OUTPUT_SHARE = 0.25      # expected output tokens per input token, for cost estimates
+ROUTER_HEDGE_ENABLED = False    # send a duplicate request to the runner-up when the first is slow
+ROUTER_ALLOW_PROVIDER_SWITCH = False  # let an explicitly selected model fall back or hedge to another provider
+ROUTER_HEDGE_AFTER = 20         # seconds before hedging while a model has no p95 yet
+# threads for hedged sync calls: every concurrent chunk call plus its duplicate
+ROUTER_HEDGE_WORKERS = PIPELINE_EXTRACT_WORKERS * EXTRACTION_CHUNK_WORKERS * 2
+ROUTER_LOG_FILE = "router_log.jsonl"  # routing decisions and outcomes, in CACHE_DIR
 
 SYSTEM_MESSAGE = """You are an intelligent text extraction and conversion assistant. Your task is to extract structured information 
                         from the given text and convert it into a pure JSON format. The JSON should contain only the structured data extracted from the text, 
@@ -125,18 +306,27 @@ You are an assistant that extracts pagination elements from markdown content of
 
 Please extract the following:
 
-- The url of the 'Next', 'More', 'See more', 'load more' or any other button indicating how to access the next page, if any, it should be 1 url and no more, if there are multiple urls with the same structure leave this empty.
+- The url of the 'Next', 'More', 'See more', 'load more' or any other button indicating how to access the next page, if any, it should be 1 url and no more, put it in next_url.
+
+- The pattern of the page URLs if the pages are numbered: do NOT list the pages, give one url_template where the changing number is replaced by {n}, for example "https://example.com/list?q=tv&page={n}" or "https://example.com/page/{n}/".
+Set kind to "page" when {n} is a page number, "offset" when it counts items (start=20, offset=40), and "cursor" when the next page is reached through an opaque token that cannot be numbered (then leave url_template empty and give next_url).
+Set start to the value of {n} on the first page after the current one, step to the difference between consecutive pages (1 for page numbers, the page size for offsets) and end to the value of {n} on the last page if it is shown, otherwise null.
+Detect only the urls that are clearly defining a pattern to show data on multiple pages, sometimes there is only a part of these urls and you have to combine it with the initial url, that will be provided for you at the end of this prompt.
 
-- A list of page URLs for pagination it should be a pattern of similar urls with pages that are numbered, if you detect this pattern and the numbers starts from a certain low number until a large number generate the rest of the urls even if they're not included, 
-your goal here is to give as many urls for the user to choose from in order for them to do further scraping, you will have to deal with very different websites that can potientially have so many urls of images and other elements, 
-detect only the urls that are clearly defining a pattern to show data on multiple pages, sometimes there is only a part of these urls and you have to combine it with the initial url, that will be provided for you at the end of this prompt.
+- page_urls only for pagination urls that follow no such pattern, leave it empty when you give a url_template.
 
-- The user can give you indications on how the pagination works for the specific website at the end of this prompt, if those indications are not empty pay special attention to them as they will directly help you understand the structure and the number of pages to generate.
+- The user can give you indications on how the pagination works for the specific website at the end of this prompt, if those indications are not empty pay special attention to them as they will directly help you understand the structure and the number of pages.
 
 Provide the output as a JSON object with the following structure:
 
 {
-    "page_urls": ["url1", "url2", "url3",...,"urlN"]
+    "url_template": "url with {n}" or null,
+    "kind": "page", "offset" or "cursor",
+    "start": 2,
+    "step": 1,
+    "end": 48 or null,
+    "next_url": "url" or null,
+    "page_urls": []
 }
 
 Do not include any additional text or explanations.
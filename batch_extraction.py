@@ -0,0 +1,220 @@
+# batch_extraction.py
+
+"""
+Batch API mode for bulk listing extraction.
+
+For large jobs where latency doesn't matter, extraction requests for many pages are written
+to a JSONL batch file, submitted to the OpenAI Batch API (billed at the PRICING batch rates) and polled
+until done; the results are then fanned back out per page and saved like a normal scrape.
+
+Pages are chunked and filtered exactly like format_data_chunked, and chunks already in the extraction
+cache are answered locally and left out of the batch. batch_server.LocalBatchServer can
+stand in for the API to run a batch offline.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from openai import OpenAI
+
+from assets import (
+    BATCH_COMPLETION_WINDOW,
+    BATCH_DIR,
+    BATCH_MAX_WAIT,
+    BATCH_POLL_INTERVAL,
+    BOILERPLATE_ENABLED,
+    CACHE_DIR,
+    EXTRACTION_CACHE_ENABLED,
+    EXTRACTION_CHUNK_TOKENS,
+    USER_MESSAGE,
+)
+from boilerplate_filter import strip_site_boilerplate_chunks
+from chunking import chunk_markdown, merge_listings
+from extraction_cache import get_extraction_cache
+from http_fetcher import get_domain
+from llm_gateway import get_gateway
+from metering import metering_context, record_call, supports_batch
+from scraper import (
+    calculate_price,
+    create_dynamic_listing_model,
+    generate_system_message,
+    save_formatted_data,
+    save_raw_data,
+)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchExtractionJob:
+    def __init__(self, listing_model, model: str = "gpt-4o-mini", client: Optional[OpenAI] = None,
+                 max_tokens: int = EXTRACTION_CHUNK_TOKENS, use_cache: bool = EXTRACTION_CACHE_ENABLED,
+                 directory: str = os.path.join(CACHE_DIR, BATCH_DIR)):
+        if not supports_batch(model):
+            raise ValueError(f"Batch extraction is not available for {model}")
+        self.listing_model = listing_model
+        self.fields = list(listing_model.model_fields)
+        self.model = model
+        self.client = client or get_gateway().client("openai")
+        self.max_tokens = max_tokens
+        self.use_cache = use_cache
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self.batch = None
+        self._system_message = generate_system_message(listing_model)
+        self._pages: Dict[str, List[str]] = {}     # page id -> custom ids of its chunks, in order
+        self._chunks: Dict[str, str] = {}          # custom id -> chunk markdown
+        self._results: Dict[str, Dict] = {}        # custom id -> extracted data
+        self._token_counts: Dict[str, Dict] = {}   # custom id -> token counts
+        self._domains: Dict[str, str] = {}         # custom id -> page domain, for metering
+        self._pending: List[Dict] = []             # batch requests not answered by the cache
+
+    def add_page(self, page_id: str, markdown: str, url: Optional[str] = None,
+                 strip_boilerplate: bool = BOILERPLATE_ENABLED):
+        """Queue a page's chunks; with the page url, the site's boilerplate is removed from the prompts."""
+        custom_ids = []
+        chunks = chunk_markdown(markdown, self.max_tokens, self.model) or [markdown]
+        prompts = strip_site_boilerplate_chunks(url, chunks) if url and strip_boilerplate else chunks
+        for index, (chunk, prompt) in enumerate(zip(chunks, prompts, strict=True)):
+            custom_id = f"{page_id}:{index}"
+            custom_ids.append(custom_id)
+            self._chunks[custom_id] = chunk
+            if url:
+                self._domains[custom_id] = get_domain(url)
+            cached = get_extraction_cache().get(chunk, self.fields, self.model) if self.use_cache else None
+            if cached is not None:
+                self._results[custom_id] = cached.data
+                continue
+            self._pending.append({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": self._system_message},
+                        {"role": "user", "content": USER_MESSAGE + prompt},
+                    ],
+                    "response_format": {"type": "json_object"},
+                },
+            })
+        self._pages[page_id] = custom_ids
+
+    @property
+    def pending_requests(self) -> int:
+        return len(self._pending)
+
+    def submit(self):
+        """Upload the batch file and create the batch. Does nothing if every chunk was cached."""
+        if not self._pending:
+            return None
+        input_path = os.path.join(self.directory, f"batch_input_{int(time.time() * 1000)}.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for request in self._pending:
+                f.write(json.dumps(request) + "\n")
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        self.batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        print(f"Submitted batch {self.batch.id} with {len(self._pending)} extraction requests")
+        return self.batch
+
+    def wait(self, poll_interval: float = BATCH_POLL_INTERVAL, max_wait: float = BATCH_MAX_WAIT):
+        """Poll the batch until it finishes, then collect its output."""
+        if self.batch is None:
+            return None
+        deadline = time.monotonic() + max_wait
+        while self.batch.status not in FINISHED_STATUSES:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Batch {self.batch.id} did not finish within {max_wait} seconds")
+            time.sleep(poll_interval)
+            self.batch = self.client.batches.retrieve(self.batch.id)
+            counts = self.batch.request_counts
+            if counts:
+                print(f"Batch {self.batch.id}: {self.batch.status}, {counts.completed}/{counts.total} done")
+
+        if self.batch.status != "completed":
+            raise RuntimeError(f"Batch {self.batch.id} ended with status {self.batch.status}")
+        if self.batch.output_file_id:
+            output = self.client.files.content(self.batch.output_file_id).text
+            with open(os.path.join(self.directory, f"{self.batch.id}_output.jsonl"), "w", encoding="utf-8") as f:
+                f.write(output)
+            self._collect(output)
+        return self.batch
+
+    def _collect(self, output: str):
+        for line in filter(str.strip, output.splitlines()):
+            item = json.loads(line)
+            custom_id = item["custom_id"]
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                logging.error(f"Batch request {custom_id} failed: {item.get('error') or response}")
+                continue
+            body = response["body"]
+            try:
+                data = json.loads(body["choices"][0]["message"]["content"])
+            except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+                logging.error(f"Batch request {custom_id} returned invalid JSON: {e}")
+                continue
+            token_counts = {"input_tokens": body["usage"]["prompt_tokens"],
+                            "output_tokens": body["usage"]["completion_tokens"]}
+            self._results[custom_id] = data
+            self._token_counts[custom_id] = token_counts
+            record_call("openai", self.model, token_counts["input_tokens"], token_counts["output_tokens"], batch=True,
+                        domain=self._domains.get(custom_id), purpose="extraction")
+            if self.use_cache:
+                get_extraction_cache().put(self._chunks[custom_id], self.fields, self.model, data, token_counts)
+
+    def results(self) -> Dict[str, Tuple[Dict, Dict[str, int]]]:
+        """Extracted data and token counts per page id, with chunk listings merged."""
+        results = {}
+        for page_id, custom_ids in self._pages.items():
+            token_counts = {"input_tokens": 0, "output_tokens": 0}
+            for custom_id in custom_ids:
+                for key, value in self._token_counts.get(custom_id, {}).items():
+                    token_counts[key] += value
+            data = {"listings": merge_listings([self._results.get(custom_id, {}) for custom_id in custom_ids])}
+            results[page_id] = (data, token_counts)
+        return results
+
+    def run(self, poll_interval: float = BATCH_POLL_INTERVAL, max_wait: float = BATCH_MAX_WAIT):
+        self.submit()
+        self.wait(poll_interval, max_wait)
+        return self.results()
+
+
+def scrape_urls_batch(pages: List[Tuple[str, str]], fields: List[str], selected_model: str, output_folder: str,
+                      first_file_number: int = 1, client: Optional[OpenAI] = None,
+                      poll_interval: float = BATCH_POLL_INTERVAL, max_wait: float = BATCH_MAX_WAIT):
+    """
+    Batch-mode counterpart of scrape_url for many (url, markdown) pages.
+
+    Returns one (input_tokens, output_tokens, total_cost, formatted_data) tuple per page,
+    priced at the Batch API rates.
+    """
+    # Only OpenAI models have a Batch API; others (and AUTO_MODEL) are extracted with gpt-4o-mini
+    model = selected_model if supports_batch(selected_model) else "gpt-4o-mini"
+    listing_model = create_dynamic_listing_model(fields)
+
+    job = BatchExtractionJob(listing_model, model=model, client=client)
+    for offset, (url, markdown) in enumerate(pages):
+        file_number = first_file_number + offset
+        save_raw_data(markdown, output_folder, f'rawData_{file_number}.md')
+        with metering_context(url=url, purpose="extraction"):
+            job.add_page(str(file_number), markdown, url)
+    job.run(poll_interval, max_wait)
+
+    outcomes = []
+    for file_number, (formatted_data, token_counts) in job.results().items():
+        save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json',
+                            f'sorted_data_{file_number}.xlsx', fields)
+        input_tokens, output_tokens, total_cost = calculate_price(token_counts, model, batch=True)
+        outcomes.append((input_tokens, output_tokens, total_cost, formatted_data))
+    return outcomes
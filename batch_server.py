@@ -0,0 +1,196 @@
+# batch_server.py
+
+"""
+Local stand-in for the OpenAI Files and Batch endpoints, for testing batch extraction offline.
+
+It implements just what batch_extraction.py uses: uploading a JSONL file, creating a batch
+from it, polling the batch and downloading its output file. Each request in a batch is
+answered by `responder`, a function that takes the chat completion request body and returns
+the message content (by default an empty listings object).
+
+    server = LocalBatchServer().start()
+    client = OpenAI(api_key="local", base_url=server.url)
+    ...
+    server.stop()
+
+Run this module directly to serve on a fixed port:
+
+    python batch_server.py [port]
+"""
+
+import email
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from token_accounting import estimate_tokens
+
+
+def empty_listings(_body: Dict) -> str:
+    return json.dumps({"listings": []})
+
+
+class LocalBatchServer:
+    def __init__(self, responder: Callable[[Dict], str] = empty_listings, host: str = "127.0.0.1", port: int = 0,
+                 processing_delay: float = 0.0):
+        self.responder = responder
+        self.processing_delay = processing_delay
+        self.files: Dict[str, Dict] = {}
+        self.batches: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "LocalBatchServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Files
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> Dict:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        record = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                  "filename": filename, "purpose": purpose, "status": "processed"}
+        with self._lock:
+            self.files[file_id] = {"meta": record, "content": content}
+        return record
+
+    # Batches
+
+    def create_batch(self, request: Dict) -> Dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request["endpoint"], "errors": None,
+            "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+            "status": "in_progress", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "completed_at": None, "metadata": request.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._process, args=(batch_id,), daemon=True).start()
+        return batch
+
+    def _process(self, batch_id: str):
+        time.sleep(self.processing_delay)
+        with self._lock:
+            batch = self.batches[batch_id]
+            lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+
+        output, failed = [], 0
+        for line in filter(str.strip, lines):
+            request = json.loads(line)
+            body = request["body"]
+            try:
+                content = self.responder(body)
+                prompt = "".join(message["content"] for message in body["messages"])
+                response = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion",
+                    "created": int(time.time()), "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content),
+                              "total_tokens": estimate_tokens(prompt) + estimate_tokens(content)},
+                }}
+                error = None
+            except Exception as e:
+                failed += 1
+                response, error = None, {"code": "server_error", "message": str(e)}
+            output.append(json.dumps({"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": request["custom_id"],
+                                      "response": response, "error": error}))
+
+        output_file = self.add_file("\n".join(output).encode("utf-8"), f"{batch_id}_output.jsonl", "batch_output")
+        with self._lock:
+            batch.update({"status": "completed", "output_file_id": output_file["id"], "completed_at": int(time.time()),
+                          "request_counts": {"total": len(output), "completed": len(output) - failed,
+                                             "failed": failed}})
+
+    # HTTP
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                if self.path.rstrip("/").endswith("/files"):
+                    # multipart/form-data with "purpose" and "file" parts
+                    raw = self._body()
+                    message = email.message_from_bytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + raw)
+                    fields, content, filename = {}, b"", "upload.jsonl"
+                    for part in message.get_payload():
+                        name = part.get_param("name", header="content-disposition")
+                        if name == "file":
+                            content = part.get_payload(decode=True)
+                            filename = part.get_filename() or filename
+                        else:
+                            fields[name] = part.get_payload(decode=True).decode("utf-8")
+                    self._send_json(server.add_file(content, filename, fields.get("purpose", "batch")))
+                elif self.path.rstrip("/").endswith("/batches"):
+                    self._send_json(server.create_batch(json.loads(self._body())))
+                else:
+                    self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                with server._lock:
+                    if len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in server.files:
+                        body = server.files[parts[-2]]["content"]
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/octet-stream")
+                        self.send_header("Content-Length", str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                        return
+                    if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in server.batches:
+                        payload = dict(server.batches[parts[-1]])
+                    elif len(parts) >= 2 and parts[-2] == "files" and parts[-1] in server.files:
+                        payload = server.files[parts[-1]]["meta"]
+                    else:
+                        payload = None
+                if payload is None:
+                    self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+                else:
+                    self._send_json(payload)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8090
+    local_server = LocalBatchServer(port=port).start()
+    print(f"Local batch server listening on {local_server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        local_server.stop()
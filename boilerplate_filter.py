@@ -0,0 +1,224 @@
+# boilerplate_filter.py
+
+"""
+Cross-page boilerplate removal.
+
+Pages of one site repeat the same menus, filter panels, footers and "customers also bought"
+rows, which main-content extraction can't always tell apart from listings on a single page.
+Across pages they stand out: for every domain the filter counts on how many pages each
+shingle (run of BOILERPLATE_SHINGLE_WORDS words) appears, and a markdown block whose
+shingles mostly repeat across the domain's pages is dropped before the markdown is sent
+to the LLM. Pagination-looking blocks are always kept, since they repeat by design, and
+so are listing-looking blocks (a price or a rating), which repeat when a listing is
+promoted on every page of a list.
+
+Extraction filters each chunk of the unfiltered page (strip_site_boilerplate_chunks) and
+caches it under the unfiltered chunk, so a stable page still hits the extraction cache
+after the domain's profile has grown and would filter it differently.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from assets import (
+    BOILERPLATE_BLOCK_SHARE,
+    BOILERPLATE_FILE,
+    BOILERPLATE_MAX_SHINGLES,
+    BOILERPLATE_MIN_PAGE_SHARE,
+    BOILERPLATE_MIN_PAGES,
+    BOILERPLATE_MIN_WORDS,
+    BOILERPLATE_SAVE_EVERY,
+    BOILERPLATE_SHINGLE_WORDS,
+    CACHE_DIR,
+)
+from chunking import split_blocks
+from content_extraction import PAGINATION_HREF, PAGINATION_TEXT
+from http_fetcher import get_domain
+from token_accounting import estimate_tokens
+from url_utils import normalize_url
+
+WORD = re.compile(r"\w+")
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\(([^)\s]+)[^)]*\)")
+NEXT_TEXT = re.compile(r"^(?:next|next page|load more|see more|more results|[>»›]+)$", re.IGNORECASE)
+PRICE = re.compile(r"(?:[$€£¥₹₩₽₺]|\bR\$?|\b(?:USD|EUR|GBP|ZAR|INR|AUD|CAD)\b)\s?\d"
+                   r"|\d(?:[\d,.\s]*\d)?\s?(?:[€£₽₺]|\b(?:USD|EUR|GBP|ZAR|INR|AUD|CAD)\b|kr\b|zł)")
+RATING = re.compile(r"\b\d(?:[.,]\d)?\s*(?:out of 5|/\s*5\b|stars?\b)", re.IGNORECASE)
+MAX_SEEN_URLS = 1000
+
+
+class BoilerplateReport:
+    def __init__(self, url: str, blocks: int, removed_blocks: int, input_tokens_est: int, removed_tokens_est: int):
+        self.url = url
+        self.blocks = blocks
+        self.removed_blocks = removed_blocks
+        self.input_tokens_est = input_tokens_est
+        self.removed_tokens_est = removed_tokens_est
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+    def __str__(self):
+        share = self.removed_tokens_est / self.input_tokens_est if self.input_tokens_est else 0.0
+        return (f"Removed {self.removed_blocks}/{self.blocks} repeated blocks, "
+                f"~{self.removed_tokens_est:,} tokens ({share:.0%})")
+
+
+def shingles(text: str, size: int = BOILERPLATE_SHINGLE_WORDS) -> set:
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        words_runs = [words] if words else []
+    else:
+        words_runs = [words[i:i + size] for i in range(len(words) - size + 1)]
+    return {hashlib.blake2b(" ".join(run).encode("utf-8"), digest_size=8).hexdigest() for run in words_runs}
+
+
+def is_pagination_markdown(block: str) -> bool:
+    """Markdown counterpart of content_extraction.is_pagination_block."""
+    links = MARKDOWN_LINK.findall(block)
+    if not links:
+        return False
+    if any(NEXT_TEXT.match(text.strip()) for text, _ in links):
+        return True
+    pager_like = sum(1 for text, href in links if PAGINATION_TEXT.match(text.strip()) or PAGINATION_HREF.search(href))
+    return pager_like >= 2 and pager_like / len(links) >= 0.5
+
+
+def is_listing_markdown(block: str) -> bool:
+    """A block carrying a price or a star rating: a listing (or part of one), not site chrome."""
+    return PRICE.search(block) is not None or RATING.search(block) is not None
+
+
+class BoilerplateFilter:
+    """Per-domain shingle page counts, persisted between runs every `save_every` new pages and by flush()."""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, BOILERPLATE_FILE), save_every: int = BOILERPLATE_SAVE_EVERY):
+        self.path = path
+        self.save_every = save_every
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._domains: Dict[str, Dict] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._domains = {}
+
+    def _learn(self, domain: str, url: str, page_shingles: set) -> Dict:
+        # Called with the lock held. Each URL counts once, however often it is re-scraped or filtered.
+        profile = self._domains.setdefault(domain, {"pages": 0, "counts": {}, "urls": []})
+        url_key = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).hexdigest()
+        if url_key in profile["urls"]:
+            return profile
+        profile["urls"] = (profile["urls"] + [url_key])[-MAX_SEEN_URLS:]
+        profile["pages"] += 1
+        counts = profile["counts"]
+        for shingle in page_shingles:
+            counts[shingle] = counts.get(shingle, 0) + 1
+        if len(counts) > BOILERPLATE_MAX_SHINGLES:
+            # Keep the most repeated shingles; one-off ones are listings and won't matter again
+            kept = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:BOILERPLATE_MAX_SHINGLES // 2]
+            profile["counts"] = dict(kept)
+        self._unsaved += 1
+        return profile
+
+    def strip(self, url: str, markdown: str) -> Tuple[str, BoilerplateReport]:
+        """Remove the blocks of markdown that repeat across the domain's pages."""
+        stripped, report = self.strip_chunks(url, [markdown])
+        return stripped[0], report
+
+    def strip_chunks(self, url: str, chunks: List[str]) -> Tuple[List[str], BoilerplateReport]:
+        """strip() for a page already split into chunks: the page is learned once, each chunk filtered."""
+        chunk_blocks = [split_blocks(chunk) for chunk in chunks]
+        chunk_shingles = [[shingles(block) for block in blocks] for blocks in chunk_blocks]
+        page_shingles = set().union(*(block_set for sets in chunk_shingles for block_set in sets))
+        with self._lock:
+            profile = self._learn(get_domain(url), url, page_shingles)
+            counts = dict(profile["counts"])
+            pages = profile["pages"]
+            save_due = self._unsaved >= self.save_every
+        if save_due:
+            self.flush()
+
+        threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_PAGE_SHARE * pages)
+        stripped_chunks, removed_tokens, removed_blocks = [], 0, 0
+        for chunk, blocks, block_shingles in zip(chunks, chunk_blocks, chunk_shingles, strict=True):
+            kept, removed = [], 0
+            for block, block_set in zip(blocks, block_shingles, strict=True):
+                repeated = sum(1 for shingle in block_set if counts.get(shingle, 0) >= threshold)
+                if (pages >= BOILERPLATE_MIN_PAGES and block_set
+                        and len(WORD.findall(block)) >= BOILERPLATE_MIN_WORDS
+                        and repeated / len(block_set) >= BOILERPLATE_BLOCK_SHARE
+                        and not is_pagination_markdown(block) and not is_listing_markdown(block)):
+                    removed += 1
+                    removed_tokens += estimate_tokens(block)
+                    continue
+                kept.append(block)
+            removed_blocks += removed
+            stripped_chunks.append("\n\n".join(kept) + "\n" if removed else chunk)
+
+        report = BoilerplateReport(url, sum(len(blocks) for blocks in chunk_blocks), removed_blocks,
+                                   sum(estimate_tokens(chunk) for chunk in chunks), removed_tokens)
+        _reports.append(report)
+        return stripped_chunks, report
+
+    def flush(self):
+        """Write the profiles learned since the last save."""
+        # Saves are serialised so an older snapshot never overwrites a newer one; pages keep being
+        # learned while the file is written
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                snapshot = json.dumps(self._domains)
+                self._unsaved = 0
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.warning(f"Could not save boilerplate profiles to {self.path}: {e}")
+
+
+_filter: Optional[BoilerplateFilter] = None
+_filter_lock = threading.Lock()
+_reports = deque(maxlen=500)
+
+
+def get_boilerplate_filter() -> BoilerplateFilter:
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = BoilerplateFilter()
+            atexit.register(_filter.flush)
+        return _filter
+
+
+def get_boilerplate_reports() -> List[Dict]:
+    """Reports for the most recently filtered pages, newest last."""
+    return [report.as_dict() for report in _reports]
+
+
+def strip_site_boilerplate(url: str, markdown: str) -> str:
+    """Drop blocks repeated across the domain's pages and print how much was removed."""
+    if not url or not markdown:
+        return markdown
+    return strip_site_boilerplate_chunks(url, [markdown])[0]
+
+
+def strip_site_boilerplate_chunks(url: str, chunks: List[str]) -> List[str]:
+    """strip_site_boilerplate for the chunks of one page, in the same order."""
+    if not url or not any(chunks):
+        return list(chunks)
+    stripped, report = get_boilerplate_filter().strip_chunks(url, chunks)
+    if report.removed_blocks:
+        print(f"{url}: {report}")
+    return stripped
@@ -0,0 +1,130 @@
+# chunking.py
+
+"""
+Token-budgeted chunking of page markdown for extraction.
+
+Long pages used to be cut at the token limit, silently dropping the listings at the
+bottom. Instead the markdown is split on structural boundaries (headings, blank-line
+separated blocks such as listing cards) into chunks that each fit a token budget,
+the chunks are extracted concurrently, and the listings are merged and de-duplicated.
+"""
+
+import re
+from typing import Dict, List
+
+from assets import (
+    EXTRACTION_CHUNK_TOKENS,
+    MODEL_CONTEXT_TOKENS,
+    MODEL_RATE_LIMIT_TPM,
+    ROUTER_OUTPUT_SHARE,
+)
+from token_accounting import count_tokens, split_to_tokens
+
+HEADING = re.compile(r"^#{1,6}\s")
+BLOCK_SEPARATOR = re.compile(r"\n\s*\n")
+
+# Past this share of the budget, a chunk is closed at the next heading rather than filled up
+SOFT_LIMIT_SHARE = 0.8
+
+
+def split_blocks(markdown: str) -> List[str]:
+    """Split markdown into blank-line separated blocks, starting a new block at every heading."""
+    blocks = []
+    for block in BLOCK_SEPARATOR.split(markdown):
+        current: List[str] = []
+        for line in block.splitlines():
+            if HEADING.match(line) and current:
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+        if current and any(line.strip() for line in current):
+            blocks.append("\n".join(current))
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int, model: str) -> List[str]:
+    """Split a single block that is larger than the budget, by lines and then by tokens."""
+    pieces, current, current_tokens = [], [], 0
+    for line in block.splitlines():
+        line_tokens = count_tokens(line, model) + 1
+        if line_tokens > max_tokens:
+            if current:
+                pieces.append("\n".join(current))
+                current, current_tokens = [], 0
+            pieces.extend(split_to_tokens(line, max_tokens, model))
+            continue
+        if current_tokens + line_tokens > max_tokens and current:
+            pieces.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_budget(model: str, prompt_tokens: int = 0) -> int:
+    """
+    Markdown tokens per chunk for `model`: EXTRACTION_CHUNK_TOKENS, or less when the model's
+    context, or its per-minute token limit, can't hold that much plus the prompt and the expected answer.
+    """
+    limits = [limit for limit in (MODEL_CONTEXT_TOKENS.get(model), MODEL_RATE_LIMIT_TPM.get(model)) if limit]
+    if not limits:
+        return EXTRACTION_CHUNK_TOKENS
+    # 1% margin: a chunk counts a few tokens more once its blocks are joined
+    fitting = int(min(limits) / (1 + ROUTER_OUTPUT_SHARE) * 0.99) - prompt_tokens
+    return max(min(EXTRACTION_CHUNK_TOKENS, fitting), 256)
+
+
+def chunk_markdown(markdown: str, max_tokens: int, model: str) -> List[str]:
+    """
+    Pack markdown blocks into chunks of at most max_tokens tokens.
+
+    Chunks are preferably closed right before a heading once they are past
+    SOFT_LIMIT_SHARE of the budget, so a listing isn't split across two chunks.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n\n".join(current))
+        current, current_tokens = [], 0
+
+    for block in split_blocks(markdown):
+        block_tokens = count_tokens(block, model) + 2
+        if block_tokens > max_tokens:
+            flush()
+            chunks.extend(_split_oversized(block, max_tokens, model))
+            continue
+        at_heading = bool(HEADING.match(block))
+        if current_tokens + block_tokens > max_tokens or (
+                at_heading and current_tokens >= max_tokens * SOFT_LIMIT_SHARE):
+            flush()
+        current.append(block)
+        current_tokens += block_tokens
+    flush()
+    return chunks
+
+
+def listing_key(listing) -> tuple:
+    if not isinstance(listing, dict):
+        return (str(listing),)
+    return tuple(sorted((key, " ".join(str(value).split()).lower()) for key, value in listing.items()))
+
+
+def merge_listings(results: List[Dict]) -> List[Dict]:
+    """Concatenate the listings extracted from each chunk, in order, dropping exact duplicates."""
+    merged, seen = [], set()
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for listing in result.get("listings", []) or []:
+            key = listing_key(listing)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(listing)
+    return merged
@@ -0,0 +1,233 @@
+# content_extraction.py
+
+"""
+Readability-style main-content extraction for listing pages.
+
+Works on the lxml tree from html_processing before it is converted to markdown:
+
+1. Elements whose tag, role, id or class mark them as navigation, sidebars, cookie
+   banners, newsletters, social widgets or ads are removed.
+2. Link-dense blocks of short anchors (menus, category trees) are removed, and a
+   menu that appears twice (top and bottom of the page) is only kept once.
+3. Remaining block containers are scored by text length, punctuation, class/id hints
+   and link density; if one container clearly holds most of the page's content, only
+   it is kept, plus any pagination blocks found elsewhere on the page.
+
+Pagination-looking blocks are never removed, since pagination detection reads the same markdown.
+"""
+
+import hashlib
+import re
+from typing import Dict, Optional, Tuple
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from assets import MAIN_CONTENT_MIN_SHARE
+from html_processing import WHITESPACE, clean_tree, parse_html, tree_to_markdown
+from token_accounting import estimate_tokens
+
+BOILERPLATE_TAGS = ["nav", "aside", "dialog"]
+BOILERPLATE_ROLES = ["navigation", "banner", "contentinfo", "complementary", "search", "dialog", "alertdialog"]
+
+BOILERPLATE_HINTS = re.compile(
+    r"(?:^|[\s_-])(?:nav|navbar|navigation|menu|megamenu|sidebar|side-bar|breadcrumbs?|cookies?|consent|gdpr|"
+    r"banner|newsletter|subscribe|signup|social|share|sharing|modal|popup|advert|ads|"
+    r"related|recommend(?:ed|ations)?|also-bought|recently-viewed|footer|masthead|skip-link)(?:$|[\s_-])",
+    re.IGNORECASE,
+)
+
+POSITIVE_HINTS = re.compile(
+    r"content|main|results?|listings?|products?|items?|search-results|grid|catalog|article|body|post",
+    re.IGNORECASE,
+)
+NEGATIVE_HINTS = re.compile(r"comment|meta|footer|footnote|widget|sidebar|nav|menu|promo|ad-", re.IGNORECASE)
+
+PAGINATION_HINTS = re.compile(r"paginat|pager|page-numbers|pages", re.IGNORECASE)
+PAGINATION_TEXT = re.compile(r"^(?:\d{1,4}|next|previous|prev|older|newer|more|load more|see more|[<>«»‹›]+)$",
+                             re.IGNORECASE)
+PAGINATION_HREF = re.compile(r"[?&](?:page|p|pg|start|offset)=\d+|/page/\d+", re.IGNORECASE)
+
+CONTAINER_TAGS = {"div", "section", "main", "article", "ul", "ol", "table", "tbody", "form"}
+
+
+class ConversionReport:
+    def __init__(self, input_chars: int, output_chars: int, input_tokens_est: int, output_tokens_est: int,
+                 removed_blocks: int, main_content_found: bool):
+        self.input_chars = input_chars
+        self.output_chars = output_chars
+        self.removed_blocks = removed_blocks
+        self.main_content_found = main_content_found
+        self.input_tokens_est = input_tokens_est
+        self.output_tokens_est = output_tokens_est
+        self.tokens_saved_est = self.input_tokens_est - self.output_tokens_est
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+    def __str__(self):
+        ratio = self.output_chars / self.input_chars if self.input_chars else 0.0
+        return (f"{self.input_chars:,} chars of html -> {self.output_chars:,} chars of markdown ({ratio:.1%}), "
+                f"~{self.tokens_saved_est:,} tokens saved")
+
+
+def _hints(element) -> str:
+    return f"{element.get('id', '')} {element.get('class', '')}"
+
+
+def _text_length(element) -> int:
+    return len(WHITESPACE.sub(" ", element.text_content()).strip())
+
+
+def _link_stats(element) -> Tuple[int, int]:
+    """Number of anchors and total characters of anchor text inside element."""
+    anchors = element.xpath(".//a")
+    return len(anchors), sum(len(WHITESPACE.sub(" ", a.text_content()).strip()) for a in anchors)
+
+
+def is_pagination_block(element) -> bool:
+    if PAGINATION_HINTS.search(_hints(element)) or element.get("aria-label", "").lower().startswith("pagination"):
+        return True
+    anchors = element.xpath(".//a")
+    if not anchors:
+        return False
+    if any(a.get("rel") == "next" for a in anchors):
+        return True
+    pager_like = sum(
+        1 for a in anchors
+        if PAGINATION_TEXT.match(WHITESPACE.sub(" ", a.text_content()).strip()) or PAGINATION_HREF.search(a.get("href", ""))
+    )
+    return pager_like >= 2 and pager_like / len(anchors) >= 0.5
+
+
+def _drop(element):
+    if element.getparent() is not None:
+        element.drop_tree()
+
+
+def remove_boilerplate(tree: etree._Element) -> int:
+    """Remove navigation, banners, menus and other chrome in place. Returns the number of removed elements."""
+    removed = 0
+    candidates = tree.xpath(
+        "|".join(f"//{tag}" for tag in BOILERPLATE_TAGS)
+        + "|" + "|".join(f"//*[@role='{role}']" for role in BOILERPLATE_ROLES)
+        + "|//*[@id or @class]"
+    )
+    for element in candidates:
+        if element.getparent() is None or element.tag in ("body", "html", "main"):
+            continue
+        tagged = element.tag in BOILERPLATE_TAGS or element.get("role") in BOILERPLATE_ROLES
+        if not tagged and not BOILERPLATE_HINTS.search(_hints(element)):
+            continue
+        if is_pagination_block(element):
+            continue
+        # Don't let a hint on a huge wrapper (e.g. class="page-overlay-container") take the content with it
+        if not tagged and _text_length(element) > 5000:
+            continue
+        _drop(element)
+        removed += 1
+
+    seen_menus = set()
+    for element in tree.xpath("//ul|//ol|//div|//section"):
+        if element.getparent() is None:
+            continue
+        anchor_count, anchor_chars = _link_stats(element)
+        if anchor_count < 5:
+            continue
+        text_length = _text_length(element)
+        if not text_length:
+            continue
+        link_density = anchor_chars / text_length
+        average_anchor = anchor_chars / anchor_count
+        # Menus: almost all text is short link labels. Product grids have long titles and prices.
+        if link_density > 0.9 and average_anchor < 20 and not is_pagination_block(element):
+            signature = hashlib.md5(WHITESPACE.sub(" ", element.text_content()).strip().encode("utf-8")).hexdigest()
+            if signature in seen_menus or text_length < 2000:
+                _drop(element)
+                removed += 1
+            seen_menus.add(signature)
+    return removed
+
+
+def _score(element, text_length: int) -> float:
+    anchor_count, anchor_chars = _link_stats(element)
+    link_density = anchor_chars / text_length if text_length else 1.0
+    score = text_length * (1.0 - 0.5 * link_density)
+    score += 25 * element.text_content().count(",")
+    hints = _hints(element)
+    if POSITIVE_HINTS.search(hints):
+        score *= 1.25
+    if NEGATIVE_HINTS.search(hints):
+        score *= 0.5
+    return score
+
+
+def find_main_content(tree: etree._Element) -> Optional[etree._Element]:
+    """Return the container holding most of the page's content, or None if no single one does."""
+    body = tree.find("body")
+    root = body if body is not None else tree
+    total = _text_length(root)
+    if not total:
+        return None
+
+    best, best_score = None, 0.0
+    for element in root.iter(*CONTAINER_TAGS):
+        text_length = _text_length(element)
+        if text_length < total * MAIN_CONTENT_MIN_SHARE:
+            continue
+        score = _score(element, text_length)
+        # Prefer the deepest container that still holds enough of the page: ties go to descendants
+        if score >= best_score * 0.95:
+            best, best_score = element, score
+    if best is None or best is root:
+        return None
+    return best
+
+
+def extract_main_content(tree: etree._Element) -> Tuple[etree._Element, int, bool]:
+    """
+    Strip boilerplate and narrow the tree down to its main content.
+
+    Returns:
+        Tuple[element, int, bool]: The element to convert, how many blocks were removed,
+        and whether a main content container was found.
+    """
+    removed = remove_boilerplate(tree)
+    main = find_main_content(tree)
+    if main is None:
+        return tree, removed, False
+
+    # Keep pagination blocks that live outside the main container
+    outside_pagination = [
+        element for element in tree.xpath("//nav|//ul|//ol|//div")
+        if not _is_inside(element, main) and not _is_inside(main, element) and is_pagination_block(element)
+    ]
+    wrapper = lxml_html.Element("body")
+    wrapper.append(main)
+    for element in outside_pagination:
+        if element.getparent() is not None and not any(_is_inside(element, kept) for kept in wrapper):
+            wrapper.append(element)
+    return wrapper, removed, True
+
+
+def _is_inside(element, ancestor) -> bool:
+    while element is not None:
+        if element is ancestor:
+            return True
+        element = element.getparent()
+    return False
+
+
+def convert_html_to_markdown(html_content, base_url: Optional[str] = None,
+                             main_content: bool = True) -> Tuple[str, ConversionReport]:
+    """Convert a page to markdown, keeping only its main content unless main_content is False."""
+    tree = clean_tree(parse_html(html_content))
+    removed, found = 0, False
+    if main_content:
+        tree, removed, found = extract_main_content(tree)
+    markdown = tree_to_markdown(tree, base_url)
+    html_content = html_content or ""
+    report = ConversionReport(len(html_content), len(markdown), estimate_tokens(html_content),
+                              estimate_tokens(markdown), removed, found)
+    return markdown, report
+
@@ -0,0 +1,371 @@
+# crawl_frontier.py
+
+"""
+Crawl frontier for paginated scrapes.
+
+The frontier decides which page to fetch next and remembers every page it has seen:
+
+- URLs are canonicalised (case, default port, fragment, parameter order, tracking
+  parameters) before they are compared, so one page reached through different links is
+  queued once.
+- The seen-set is a Bloom filter in memory in front of a SQLite table on disk. A URL
+  the filter has never seen is new without touching SQLite; only the filter's rare
+  "maybe" answers are checked against the table, so it stays exact at millions of URLs.
+- Each domain has its own queue and is not requested more often than every
+  FRONTIER_DOMAIN_DELAY seconds; domains take turns.
+- Jobs stop queuing at max_pages and don't follow pagination deeper than max_depth.
+- The whole state lives in CACHE_DIR/FRONTIER_DIR/<job>.sqlite and every change is
+  committed as it happens, so a crashed job started again with the same name picks up
+  where it stopped; pages that were in flight are fetched again.
+
+crawl_paginated() drives a frontier: it scrapes every page and queues the pagination
+URLs detected on it. A page without listings, or repeating one already scraped, is past
+the end of its range: the pages queued after it from the same range are skipped.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from assets import (
+    CACHE_DIR,
+    FRONTIER_BLOOM_CAPACITY,
+    FRONTIER_BLOOM_ERROR,
+    FRONTIER_DIR,
+    FRONTIER_DOMAIN_DELAY,
+    FRONTIER_MAX_ATTEMPTS,
+    FRONTIER_MAX_DEPTH,
+    FRONTIER_MAX_PAGES,
+)
+from driver_pool import describe_pool_usage, get_driver_pool_stats
+from http_fetcher import get_domain
+from metering import start_run
+from pagination_cache import get_pagination_cache
+from pagination_detector import detect_pagination_elements
+from scraper import fetch_html, html_to_markdown_with_readability, scrape_url
+from url_utils import canonicalize_url
+
+
+class BloomFilter:
+    """Set membership in a fixed bit array: no false negatives, `error_rate` false positives at `capacity`."""
+
+    def __init__(self, capacity: int = FRONTIER_BLOOM_CAPACITY, error_rate: float = FRONTIER_BLOOM_ERROR):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class FrontierEntry:
+    def __init__(self, number: int, url: str, depth: int, detect: bool, attempts: int, parent: Optional[int] = None):
+        self.number = number      # stable across resumes; used as the page's file number
+        self.url = url
+        self.depth = depth
+        self.detect = detect      # look for pagination on this page
+        self.attempts = attempts
+        self.parent = parent      # number of the page whose pagination queued this one
+
+
+class CrawlFrontier:
+    def __init__(self, job: str, directory: str = os.path.join(CACHE_DIR, FRONTIER_DIR),
+                 max_pages: int = FRONTIER_MAX_PAGES, max_depth: int = FRONTIER_MAX_DEPTH,
+                 domain_delay: float = FRONTIER_DOMAIN_DELAY, max_attempts: int = FRONTIER_MAX_ATTEMPTS):
+        self.job = job
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.domain_delay = domain_delay
+        self.max_attempts = max_attempts
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{job}.sqlite")
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                number INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                parent INTEGER,
+                detect INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS urls_queue ON urls (domain, state, attempts, depth, number)")
+        # Pages in flight when the last run stopped are fetched again
+        resumed = self._db.execute("UPDATE urls SET state = 'queued' WHERE state = 'in_progress'").rowcount
+        self._db.commit()
+
+        self._seen = BloomFilter()
+        for (key,) in self._db.execute("SELECT key FROM urls"):
+            self._seen.add(key)
+        self._total = self._seen.count
+        self._queued: Dict[str, int] = dict(self._db.execute(
+            "SELECT domain, COUNT(*) FROM urls WHERE state = 'queued' GROUP BY domain").fetchall())
+        self._ready_at: Dict[str, float] = {}
+        if self._total:
+            logging.info(f"Resuming crawl {job}: {self._total} URLs known, {sum(self._queued.values())} queued "
+                         f"({resumed} were in flight)")
+
+    # Seen-set
+
+    def _known(self, key: str) -> bool:
+        # Called with the lock held
+        if key not in self._seen:
+            return False
+        return self._db.execute("SELECT 1 FROM urls WHERE key = ?", (key,)).fetchone() is not None
+
+    def seen(self, url: str) -> bool:
+        with self._lock:
+            return self._known(canonicalize_url(url))
+
+    def capacity(self) -> int:
+        """How many more URLs the job may queue."""
+        with self._lock:
+            return max(0, self.max_pages - self._total)
+
+    # Queueing
+
+    def add_many(self, urls: Iterable[Tuple[str, bool]], depth: int = 0, parent: Optional[int] = None) -> int:
+        """
+        Queue (url, detect) pairs found at `depth`; detect asks for pagination to be looked
+        for on that page. Known URLs and anything past the depth or page caps are skipped.
+        Returns how many were queued.
+        """
+        if depth > self.max_depth:
+            return 0
+        added = 0
+        now = time.time()
+        with self._lock:
+            for url, detect in urls:
+                if self._total >= self.max_pages:
+                    break
+                key = canonicalize_url(url)
+                if self._known(key):
+                    continue
+                domain = get_domain(key)
+                self._db.execute(
+                    "INSERT INTO urls (key, url, domain, depth, parent, detect, state, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                    (key, url, domain, depth, parent, int(detect), now))
+                self._seen.add(key)
+                self._total += 1
+                self._queued[domain] = self._queued.get(domain, 0) + 1
+                added += 1
+            self._db.commit()
+        return added
+
+    def add(self, url: str, depth: int = 0, parent: Optional[int] = None, detect: bool = True) -> bool:
+        return self.add_many([(url, detect)], depth, parent) == 1
+
+    def pop(self, block: bool = True) -> Optional[FrontierEntry]:
+        """
+        The next page to fetch, from the domain that has waited longest for its turn.
+        With block, waits for a domain's politeness delay; returns None once nothing is queued.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                domains = [domain for domain, count in self._queued.items() if count > 0]
+                if not domains:
+                    return None
+                domain = min(domains, key=lambda d: self._ready_at.get(d, 0.0))
+                wait = self._ready_at.get(domain, 0.0) - now
+                if wait <= 0:
+                    return self._take(domain, now)
+            if not block:
+                return None
+            time.sleep(min(wait, 1.0))
+
+    def _take(self, domain: str, now: float) -> FrontierEntry:
+        # Called with the lock held
+        number, url, depth, detect, attempts, parent = self._db.execute(
+            "SELECT number, url, depth, detect, attempts, parent FROM urls WHERE domain = ? AND state = 'queued' "
+            "ORDER BY attempts, depth, number LIMIT 1", (domain,)).fetchone()
+        self._db.execute("UPDATE urls SET state = 'in_progress', updated_at = ? WHERE number = ?",
+                         (time.time(), number))
+        self._db.commit()
+        self._queued[domain] -= 1
+        self._ready_at[domain] = now + self.domain_delay
+        return FrontierEntry(number, url, depth, bool(detect), attempts, parent)
+
+    def mark_done(self, entry: FrontierEntry):
+        self._finish(entry, "done", None)
+
+    def mark_failed(self, entry: FrontierEntry, error: str):
+        """Queue the page again, behind the domain's untried pages, until it has failed max_attempts times."""
+        retry = entry.attempts + 1 < self.max_attempts
+        self._finish(entry, "queued" if retry else "failed", error)
+        if retry:
+            with self._lock:
+                domain = get_domain(canonicalize_url(entry.url))
+                self._queued[domain] = self._queued.get(domain, 0) + 1
+
+    def _finish(self, entry: FrontierEntry, state: str, error: Optional[str]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE urls SET state = ?, attempts = attempts + ?, error = ?, updated_at = ? WHERE number = ?",
+                (state, 0 if state == "done" else 1, error, time.time(), entry.number))
+            self._db.commit()
+
+    def children(self, parent: int) -> List[int]:
+        """Numbers of the pages queued from `parent`'s pagination, in the order they were found."""
+        with self._lock:
+            return [number for (number,) in self._db.execute(
+                "SELECT number FROM urls WHERE parent = ? ORDER BY number", (parent,))]
+
+    def skip_after(self, entry: FrontierEntry) -> int:
+        """Stop fetching the pages queued after `entry` from the same range; returns how many were dropped."""
+        if entry.parent is None:
+            return 0
+        with self._lock:
+            counts = self._db.execute(
+                "SELECT domain, COUNT(*) FROM urls WHERE parent = ? AND number > ? AND state = 'queued' "
+                "GROUP BY domain", (entry.parent, entry.number)).fetchall()
+            self._db.execute(
+                "UPDATE urls SET state = 'skipped', updated_at = ? WHERE parent = ? AND number > ? AND state = 'queued'",
+                (time.time(), entry.parent, entry.number))
+            self._db.commit()
+            for domain, count in counts:
+                self._queued[domain] -= count
+        return sum(count for _, count in counts)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            states = dict(self._db.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+            domains = self._db.execute("SELECT COUNT(DISTINCT domain) FROM urls").fetchone()[0]
+        return {"job": self.job, "urls": self._total, "domains": domains, "queued": states.get("queued", 0),
+                "in_progress": states.get("in_progress", 0), "done": states.get("done", 0),
+                "failed": states.get("failed", 0), "skipped": states.get("skipped", 0)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def crawl_job_name(start_urls: List[str], fields: List[str]) -> str:
+    """The same start URLs and fields give the same job, so running a crawl again resumes it."""
+    signature = "\n".join(sorted(canonicalize_url(url) for url in start_urls) + ["|"] + list(fields))
+    return hashlib.sha256(signature.encode("utf-8")).hexdigest()[:16]
+
+
+def pagination_links(frontier: CrawlFrontier, pagination_data) -> List[Tuple[str, bool]]:
+    """
+    New page URLs of a detection result, expanded only as far as the job can still queue.
+    Only the last one is marked for detection: the end of a range is just the last page
+    the pager showed (1 2 3 ... of a longer list), and next links and cursors continue
+    from there too. When it really was the last page, detecting on it finds nothing new.
+    """
+    fresh = []
+    for page_url in pagination_data.urls():
+        if len(fresh) >= frontier.capacity():
+            break
+        if not frontier.seen(page_url):
+            fresh.append(page_url)
+    return [(page_url, index == len(fresh) - 1) for index, page_url in enumerate(fresh)]
+
+
+def listing_count(formatted_data) -> int:
+    if hasattr(formatted_data, "listings"):
+        return len(formatted_data.listings)
+    if isinstance(formatted_data, dict):
+        return len(formatted_data.get("listings") or [])
+    return 1  # some other shape: assume the page had content
+
+
+def end_of_range(frontier: CrawlFrontier, entry: FrontierEntry, cache_checks: Dict[int, str], reason: str):
+    """`entry` came back empty or repeated: the rest of its range is past the site's last page."""
+    skipped = frontier.skip_after(entry)
+    logging.info(f"{entry.url} {reason}, skipping the {skipped} pages queued after it")
+    cached_for = cache_checks.pop(entry.number, None)
+    if cached_for is not None:
+        # Even the first page of a cached template failed: the template no longer fits the site
+        get_pagination_cache().invalidate(cached_for, f"{entry.url} {reason}")
+
+
+def crawl_paginated(start_urls: List[str], fields: List[str], selected_model: str, output_folder: str,
+                    job: Optional[str] = None, indications: str = "", max_pages: int = FRONTIER_MAX_PAGES,
+                    max_depth: int = FRONTIER_MAX_DEPTH, fetch_mode: str = "auto") -> List[Dict]:
+    """
+    Scrape the start URLs and every page of their pagination, one page per domain at a time.
+
+    Calling it again with the same job (by default derived from start_urls and fields)
+    resumes the crawl. Returns one result per page scraped in this call.
+    """
+    frontier = CrawlFrontier(job or crawl_job_name(start_urls, fields), max_pages=max_pages, max_depth=max_depth)
+    frontier.add_many(((url, True) for url in start_urls), depth=0)
+    ledger = start_run()
+    pool_before = get_driver_pool_stats()
+    results = []
+    page_hashes = set()
+    cache_checks: Dict[int, str] = {}  # first page of a cached template -> URL the template was applied to
+    try:
+        while True:
+            entry = frontier.pop()
+            if entry is None:
+                break
+            try:
+                html = fetch_html(entry.url, fetch_mode=fetch_mode)
+                markdown = html_to_markdown_with_readability(html, entry.url)
+                content_hash = hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+                if content_hash in page_hashes:
+                    end_of_range(frontier, entry, cache_checks, "repeats a page already scraped")
+                    frontier.mark_done(entry)
+                    continue
+                page_hashes.add(content_hash)
+                input_tokens, output_tokens, total_cost, formatted_data = scrape_url(
+                    entry.url, fields, selected_model, output_folder, entry.number, markdown, html)
+                if formatted_data is None:
+                    raise RuntimeError("extraction failed")
+                if not listing_count(formatted_data):
+                    end_of_range(frontier, entry, cache_checks, "has no listings")
+                elif entry.detect:
+                    pagination_data, _, _ = detect_pagination_elements(entry.url, indications, selected_model,
+                                                                       markdown, html)
+                    added = frontier.add_many(pagination_links(frontier, pagination_data), entry.depth + 1,
+                                              entry.number)
+                    if added and pagination_data.source == "cache":
+                        cache_checks[frontier.children(entry.number)[0]] = entry.url
+            except Exception as e:
+                logging.error(f"Crawl {frontier.job} failed on {entry.url}: {e}")
+                frontier.mark_failed(entry, str(e))
+                continue
+            frontier.mark_done(entry)
+            results.append({"url": entry.url, "file_number": entry.number, "depth": entry.depth,
+                            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_cost": total_cost,
+                            "formatted_data": formatted_data})
+    finally:
+        stats = frontier.stats()
+        frontier.close()
+    totals = ledger.totals()
+    print(f"crawl {stats['job']}: {stats['done']} pages done, {stats['failed']} failed, {stats['skipped']} skipped, "
+          f"{stats['queued']} queued across {stats['domains']} domains; ${totals['cost']:.4f} of LLM calls")
+    pool_usage = describe_pool_usage(pool_before)
+    if pool_usage:
+        print(pool_usage)
+    return results
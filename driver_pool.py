@@ -0,0 +1,319 @@
+# driver_pool.py
+
+"""
+A small pool of warm Chrome WebDrivers.
+
+Launching Chrome (and resolving chromedriver) for every page costs a few seconds
+and a few hundred MB of churn, so the scraper borrows drivers from this pool instead.
+Drivers are health-checked when handed out, reset (cookies, storage, extra tabs)
+when returned, and recycled after a number of pages or once Chrome grows too large.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from assets import (
+    DRIVER_ACQUIRE_TIMEOUT,
+    DRIVER_MAX_PAGES,
+    DRIVER_MAX_RSS_MB,
+    DRIVER_POOL_SIZE,
+)
+
+try:
+    import psutil
+except ImportError:
+    # Without psutil we can't measure Chrome's memory; recycling falls back to page count only
+    psutil = None
+
+
+class PooledDriver:
+    """A WebDriver plus the bookkeeping the pool needs to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.pages_served = 0
+        self.acquired_at: Optional[float] = None
+
+    def rss_mb(self) -> Optional[float]:
+        """Resident memory of chromedriver and all Chrome processes it spawned, in MB."""
+        if psutil is None:
+            return None
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except Exception:
+            return None
+
+
+class DriverPool:
+    def __init__(self, factory: Callable, size: int = DRIVER_POOL_SIZE, max_pages: int = DRIVER_MAX_PAGES,
+                 max_rss_mb: Optional[float] = DRIVER_MAX_RSS_MB, acquire_timeout: float = DRIVER_ACQUIRE_TIMEOUT):
+        """
+        Args:
+            factory (Callable): Zero-argument callable returning a new WebDriver.
+            size (int): Maximum number of drivers alive at once.
+            max_pages (int): Recycle a driver after it has served this many pages.
+            max_rss_mb (float): Recycle a driver once its process tree exceeds this RSS (None disables).
+            acquire_timeout (float): Seconds to wait for a free driver before raising TimeoutError.
+        """
+        self._factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: List[PooledDriver] = []
+        self._in_use = 0
+        self._alive = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._started_at = time.monotonic()
+
+        self._stats = {
+            "created": 0,
+            "recycled": 0,
+            "unhealthy": 0,
+            "acquisitions": 0,
+            "pages_served": 0,
+            "wait_seconds": 0.0,
+            "busy_seconds": 0.0,
+        }
+
+    def warm(self, count: Optional[int] = None):
+        """Start drivers ahead of time so the first pages don't pay the launch cost."""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._cond:
+                if self._closed or self._alive >= count:
+                    return
+                self._alive += 1
+            pooled = self._create()
+            with self._cond:
+                if pooled is None:
+                    self._alive -= 1
+                    return
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def acquire(self) -> PooledDriver:
+        """Hand out a healthy driver, starting a new one if the pool isn't full yet."""
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._alive >= self.size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No WebDriver became available within {self.acquire_timeout}s")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("The driver pool has been shut down")
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    pooled = None
+                    self._alive += 1
+
+            if pooled is None:
+                pooled = self._create()
+                if pooled is None:
+                    with self._cond:
+                        self._alive -= 1
+                        self._cond.notify()
+                    raise RuntimeError("Could not start a Chrome WebDriver")
+            elif not self._is_healthy(pooled):
+                self._stats["unhealthy"] += 1
+                self._discard(pooled)
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                self._stats["acquisitions"] += 1
+                self._stats["wait_seconds"] += time.monotonic() - start
+            pooled.acquired_at = time.monotonic()
+            return pooled
+
+    def release(self, pooled: PooledDriver, healthy: bool = True):
+        """Return a driver to the pool, resetting or recycling it as needed."""
+        pooled.pages_served += 1
+        with self._cond:
+            self._in_use -= 1
+            self._stats["pages_served"] += 1
+            if pooled.acquired_at is not None:
+                self._stats["busy_seconds"] += time.monotonic() - pooled.acquired_at
+            pooled.acquired_at = None
+
+        if not healthy:
+            self._stats["unhealthy"] += 1
+            self._discard(pooled)
+            return
+        if self._should_recycle(pooled):
+            self._stats["recycled"] += 1
+            self._discard(pooled)
+            return
+        if not self._reset(pooled):
+            self._stats["unhealthy"] += 1
+            self._discard(pooled)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._alive -= 1
+                self._quit(pooled)
+                return
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver for the duration of a `with` block."""
+        pooled = self.acquire()
+        healthy = True
+        try:
+            yield pooled.driver
+        except Exception:
+            # A failing page may have left the browser in a bad state; only keep it if it still responds
+            healthy = self._is_healthy(pooled)
+            raise
+        finally:
+            self.release(pooled, healthy=healthy)
+
+    def stats(self) -> Dict:
+        """Pool utilisation figures, suitable for logging or showing in the UI."""
+        with self._cond:
+            uptime = time.monotonic() - self._started_at
+            busy = self._stats["busy_seconds"]
+            acquisitions = self._stats["acquisitions"]
+            return {
+                "size": self.size,
+                "uptime_seconds": uptime,
+                "alive": self._alive,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._stats,
+                "avg_wait_seconds": self._stats["wait_seconds"] / acquisitions if acquisitions else 0.0,
+                "utilisation": busy / (self.size * uptime) if uptime > 0 else 0.0,
+            }
+
+    def shutdown(self):
+        """Quit every idle driver; drivers still in use are quit when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._alive -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+
+    def _create(self) -> Optional[PooledDriver]:
+        try:
+            driver = self._factory()
+        except Exception as e:
+            logging.error(f"Failed to start a WebDriver for the pool: {e}")
+            return None
+        self._stats["created"] += 1
+        return PooledDriver(driver)
+
+    def _discard(self, pooled: PooledDriver):
+        self._quit(pooled)
+        with self._cond:
+            self._alive -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _quit(pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logging.warning(f"Error while quitting a pooled WebDriver: {e}")
+
+    @staticmethod
+    def _is_healthy(pooled: PooledDriver) -> bool:
+        try:
+            return len(pooled.driver.window_handles) > 0
+        except Exception:
+            return False
+
+    def _should_recycle(self, pooled: PooledDriver) -> bool:
+        if self.max_pages and pooled.pages_served >= self.max_pages:
+            return True
+        if self.max_rss_mb:
+            rss = pooled.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                logging.info(f"Recycling WebDriver using {rss:.0f} MB after {pooled.pages_served} pages")
+                return True
+        return False
+
+    @staticmethod
+    def _reset(pooled: PooledDriver) -> bool:
+        """Close extra tabs and clear cookies/storage so the next page starts clean."""
+        driver = pooled.driver
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            try:
+                # Every site's cookies and storage, not just the current document's origin
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": "*", "storageTypes": "all"})
+            except Exception:
+                # No DevTools protocol (not Chrome): clear what WebDriver can reach
+                driver.delete_all_cookies()
+                try:
+                    driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+                except Exception:
+                    # Storage isn't accessible on some pages (e.g. about:blank, data: urls)
+                    pass
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logging.warning(f"Failed to reset pooled WebDriver: {e}")
+            return False
+
+
+_pool: Optional[DriverPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool(factory: Callable) -> DriverPool:
+    """Return the process-wide driver pool, creating it with `factory` on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool(factory)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def get_driver_pool_stats() -> Optional[Dict]:
+    """stats() of the process-wide pool, or None while no page has needed a browser."""
+    with _pool_lock:
+        pool = _pool
+    return pool.stats() if pool is not None else None
+
+
+def describe_pool_usage(before: Optional[Dict]) -> Optional[str]:
+    """
+    One line on the pool's use since `before`, a get_driver_pool_stats() snapshot taken at the
+    start of a run (the pool outlives runs); None if the run didn't use a browser.
+    """
+    after = get_driver_pool_stats()
+    if after is None:
+        return None
+    before = before or {}
+    used = {key: after[key] - before.get(key, 0) for key in
+            ("uptime_seconds", "pages_served", "acquisitions", "wait_seconds", "busy_seconds", "created", "recycled")}
+    if not used["acquisitions"]:
+        return None
+    utilisation = used["busy_seconds"] / (after["size"] * used["uptime_seconds"]) if used["uptime_seconds"] > 0 else 0.0
+    return (f"driver pool: {used['pages_served']} pages on {after['size']} drivers, {utilisation:.0%} busy, "
+            f"{used['wait_seconds'] / used['acquisitions']:.2f}s average wait, {used['created']} started, "
+            f"{used['recycled']} recycled")
@@ -0,0 +1,160 @@
+# extraction_cache.py
+
+"""
+Persistent cache of LLM extraction results.
+
+A result is keyed by a hash of the normalised markdown, the requested fields, the model
+and EXTRACTION_PROMPT_VERSION, so re-scraping a page whose content hasn't changed returns
+the earlier listings without another model call. Entries expire after EXTRACTION_CACHE_TTL
+and the least recently used ones are evicted once the cache grows past EXTRACTION_CACHE_MAX_MB.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from assets import (
+    CACHE_DIR,
+    EXTRACTION_CACHE_FILE,
+    EXTRACTION_CACHE_MAX_MB,
+    EXTRACTION_CACHE_TTL,
+    EXTRACTION_PROMPT_VERSION,
+)
+from html_processing import WHITESPACE
+from metering import record_call
+
+
+class CachedExtraction:
+    def __init__(self, data: Dict, token_counts: Dict[str, int], created_at: float):
+        self.data = data
+        self.token_counts = token_counts  # what the original call cost
+        self.created_at = created_at
+
+
+def normalize_markdown(markdown: str) -> str:
+    """Collapse whitespace so re-wrapped but otherwise identical pages share a key."""
+    return "\n".join(WHITESPACE.sub(" ", line).strip() for line in markdown.splitlines() if line.strip())
+
+
+class ExtractionCache:
+    def __init__(self, path: str = os.path.join(CACHE_DIR, EXTRACTION_CACHE_FILE), ttl: float = EXTRACTION_CACHE_TTL,
+                 max_bytes: int = EXTRACTION_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS extractions_accessed ON extractions (accessed_at)")
+        self._db.commit()
+
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0,
+                       "input_tokens_saved": 0, "output_tokens_saved": 0}
+
+    @staticmethod
+    def make_key(markdown: str, fields: List[str], model: str,
+                 prompt_version: int = EXTRACTION_PROMPT_VERSION) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{prompt_version}\n{model}\n{json.dumps(list(fields))}\n".encode("utf-8"))
+        digest.update(normalize_markdown(markdown).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, markdown: str, fields: List[str], model: str) -> Optional[CachedExtraction]:
+        key = self.make_key(markdown, fields, model)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, input_tokens, output_tokens, created_at FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            data, input_tokens, output_tokens, created_at = row
+            if now - created_at >= self.ttl:
+                self._db.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                self._db.commit()
+                self._stats["expired"] += 1
+                return None
+            self._db.execute("UPDATE extractions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._stats["hits"] += 1
+            self._stats["input_tokens_saved"] += input_tokens
+            self._stats["output_tokens_saved"] += output_tokens
+
+        token_counts = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        record_call(None, model, cache_hit=True, saved_tokens=token_counts)
+        return CachedExtraction(json.loads(zlib.decompress(data).decode("utf-8")), token_counts, created_at)
+
+    def put(self, markdown: str, fields: List[str], model: str, data: Dict, token_counts: Dict[str, int]):
+        blob = zlib.compress(json.dumps(data).encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(markdown, fields, model), model, blob, len(blob),
+                 token_counts.get("input_tokens", 0), token_counts.get("output_tokens", 0), now, now),
+            )
+            self._db.commit()
+            self._stats["stores"] += 1
+            self._evict(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["expired"]
+        return {
+            **self._stats,
+            "entries": entries,
+            "size_mb": round(total / (1024 * 1024), 2),
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM extractions")
+            self._db.commit()
+
+    def _evict(self, now: float):
+        # Called with the lock held: drop expired entries, then least recently used ones until under budget
+        self._db.execute("DELETE FROM extractions WHERE created_at <= ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total > self.max_bytes:
+            for key, size in self._db.execute(
+                    "SELECT key, size FROM extractions ORDER BY accessed_at").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                total -= size
+                self._stats["evictions"] += 1
+        self._db.commit()
+
+
+_cache: Optional[ExtractionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
@@ -0,0 +1,232 @@
+# fetch_cache.py
+
+"""
+On-disk cache of fetched pages.
+
+Entries are keyed by the normalised URL plus the fetch profile (plain HTTP, or the
+browser with a given blocking profile), so the same URL fetched different ways is
+cached separately. Browser entries keep the URL fragment, since the page's scripts
+render hash-routed pages (/#/page/2) differently per fragment. Page bodies are stored gzip-compressed under the hash of their
+content, so identical pages share one file. A small SQLite index keeps validators
+(ETag / Last-Modified) for conditional revalidation, access times for LRU eviction,
+and the total size used to enforce FETCH_CACHE_MAX_MB.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from assets import CACHE_DIR, FETCH_CACHE_DIR, FETCH_CACHE_MAX_MB, FETCH_CACHE_TTL
+from url_utils import normalize_url
+
+
+class CachedPage:
+    def __init__(self, url: str, html: str, fetched_at: float, etag: Optional[str], last_modified: Optional[str],
+                 ttl: float):
+        self.url = url
+        self.html = html
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ttl = ttl
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < self.ttl
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class FetchCache:
+    def __init__(self, directory: str = os.path.join(CACHE_DIR, FETCH_CACHE_DIR), ttl: float = FETCH_CACHE_TTL,
+                 max_bytes: int = FETCH_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._bodies = os.path.join(directory, "bodies")
+        os.makedirs(self._bodies, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                profile TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._db.commit()
+
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def cache_url(url: str, profile: str) -> str:
+        """normalize_url, keeping the fragment for browser profiles."""
+        fragment = urlsplit(url.strip()).fragment
+        if fragment and profile.startswith("browser"):
+            return f"{normalize_url(url)}#{fragment}"
+        return normalize_url(url)
+
+    @classmethod
+    def make_key(cls, url: str, profile: str) -> str:
+        return hashlib.sha256(f"{profile}\n{cls.cache_url(url, profile)}".encode("utf-8")).hexdigest()
+
+    def get(self, url: str, profile: str) -> Optional[CachedPage]:
+        """
+        Look up a page. Returns fresh and stale entries alike (check `is_fresh`);
+        a stale entry can still be revalidated with its validators.
+        """
+        key = self.make_key(url, profile)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            content_hash, etag, last_modified, fetched_at = row
+            html = self._read_body(content_hash)
+            if html is None:
+                # Body file went missing; treat as a miss and drop the dangling row
+                self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._db.commit()
+                self._stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+        page = CachedPage(url, html, fetched_at, etag, last_modified, self.ttl)
+        self._stats["hits" if page.is_fresh else "stale"] += 1
+        return page
+
+    def put(self, url: str, profile: str, html: str, etag: Optional[str] = None,
+            last_modified: Optional[str] = None):
+        body = html.encode("utf-8")
+        content_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(content_hash)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=5) as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT content_hash FROM pages WHERE key = ?",
+                                   (self.make_key(url, profile),)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(url, profile), self.cache_url(url, profile), profile, content_hash, size, etag,
+                 last_modified, now, now),
+            )
+            if old and old[0] != content_hash:
+                self._delete_body_if_unused(old[0])
+            self._db.commit()
+            self._stats["stores"] += 1
+            self._evict()
+
+    def mark_revalidated(self, url: str, profile: str):
+        """The origin answered 304 Not Modified: the entry is fresh again."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                             (now, now, self.make_key(url, profile)))
+            self._db.commit()
+            self._stats["revalidated"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        lookups = self._stats["hits"] + self._stats["stale"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": entries,
+            "size_mb": round(total / (1024 * 1024), 2),
+            "hit_rate": (self._stats["hits"] + self._stats["revalidated"]) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            hashes = [row[0] for row in self._db.execute("SELECT DISTINCT content_hash FROM pages")]
+            self._db.execute("DELETE FROM pages")
+            self._db.commit()
+            for content_hash in hashes:
+                self._remove_file(self._body_path(content_hash))
+
+    def _evict(self):
+        # Called with the lock held. Bodies are shared, so sum distinct bodies rather than rows.
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, content_hash in self._db.execute(
+                "SELECT key, content_hash FROM pages ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            freed = self._delete_body_if_unused(content_hash)
+            total -= freed
+            self._stats["evictions"] += 1
+        self._db.commit()
+
+    def _delete_body_if_unused(self, content_hash: str) -> int:
+        in_use = self._db.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        if in_use:
+            return 0
+        path = self._body_path(content_hash)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._remove_file(path)
+        return size
+
+    def _body_path(self, content_hash: str) -> str:
+        return os.path.join(self._bodies, f"{content_hash}.html.gz")
+
+    def _read_body(self, content_hash: str) -> Optional[str]:
+        try:
+            with gzip.open(self._body_path(content_hash), "rb") as f:
+                return f.read().decode("utf-8")
+        except (OSError, EOFError):
+            return None
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Could not remove cached page {path}: {e}")
+
+
+_cache: Optional[FetchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_fetch_cache() -> FetchCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FetchCache()
+        return _cache
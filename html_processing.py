@@ -0,0 +1,298 @@
+# html_processing.py
+
+"""
+Single-parse HTML processing.
+
+The page is parsed once with lxml, every cleaning transform is applied to that tree,
+and plain text, markdown and the list of links are all produced from the same tree.
+This replaces the old path that parsed with html.parser, serialised back to a string
+and parsed again for each output format.
+
+Run this module directly to benchmark it against the old BeautifulSoup path:
+
+    python html_processing.py page.html [repeats]
+"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from lxml import etree
+from lxml import html as lxml_html
+
+# Removed before any output is produced
+DROP_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "canvas", "object", "embed",
+             "link", "meta", "head", "header", "footer"]
+
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "aside", "nav", "form", "fieldset", "figure",
+              "figcaption", "blockquote", "address", "dl", "dt", "dd", "ul", "ol", "li", "table", "tr",
+              "thead", "tbody", "tfoot", "pre", "hr", "body", "html", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+WHITESPACE = re.compile(r"\s+")
+BLANK_LINES = re.compile(r"\n{3,}")
+
+
+class ProcessedPage:
+    def __init__(self, text: str, markdown: str, links: List[Dict[str, str]]):
+        self.text = text
+        self.markdown = markdown
+        self.links = links
+
+
+def parse_html(html_content) -> etree._Element:
+    """Parse a page with lxml, tolerating documents that declare their own encoding."""
+    if not html_content or not str(html_content).strip():
+        return lxml_html.document_fromstring("<html><body></body></html>")
+    try:
+        return lxml_html.document_fromstring(html_content)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return lxml_html.document_fromstring(html_content.encode("utf-8"))
+
+
+def clean_tree(tree: etree._Element) -> etree._Element:
+    """Drop scripts, styles, headers, footers, hidden elements and comments in place."""
+    for element in tree.xpath("//comment() | //processing-instruction()"):
+        if element.getparent() is not None:
+            _remove_keep_tail(element)
+    for element in tree.xpath("|".join(f"//{tag}" for tag in DROP_TAGS) + "|//*[@hidden]"):
+        if element.getparent() is not None:
+            _remove_keep_tail(element)
+    return tree
+
+
+def _remove_keep_tail(element):
+    # drop_tree() on lxml.html elements keeps the tail text that follows the element
+    if hasattr(element, "drop_tree"):
+        element.drop_tree()
+        return
+    parent = element.getparent()
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def tree_to_text(tree: etree._Element) -> str:
+    """Visible text with one line per block element."""
+    parts: List[str] = []
+    _collect_text(tree, parts)
+    lines = (WHITESPACE.sub(" ", line).strip() for line in "".join(parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _collect_text(element, parts: List[str]):
+    if isinstance(element.tag, str):
+        separator = "\n" if element.tag in BLOCK_TAGS or element.tag == "br" else (
+            " " if element.tag in ("td", "th") else "")
+        parts.append(separator)
+        if element.text:
+            parts.append(element.text)
+        for child in element:
+            _collect_text(child, parts)
+        parts.append(separator)
+    if element.tail:
+        parts.append(element.tail)
+
+
+def extract_links(tree: etree._Element, base_url: Optional[str] = None) -> List[Dict[str, str]]:
+    links = []
+    for anchor in tree.iter("a"):
+        href = (anchor.get("href") or "").strip()
+        if not href or href.startswith(("javascript:", "mailto:", "tel:", "#")):
+            continue
+        links.append({
+            "url": urljoin(base_url, href) if base_url else href,
+            "text": WHITESPACE.sub(" ", anchor.text_content()).strip(),
+            "rel": anchor.get("rel", ""),
+        })
+    return links
+
+
+class _MarkdownWriter:
+    """Walks an lxml tree and writes markdown."""
+
+    def __init__(self, base_url: Optional[str] = None, include_images: bool = False):
+        self.base_url = base_url
+        self.include_images = include_images
+        self.parts: List[str] = []
+        self.list_stack: List[List] = []  # [tag, counter]
+
+    def block_break(self):
+        if self.parts and not self.parts[-1].endswith("\n\n"):
+            self.parts.append("\n\n" if not self.parts[-1].endswith("\n") else "\n")
+
+    def line_break(self):
+        if self.parts and not self.parts[-1].endswith("\n"):
+            self.parts.append("\n")
+
+    def text(self, value: Optional[str]):
+        if not value:
+            return
+        value = WHITESPACE.sub(" ", value)
+        if value == " " and (not self.parts or self.parts[-1].endswith((" ", "\n"))):
+            return
+        if self.parts and self.parts[-1].endswith(("\n", " ")):
+            value = value.lstrip()
+        if value:
+            self.parts.append(value)
+
+    def url(self, value: str) -> str:
+        return urljoin(self.base_url, value) if self.base_url else value
+
+    def inline_text(self, element) -> str:
+        return WHITESPACE.sub(" ", element.text_content()).strip()
+
+    def render(self, element):
+        tag = element.tag if isinstance(element.tag, str) else None
+        if tag is None:
+            self.text(element.tail)
+            return
+
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self.block_break()
+            if self.inline_text(element):
+                # Render the children rather than the bare text so links in titles are kept
+                self.parts.append("#" * int(tag[1]) + " ")
+                self.render_children(element)
+            self.block_break()
+        elif tag == "a":
+            self.render_link(element)
+        elif tag == "img":
+            if self.include_images and element.get("src"):
+                self.parts.append(f"![{element.get('alt', '').strip()}]({self.url(element.get('src'))})")
+        elif tag == "br":
+            self.line_break()
+        elif tag == "hr":
+            self.block_break()
+            self.parts.append("---")
+            self.block_break()
+        elif tag in ("ul", "ol"):
+            # Nested lists stay attached to their parent item
+            separate = self.line_break if self.list_stack else self.block_break
+            separate()
+            self.list_stack.append([tag, 0])
+            self.render_children(element)
+            self.list_stack.pop()
+            separate()
+        elif tag == "li":
+            self.line_break()
+            depth = max(len(self.list_stack) - 1, 0)
+            if self.list_stack and self.list_stack[-1][0] == "ol":
+                self.list_stack[-1][1] += 1
+                marker = f"{self.list_stack[-1][1]}. "
+            else:
+                marker = "- "
+            self.parts.append("  " * depth + marker)
+            self.render_children(element)
+            self.line_break()
+        elif tag == "tr":
+            self.line_break()
+            cells = [self.inline_text(cell) for cell in element if isinstance(cell.tag, str)]
+            self.parts.append("| " + " | ".join(cells) + " |")
+            self.line_break()
+        elif tag in ("strong", "b"):
+            self.wrap_inline(element, "**")
+        elif tag in ("em", "i"):
+            self.wrap_inline(element, "*")
+        elif tag == "code":
+            self.wrap_inline(element, "`")
+        elif tag == "pre":
+            self.block_break()
+            self.parts.append("```\n" + element.text_content().strip("\n") + "\n```")
+            self.block_break()
+        elif tag in BLOCK_TAGS:
+            self.block_break()
+            self.render_children(element)
+            self.block_break()
+        else:
+            # Sibling elements with nothing between them are usually laid out apart; keep their words apart
+            previous = element.getprevious()
+            if previous is not None and not previous.tail and self.parts and not self.parts[-1].endswith((" ", "\n")):
+                self.parts.append(" ")
+            self.render_children(element)
+
+        self.text(element.tail)
+
+    def render_children(self, element):
+        self.text(element.text)
+        for child in element:
+            self.render(child)
+
+    def wrap_inline(self, element, marker: str):
+        value = self.inline_text(element)
+        if value:
+            if self.parts and not self.parts[-1].endswith((" ", "\n")):
+                self.parts.append(" ")
+            self.parts.append(f"{marker}{value}{marker}")
+
+    def render_link(self, element):
+        href = (element.get("href") or "").strip()
+        label = self.inline_text(element)
+        if not label:
+            image = element.find(".//img")
+            label = image.get("alt", "").strip() if image is not None else ""
+        if self.parts and not self.parts[-1].endswith((" ", "\n", "(", "[")):
+            self.parts.append(" ")
+        if href and not href.startswith(("javascript:", "#")):
+            self.parts.append(f"[{label}]({self.url(href)})")
+        elif label:
+            self.parts.append(label)
+
+    def markdown(self) -> str:
+        output = "".join(self.parts)
+        output = "\n".join(line.rstrip() for line in output.splitlines())
+        return BLANK_LINES.sub("\n\n", output).strip() + "\n"
+
+
+def tree_to_markdown(tree: etree._Element, base_url: Optional[str] = None, include_images: bool = False) -> str:
+    body = tree.find("body")
+    writer = _MarkdownWriter(base_url, include_images)
+    writer.render_children(body if body is not None else tree)
+    return writer.markdown()
+
+
+def process_html(html_content, base_url: Optional[str] = None) -> ProcessedPage:
+    """Parse once, clean the tree, and produce text, markdown and links from it."""
+    tree = clean_tree(parse_html(html_content))
+    return ProcessedPage(
+        text=tree_to_text(tree),
+        markdown=tree_to_markdown(tree, base_url),
+        links=extract_links(tree, base_url),
+    )
+
+
+def serialize_tree(tree: etree._Element) -> str:
+    return lxml_html.tostring(tree, encoding="unicode")
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from bs4 import BeautifulSoup
+
+    def legacy_path(html_content):
+        # What scraper.py did before: parse, clean, serialise, then parse again per output
+        soup = BeautifulSoup(html_content, "html.parser")
+        for element in soup.find_all(["header", "footer"]):
+            element.decompose()
+        cleaned = str(soup)
+        text = BeautifulSoup(cleaned, "html.parser").get_text()
+        links = [a.get("href") for a in BeautifulSoup(cleaned, "html.parser").find_all("a")]
+        return text, links
+
+    path = sys.argv[1]
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        page = f.read()
+
+    for name, run in [("html.parser (old)", legacy_path), ("lxml single parse", process_html)]:
+        started = time.perf_counter()
+        for _ in range(repeats):
+            run(page)
+        elapsed = (time.perf_counter() - started) / repeats
+        print(f"{name:<20} {elapsed * 1000:8.1f} ms/page")
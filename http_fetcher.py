@@ -0,0 +1,226 @@
+# http_fetcher.py
+
+"""
+Plain-HTTP fast path for fetching pages.
+
+Most listing pages are rendered server-side, so a pooled keep-alive HTTP client
+returns the same content as Selenium in a fraction of the time. `needs_javascript`
+decides whether a response is usable or whether the page has to go through the browser,
+and `FetchModeMemory` remembers per domain which path worked so later fetches skip the probe.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from assets import (
+    CACHE_DIR,
+    FETCH_CACHE_ENABLED,
+    FETCH_MODES_FILE,
+    HTTP_POOL_MAXSIZE,
+    HTTP_RETRIES,
+    HTTP_TIMEOUT,
+    JS_MARKER_TEXT_CHARS,
+    JS_MIN_TEXT_CHARS,
+    USER_AGENTS,
+)
+from fetch_cache import get_fetch_cache
+
+try:
+    import brotli  # noqa: F401  (lets urllib3 decode "br" responses)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# Containers that single-page apps mount into; empty means nothing was rendered server-side
+APP_ROOT_IDS = ["root", "app", "__next", "__nuxt", "___gatsby", "svelte"]
+
+JS_REQUIRED_MARKERS = re.compile(
+    r"enable javascript|javascript is (?:required|disabled)|requires javascript|turn on javascript",
+    re.IGNORECASE,
+)
+
+BOT_CHALLENGE_MARKERS = re.compile(
+    r"checking your browser|cf-browser-verification|captcha|are you a robot",
+    re.IGNORECASE,
+)
+
+# Fetch cache profile for pages fetched without a browser
+HTTP_CACHE_PROFILE = "http"
+
+# Status codes that usually mean a bot wall the browser may get through
+BROWSER_RETRY_STATUSES = {403, 429, 503}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Process-wide session with keep-alive connection pooling and retries."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retries = Retry(total=HTTP_RETRIES, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                            allowed_methods=["GET", "HEAD"])
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE,
+                                  max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                "User-Agent": random.choice(USER_AGENTS),
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+                "Accept-Encoding": ACCEPT_ENCODING,
+            })
+            _session = session
+        return _session
+
+
+class CachedResponse:
+    """The parts of requests.Response callers use, for pages served from the fetch cache."""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, url: str, text: str):
+        self.url = url
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+def cached_get(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = HTTP_TIMEOUT,
+               use_cache: bool = FETCH_CACHE_ENABLED):
+    """
+    GET a page through the pooled session and the on-disk fetch cache.
+
+    Fresh cache entries are returned without touching the network; stale ones are
+    revalidated with If-None-Match / If-Modified-Since. Like requests.get, this does
+    not raise on error statuses, and only 200 responses are cached.
+    """
+    cache = get_fetch_cache() if use_cache else None
+    entry = cache.get(url, HTTP_CACHE_PROFILE) if cache else None
+    if entry is not None and entry.is_fresh:
+        return CachedResponse(url, entry.html)
+
+    request_headers = dict(headers or {})
+    if entry is not None:
+        request_headers.update(entry.validators())
+    response = get_http_session().get(url, headers=request_headers, timeout=timeout)
+
+    if response.status_code == 304 and entry is not None:
+        cache.mark_revalidated(url, HTTP_CACHE_PROFILE)
+        return CachedResponse(url, entry.html)
+
+    if response.encoding is None or response.encoding.lower() == "iso-8859-1":
+        # requests falls back to latin-1 when the header has no charset; sniff the body instead
+        response.encoding = response.apparent_encoding
+    response.from_cache = False
+    if cache is not None and response.status_code == 200:
+        cache.put(url, HTTP_CACHE_PROFILE, response.text,
+                  etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+    return response
+
+
+def fetch_html_http(url: str, timeout: float = HTTP_TIMEOUT, use_cache: bool = FETCH_CACHE_ENABLED):
+    """Fetch a page with the pooled HTTP session. Raises requests.HTTPError on 4xx/5xx."""
+    response = cached_get(url, timeout=timeout, use_cache=use_cache)
+    response.raise_for_status()
+    return response
+
+
+def needs_javascript(html: str) -> Tuple[bool, str]:
+    """
+    Decide whether HTML fetched without a browser is missing its real content.
+
+    Returns:
+        Tuple[bool, str]: Whether the page needs a browser, and the reason for the decision.
+    """
+    if not html or not html.strip():
+        return True, "empty response"
+    try:
+        tree = lxml_html.fromstring(html)
+    except Exception:
+        return True, "unparseable html"
+
+    for root_id in APP_ROOT_IDS:
+        for element in tree.xpath(f'//*[@id="{root_id}"]'):
+            if len(element) == 0 and not (element.text or "").strip():
+                return True, f"empty app container #{root_id}"
+
+    noscript_text = " ".join(n.text_content() for n in tree.iter("noscript"))
+    for element in tree.xpath("//script|//style|//noscript|//template"):
+        element.drop_tree()
+    body = tree.find("body")
+    text = " ".join((body if body is not None else tree).text_content().split())
+
+    if len(text) < JS_MIN_TEXT_CHARS:
+        return True, f"only {len(text)} characters of visible text"
+    if len(text) < JS_MARKER_TEXT_CHARS:
+        if JS_REQUIRED_MARKERS.search(noscript_text) or JS_REQUIRED_MARKERS.search(text):
+            return True, "page asks for JavaScript"
+        if BOT_CHALLENGE_MARKERS.search(text):
+            return True, "bot challenge page"
+    return False, f"{len(text)} characters of visible text"
+
+
+def get_domain(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class FetchModeMemory:
+    """Per-domain record of whether the plain-HTTP path or the browser produced usable pages."""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, FETCH_MODES_FILE)):
+        self.path = path
+        self._lock = threading.Lock()
+        self._modes: Dict[str, Dict] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._modes = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._modes = {}
+
+    def get(self, domain: str) -> Optional[str]:
+        with self._lock:
+            entry = self._modes.get(domain)
+            return entry["mode"] if entry else None
+
+    def record(self, domain: str, mode: str, reason: str = ""):
+        with self._lock:
+            if self._modes.get(domain, {}).get("mode") == mode:
+                return
+            self._modes[domain] = {"mode": mode, "reason": reason, "updated": time.time()}
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self._modes, f, indent=4)
+            except OSError as e:
+                logging.warning(f"Could not save fetch modes to {self.path}: {e}")
+
+    def forget(self, domain: str):
+        with self._lock:
+            self._modes.pop(domain, None)
+
+
+_memory: Optional[FetchModeMemory] = None
+
+
+def get_fetch_mode_memory() -> FetchModeMemory:
+    global _memory
+    if _memory is None:
+        _memory = FetchModeMemory()
+    return _memory
@@ -0,0 +1,177 @@
+# link_graph.py
+
+"""
+Compact link view of a page for pagination detection.
+
+Pagination lives in a page's links, so the pagination prompt doesn't need the page's text.
+Every same-site link is described by its anchor text, its target, what makes it look like
+pagination (rel=next, a next label, numeric text, a page parameter, sitting in a pager
+block) and how far down the page it is. Links are ranked by those signals and only the top
+PAGINATION_LINK_LIMIT are sent to the model, one short line each, in page order:
+
+    [2](/shop/page/2/) pager 91%
+    [→](/shop/page/2/) next pager 93%
+
+which is a few hundred tokens where the page's markdown was thousands.
+"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+from assets import PAGINATION_LINK_LIMIT, PAGINATION_PARAMS
+from boilerplate_filter import is_pagination_markdown
+from chunking import split_blocks
+from content_extraction import CONTAINER_TAGS, PAGINATION_TEXT, is_pagination_block
+from html_processing import WHITESPACE, parse_html
+from pagination_heuristics import MARKDOWN_LINK, NUMBER, PageLink, page_number
+from url_utils import normalize_url
+
+CONTEXT_CHARS = 40
+PAGE_COUNT = re.compile(r"\bpage\s+\d+\s+(?:of|/)\s+\d+|\b\d+\s*[-–]\s*\d+\s+of\s+[\d,]+", re.IGNORECASE)
+
+
+class LinkCandidate(PageLink):
+    def __init__(self, url: str, text: str = "", rel: str = "", label: str = "", css_class: str = "",
+                 position: float = 0.0, in_pager: bool = False, context: str = ""):
+        super().__init__(url, text, rel, label, css_class)
+        self.position = position  # 0 at the top of the page, 1 at the bottom
+        self.in_pager = in_pager
+        self.context = context
+        self.score = 0.0
+
+
+def _context(text: str) -> str:
+    """A "Page 1 of 48" / "1-16 of 752 results" phrase near the link, if any."""
+    match = PAGE_COUNT.search(text)
+    return match.group(0)[:CONTEXT_CHARS] if match else ""
+
+
+def candidates_from_html(html_content, base_url: str) -> List[LinkCandidate]:
+    tree = parse_html(html_content)
+    elements = [element for element in tree.iter("a", "link")
+                if element.tag == "a" or "next" in (element.get("rel") or "").lower().split()]
+    pagers: Dict[int, bool] = {}
+
+    def in_pager(element) -> bool:
+        for ancestor in element.iterancestors():
+            if ancestor.tag not in CONTAINER_TAGS and ancestor.tag != "nav":
+                continue
+            if id(ancestor) not in pagers:
+                pagers[id(ancestor)] = is_pagination_block(ancestor)
+            if pagers[id(ancestor)]:
+                return True
+            if ancestor.tag in ("main", "form", "table"):
+                break  # a pager is never wider than these
+        return False
+
+    candidates = []
+    for index, element in enumerate(elements):
+        href = (element.get("href") or "").strip()
+        if not href or href.startswith(("javascript:", "mailto:", "tel:", "#")):
+            continue
+        parent = element.getparent()
+        candidates.append(LinkCandidate(
+            urljoin(base_url, href),
+            WHITESPACE.sub(" ", element.text_content()).strip() if element.tag == "a" else "",
+            element.get("rel") or "",
+            (element.get("aria-label") or element.get("title") or "").strip(),
+            element.get("class") or "",
+            position=index / max(len(elements) - 1, 1),
+            in_pager=element.tag == "a" and in_pager(element),
+            context=_context(WHITESPACE.sub(" ", parent.text_content())) if parent is not None else "",
+        ))
+    return candidates
+
+
+def candidates_from_markdown(markdown: str, base_url: str) -> List[LinkCandidate]:
+    candidates = []
+    blocks = split_blocks(markdown or "")
+    offset, total = 0, max(sum(len(block) for block in blocks), 1)
+    for block in blocks:
+        pager = is_pagination_markdown(block)
+        context = _context(MARKDOWN_LINK.sub(" ", block))
+        for match in MARKDOWN_LINK.finditer(block):
+            text, href = match.group(1), match.group(2)
+            candidates.append(LinkCandidate(urljoin(base_url, href), WHITESPACE.sub(" ", text).strip(),
+                                            position=(offset + match.start()) / total, in_pager=pager,
+                                            context=context))
+        offset += len(block)
+    return candidates
+
+
+def score_candidate(candidate: LinkCandidate, current: str) -> float:
+    """
+    How much a link looks like pagination; 0 without any pagination signal (next label,
+    pager-like text, a known page parameter, a pager block), whatever its position.
+    """
+    score = 0.0
+    if "next" in candidate.rel.split():
+        score += 6
+    elif candidate.is_next():
+        score += 5
+    if PAGINATION_TEXT.match(candidate.text):
+        score += 2
+    if NUMBER.match(candidate.text):
+        score += 1
+    readings = page_number(candidate.url)
+    if any(param.lower() in PAGINATION_PARAMS for _, param, _ in readings):
+        score += 3
+    if candidate.in_pager:
+        score += 3
+    if not score:
+        return 0.0
+    if readings:
+        score += 1
+    if candidate.context:
+        score += 1
+    if candidate.position >= 0.6:
+        score += 1
+    if len(candidate.text) > CONTEXT_CHARS:
+        score -= 2
+    if normalize_url(candidate.url) == current:
+        score -= 1
+    return score
+
+
+def rank_links(url: str, markdown: Optional[str] = None, html_content=None,
+               limit: int = PAGINATION_LINK_LIMIT) -> List[LinkCandidate]:
+    """The `limit` same-site links most likely to be pagination, in page order."""
+    candidates = (candidates_from_html(html_content, url) if html_content
+                  else candidates_from_markdown(markdown, url))
+    host = (urlsplit(url).hostname or "").lower()
+    current = normalize_url(url)
+    ranked, seen = [], set()
+    for candidate in candidates:
+        key = (normalize_url(candidate.url), candidate.text)
+        if (urlsplit(candidate.url).hostname or "").lower() != host or key in seen:
+            continue
+        seen.add(key)
+        candidate.score = score_candidate(candidate, current)
+        if candidate.score > 0:
+            ranked.append(candidate)
+    ranked.sort(key=lambda candidate: candidate.score, reverse=True)
+    return sorted(ranked[:limit], key=lambda candidate: candidate.position)
+
+
+def describe_link(candidate: LinkCandidate) -> str:
+    parts = urlsplit(candidate.url)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    text = candidate.text or candidate.label
+    hints = []
+    if "next" in candidate.rel.split():
+        hints.append("rel=next")
+    elif candidate.is_next():
+        hints.append("next")
+    if candidate.in_pager:
+        hints.append("pager")
+    if candidate.context:
+        hints.append(f'"{candidate.context}"')
+    hints.append(f"{candidate.position:.0%}")
+    return f"[{text[:CONTEXT_CHARS]}]({target}) {' '.join(hints)}"
+
+
+def compact_links(url: str, markdown: Optional[str] = None, html_content=None,
+                  limit: int = PAGINATION_LINK_LIMIT) -> str:
+    """The ranked links as the pagination prompt's input; empty when the page has no candidates."""
+    return "\n".join(describe_link(candidate) for candidate in rank_links(url, markdown, html_content, limit))
@@ -0,0 +1,659 @@
+# llm_gateway.py
+
+"""
+Provider-agnostic gateway for every LLM call made by the app.
+
+The gateway owns long-lived clients (one per provider and API key) that share pooled
+keep-alive HTTP connections, so requests don't pay connection and TLS setup each time.
+Transient failures (429, 5xx, timeouts, dropped connections) are retried with jittered
+exponential backoff, honouring Retry-After when the provider sends it. Latency, error and
+token figures are kept per provider and available from `get_gateway().metrics()`.
+
+Every call has an async twin (achat, aparse) built on the providers' async clients, so
+many calls can overlap on one event loop instead of one thread each.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+import google.generativeai as genai
+import httpx
+from groq import AsyncGroq, Groq
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel
+
+from api_management import get_api_key
+from assets import (
+    GROQ_LLAMA_MODEL_FULLNAME,
+    LLAMA_BASE_URL,
+    LLAMA_MODEL_FULLNAME,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_RETRIES,
+    LLM_TIMEOUT,
+)
+from metering import record_call
+from token_accounting import estimate_tokens
+
+# App model name -> (provider, model name the provider expects)
+MODEL_PROVIDERS = {
+    "gpt-4o-mini": ("openai", "gpt-4o-mini"),
+    "gpt-4o-2024-08-06": ("openai", "gpt-4o-2024-08-06"),
+    "gemini-1.5-flash": ("google", "gemini-1.5-flash"),
+    "Llama3.1 8B": ("local", LLAMA_MODEL_FULLNAME),
+    "Groq Llama3.1 70b": ("groq", GROQ_LLAMA_MODEL_FULLNAME),
+}
+
+API_KEY_NAMES = {"openai": "OPENAI_API_KEY", "google": "GOOGLE_API_KEY", "groq": "GROQ_API_KEY"}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+                         "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "TooManyRequests",
+                         "ConnectError", "ReadTimeout", "RemoteProtocolError"}
+
+
+class LLMResponse:
+    def __init__(self, content: Optional[str], input_tokens: int, output_tokens: int, model: str, provider: str,
+                 latency: float, parsed=None):
+        self.content = content
+        self.parsed = parsed
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.model = model
+        self.provider = provider
+        self.latency = latency
+
+    @property
+    def token_counts(self) -> Dict[str, int]:
+        return {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+    def json(self):
+        """The response content parsed as JSON."""
+        return json.loads(self.content)
+
+
+def resolve_model(model: str):
+    """Return (provider, provider model name) for an app model name."""
+    if model in MODEL_PROVIDERS:
+        return MODEL_PROVIDERS[model]
+    if model.startswith("gpt-"):
+        return "openai", model
+    if model.startswith("gemini"):
+        return "google", model
+    raise ValueError(f"Unsupported model: {model}")
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform between 0 and min(cap, base * 2^attempt)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ProviderMetrics:
+    def __init__(self, window: int = 500):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "error_rate": self.errors / self.calls if self.calls else 0.0,
+            "p50_latency": self.percentile(0.5),
+            "p95_latency": self.percentile(0.95),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+async def _close_on_shutdown(client):
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.close()
+
+
+class LLMGateway:
+    def __init__(self, timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 max_connections: int = LLM_MAX_CONNECTIONS):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self._clients: Dict[tuple, object] = {}
+        self._http_clients: Dict[str, httpx.Client] = {}
+        # (provider, api key, loop) -> (client, the task that closes it when the loop shuts down)
+        self._async_clients: Dict[tuple, Tuple[object, asyncio.Task]] = {}
+        self._gemini_key: Optional[str] = None
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, ProviderMetrics] = {}
+
+    # Clients
+
+    def http_client(self, provider: str) -> httpx.Client:
+        """Pooled keep-alive HTTP client shared by every client of a provider."""
+        with self._lock:
+            if provider not in self._http_clients:
+                self._http_clients[provider] = httpx.Client(timeout=self.timeout, limits=self._limits())
+            return self._http_clients[provider]
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections,
+                            keepalive_expiry=60)
+
+    def _api_key(self, provider: str) -> str:
+        return get_api_key(API_KEY_NAMES[provider]) if provider in API_KEY_NAMES else "lm-studio"
+
+    def client(self, provider: str):
+        """Long-lived SDK client for a provider, rebuilt only if its API key changes."""
+        api_key = self._api_key(provider)
+        key = (provider, api_key)
+        with self._lock:
+            cached = self._clients.get(key)
+        if cached is not None:
+            return cached
+
+        if provider == "openai":
+            client = OpenAI(api_key=api_key, max_retries=0, timeout=self.timeout,
+                            http_client=self.http_client(provider))
+        elif provider == "local":
+            client = OpenAI(api_key=api_key, base_url=LLAMA_BASE_URL, max_retries=0, timeout=self.timeout,
+                            http_client=self.http_client(provider))
+        elif provider == "groq":
+            client = Groq(api_key=api_key, max_retries=0, timeout=self.timeout,
+                          http_client=self.http_client(provider))
+        elif provider == "google":
+            # The Gemini SDK keeps its own transport; configure it once per key
+            if self._gemini_key != api_key:
+                genai.configure(api_key=api_key)
+                self._gemini_key = api_key
+            client = genai
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+
+        with self._lock:
+            self._clients[key] = client
+        return client
+
+    def async_client(self, provider: str):
+        """
+        Async SDK client for a provider. Async connection pools belong to the event loop that
+        opened them, so there is one client per provider, API key and running loop.
+        """
+        if provider == "google":
+            # generate_content_async lives on the same module-level client
+            return self.client(provider)
+        api_key = self._api_key(provider)
+        loop = asyncio.get_running_loop()
+        key = (provider, api_key, loop)
+        with self._lock:
+            # Clients of finished loops (e.g. earlier asyncio.run calls) can't be reused
+            stale = [self._async_clients.pop(k) for k in list(self._async_clients) if k[2].is_closed()]
+            cached = self._async_clients.get(key)
+            if cached is not None and cached[0].is_closed():
+                # Closed early (its closing task was cancelled while the loop kept running)
+                del self._async_clients[key]
+                cached = None
+        for client, _ in stale:
+            if not client.is_closed():
+                logging.warning(f"Dropped an async {type(client).__name__} whose event loop closed without "
+                                f"shutting down its tasks; its connections could not be closed")
+        if cached is not None:
+            return cached[0]
+
+        http_client = httpx.AsyncClient(timeout=self.timeout, limits=self._limits())
+        if provider == "openai":
+            client = AsyncOpenAI(api_key=api_key, max_retries=0, timeout=self.timeout, http_client=http_client)
+        elif provider == "local":
+            client = AsyncOpenAI(api_key=api_key, base_url=LLAMA_BASE_URL, max_retries=0, timeout=self.timeout,
+                                 http_client=http_client)
+        elif provider == "groq":
+            client = AsyncGroq(api_key=api_key, max_retries=0, timeout=self.timeout, http_client=http_client)
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+
+        # Once the loop is closed the client's connections can't be closed any more: close it while the
+        # loop shuts down (asyncio.run cancels the tasks left over, which runs this task's cleanup).
+        # The loop only holds weak references to tasks, so the task is kept next to its client:
+        # a garbage-collected task would run its cleanup and close the client mid-run.
+        closer = loop.create_task(_close_on_shutdown(client))
+        with self._lock:
+            self._async_clients[key] = (client, closer)
+        return client
+
+    def has_credentials(self, provider: str) -> bool:
+        """Whether an API key is configured for a provider (the local server needs none)."""
+        if provider not in API_KEY_NAMES:
+            return True
+        try:
+            return bool(get_api_key(API_KEY_NAMES[provider]))
+        except Exception:
+            # No Streamlit session (e.g. a script or batch job): only the environment counts
+            return bool(os.getenv(API_KEY_NAMES[provider]))
+
+    # Calls
+
+    def call(self, provider: str, request: Callable[[], LLMResponse], model: Optional[str] = None,
+             opens_stream: bool = False) -> LLMResponse:
+        """
+        Run `request` with retries and backoff, recording metrics for `provider` and, given
+        `model`, the call in the metering ledger. A stream that opened is metered by its
+        LLMStream once it ends, so with `opens_stream` only a failure to open it is recorded here.
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = request()
+            except Exception as e:
+                delay = self._failed_attempt(provider, attempt, e, model)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            return self._successful_attempt(provider, response, started, None if opens_stream else model)
+
+    async def acall(self, provider: str, request: Callable[[], Awaitable[LLMResponse]],
+                    model: Optional[str] = None) -> LLMResponse:
+        """Async counterpart of call(): awaits `request()` and sleeps between retries without blocking the loop."""
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = await request()
+            except Exception as e:
+                delay = self._failed_attempt(provider, attempt, e, model)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            return self._successful_attempt(provider, response, started, model)
+
+    def _failed_attempt(self, provider: str, attempt: int, error: Exception,
+                        model: Optional[str] = None) -> Optional[float]:
+        """Record a failed attempt; return the delay before retrying, or None if the error should be raised."""
+        metrics = self._provider_metrics(provider)
+        retry = attempt < self.max_retries and is_retryable(error)
+        with self._lock:
+            metrics.calls += 1
+            metrics.errors += 1
+            metrics.retries += 1 if retry else 0
+        if not retry:
+            if model:
+                record_call(provider, model, error=f"{type(error).__name__}: {error}")
+            return None
+        delay = retry_after_seconds(error)
+        delay = backoff_delay(attempt) if delay is None else min(delay, LLM_BACKOFF_MAX)
+        logging.warning(f"{provider} call failed ({type(error).__name__}), retrying in {delay:.1f}s")
+        return delay
+
+    def _successful_attempt(self, provider: str, response: LLMResponse, started: float,
+                            model: Optional[str] = None) -> LLMResponse:
+        metrics = self._provider_metrics(provider)
+        response.latency = time.monotonic() - started
+        with self._lock:
+            metrics.calls += 1
+            metrics.latencies.append(response.latency)
+            metrics.input_tokens += response.input_tokens
+            metrics.output_tokens += response.output_tokens
+        if model:
+            # Calls made without a model (e.g. opening a stream) are metered by whoever finishes them
+            record_call(provider, model, response.input_tokens, response.output_tokens, response.latency)
+        return response
+
+    def chat(self, model: str, messages: List[Dict[str, str]], json_mode: bool = False,
+             response_schema: Optional[Type[BaseModel]] = None, temperature: Optional[float] = None) -> LLMResponse:
+        """
+        Send a chat completion to whichever provider serves `model`.
+
+        Args:
+            model (str): App model name, e.g. "gpt-4o-mini" or "Groq Llama3.1 70b".
+            messages (List[Dict]): OpenAI-style messages.
+            json_mode (bool): Ask the provider for a JSON object response.
+            response_schema (BaseModel): Schema for Gemini's structured output (implies json_mode).
+            temperature (float): Sampling temperature, provider default if None.
+        """
+        provider, provider_model = resolve_model(model)
+        if provider == "google":
+            def request():
+                gemini, prompt = self._gemini_request(provider_model, messages, json_mode, response_schema, temperature)
+                completion = gemini.generate_content(prompt, request_options={"timeout": self.timeout})
+                return self._gemini_response(completion, model)
+        else:
+            def request():
+                kwargs = self._chat_kwargs(provider, provider_model, messages, json_mode, response_schema, temperature)
+                completion = self.client(provider).chat.completions.create(**kwargs)
+                return self._chat_response(completion, model, provider)
+
+        return self.call(provider, request, model)
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], json_mode: bool = False,
+                    response_schema: Optional[Type[BaseModel]] = None,
+                    temperature: Optional[float] = None) -> LLMResponse:
+        """Async counterpart of chat(), using the providers' async clients."""
+        provider, provider_model = resolve_model(model)
+        if provider == "google":
+            async def request():
+                gemini, prompt = self._gemini_request(provider_model, messages, json_mode, response_schema, temperature)
+                completion = await gemini.generate_content_async(prompt, request_options={"timeout": self.timeout})
+                return self._gemini_response(completion, model)
+        else:
+            async def request():
+                kwargs = self._chat_kwargs(provider, provider_model, messages, json_mode, response_schema, temperature)
+                completion = await self.async_client(provider).chat.completions.create(**kwargs)
+                return self._chat_response(completion, model, provider)
+
+        return await self.acall(provider, request, model)
+
+    def parse(self, model: str, messages: List[Dict[str, str]], response_model: Type[BaseModel]) -> LLMResponse:
+        """Structured output parsed into `response_model` (OpenAI models only)."""
+        provider, provider_model = self._parse_model(model)
+
+        def request():
+            completion = self.client(provider).beta.chat.completions.parse(
+                model=provider_model, messages=messages, response_format=response_model)
+            return self._parse_response(completion, model, provider)
+
+        return self.call(provider, request, model)
+
+    async def aparse(self, model: str, messages: List[Dict[str, str]],
+                     response_model: Type[BaseModel]) -> LLMResponse:
+        """Async counterpart of parse()."""
+        provider, provider_model = self._parse_model(model)
+
+        async def request():
+            completion = await self.async_client(provider).beta.chat.completions.parse(
+                model=provider_model, messages=messages, response_format=response_model)
+            return self._parse_response(completion, model, provider)
+
+        return await self.acall(provider, request, model)
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], response_format: Optional[Dict] = None,
+                    temperature: Optional[float] = None) -> "LLMStream":
+        """
+        Stream a chat completion (OpenAI-compatible providers). Opening the stream is retried
+        like any other call; once tokens are flowing a failure is raised to the caller.
+        Use the stream as a context manager (or close() it) so it is metered however it ends.
+        """
+        provider, provider_model = resolve_model(model)
+        if provider == "google":
+            raise ValueError(f"Streaming is not supported for {model}")
+        kwargs = {"model": provider_model, "messages": messages, "stream": True}
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if provider == "openai":
+            kwargs["stream_options"] = {"include_usage": True}
+
+        started = time.monotonic()
+        opened = self.call(provider, lambda: LLMResponse(None, 0, 0, model, provider, 0.0,
+                                                         parsed=self.client(provider).chat.completions.create(**kwargs)),
+                           model=model, opens_stream=True)
+        prompt_tokens = estimate_tokens("".join(str(message.get("content", "")) for message in messages))
+        return LLMStream(opened.parsed, self, provider, model, started, prompt_tokens)
+
+    # Request and response shapes shared by the sync and async calls
+
+    @staticmethod
+    def _chat_kwargs(provider, provider_model, messages, json_mode, response_schema, temperature) -> Dict:
+        kwargs = {"model": provider_model, "messages": messages}
+        # LM Studio rejects the json_object format; the prompt already asks for JSON
+        if (json_mode or response_schema is not None) and provider != "local":
+            kwargs["response_format"] = {"type": "json_object"}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return kwargs
+
+    @staticmethod
+    def _chat_response(completion, model: str, provider: str) -> LLMResponse:
+        return LLMResponse(
+            content=completion.choices[0].message.content,
+            input_tokens=completion.usage.prompt_tokens if completion.usage else 0,
+            output_tokens=completion.usage.completion_tokens if completion.usage else 0,
+            model=model, provider=provider, latency=0.0,
+        )
+
+    @staticmethod
+    def _parse_model(model: str):
+        provider, provider_model = resolve_model(model)
+        if provider != "openai":
+            raise ValueError(f"Structured parsing is only supported for OpenAI models, not {model}")
+        return provider, provider_model
+
+    @staticmethod
+    def _parse_response(completion, model: str, provider: str) -> LLMResponse:
+        message = completion.choices[0].message
+        return LLMResponse(
+            content=message.content,
+            parsed=message.parsed,
+            input_tokens=completion.usage.prompt_tokens,
+            output_tokens=completion.usage.completion_tokens,
+            model=model, provider=provider, latency=0.0,
+        )
+
+    def _gemini_request(self, provider_model, messages, json_mode, response_schema, temperature):
+        generation_config = {}
+        if json_mode or response_schema is not None:
+            generation_config["response_mime_type"] = "application/json"
+        if response_schema is not None:
+            generation_config["response_schema"] = response_schema
+        if temperature is not None:
+            generation_config["temperature"] = temperature
+        genai_module = self.client("google")
+        gemini = genai_module.GenerativeModel(provider_model, generation_config=generation_config)
+        prompt = "\n".join(message["content"] for message in messages)
+        return gemini, prompt
+
+    @staticmethod
+    def _gemini_response(completion, model: str) -> LLMResponse:
+        usage = completion.usage_metadata
+        return LLMResponse(
+            content=completion.text,
+            input_tokens=usage.prompt_token_count,
+            output_tokens=usage.candidates_token_count,
+            model=model, provider="google", latency=0.0,
+        )
+
+    # Metrics
+
+    def _provider_metrics(self, provider: str) -> ProviderMetrics:
+        with self._lock:
+            return self._metrics.setdefault(provider, ProviderMetrics())
+
+    def record_external_call(self, provider: str, latency: Optional[float], input_tokens: int = 0,
+                             output_tokens: int = 0, error: bool = False, model: Optional[str] = None):
+        """Record a call made outside the gateway's own methods (e.g. by LangChain)."""
+        metrics = self._provider_metrics(provider)
+        with self._lock:
+            metrics.calls += 1
+            if error:
+                metrics.errors += 1
+            if latency is not None:
+                metrics.latencies.append(latency)
+            metrics.input_tokens += input_tokens
+            metrics.output_tokens += output_tokens
+        if model:
+            record_call(provider, model, input_tokens, output_tokens, latency, error="error" if error else None)
+
+    def metrics(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {provider: metrics.as_dict() for provider, metrics in self._metrics.items()}
+
+
+class LLMStream:
+    """
+    Iterates over the text deltas of a streamed completion; token counts are set once it ends.
+
+    The call is metered once, when iteration ends or the stream is closed (use it as a context
+    manager), so a stream that fails, is abandoned midway or is never read still counts. Usage
+    only arrives with the last chunk; without it the call is metered with estimates: the prompt,
+    and the text received so far.
+    """
+
+    def __init__(self, stream, gateway: LLMGateway, provider: str, model: str, started: float,
+                 prompt_tokens: int = 0):
+        self._stream = stream
+        self._gateway = gateway
+        self.provider = provider
+        self.model = model
+        self.started = started
+        self.prompt_tokens = prompt_tokens
+        self.first_token_latency: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.error: Optional[Exception] = None
+        self._received: List[str] = []
+        self._usage_seen = False
+        self._finished = False
+
+    @property
+    def token_counts(self) -> Dict[str, int]:
+        return {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    self.input_tokens = chunk.usage.prompt_tokens
+                    self.output_tokens = chunk.usage.completion_tokens
+                    self._usage_seen = True
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if self.first_token_latency is None:
+                        self.first_token_latency = time.monotonic() - self.started
+                    self._received.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self._finish()
+
+    def __enter__(self) -> "LLMStream":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connection if the stream is still open, and meter the call if it wasn't yet."""
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None and not self._finished:
+                close()
+        finally:
+            self._finish()
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if not self._usage_seen:
+            self.input_tokens = self.prompt_tokens
+            self.output_tokens = estimate_tokens("".join(self._received))
+        self._record()
+
+    def _record(self):
+        self.latency = time.monotonic() - self.started
+        metrics = self._gateway._provider_metrics(self.provider)
+        with self._gateway._lock:
+            # The call and its time to open were recorded when the stream opened
+            metrics.input_tokens += self.input_tokens
+            metrics.output_tokens += self.output_tokens
+            if self.error is not None:
+                metrics.errors += 1
+        record_call(self.provider, self.model, self.input_tokens, self.output_tokens, self.latency,
+                    error=f"{type(self.error).__name__}: {self.error}" if self.error is not None else None)
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+def get_chat_model(model: str, temperature: float = 0, api_key: Optional[str] = None):
+    """
+    LangChain ChatOpenAI that shares the gateway's pooled connections, retry budget
+    and timeout, and reports its calls into the gateway metrics.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_openai import ChatOpenAI
+
+    gateway = get_gateway()
+
+    class GatewayMetricsCallback(BaseCallbackHandler):
+        def __init__(self):
+            self._started: Dict = {}
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._started[run_id] = time.monotonic()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.monotonic()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            started = self._started.pop(run_id, None)
+            usage = (response.llm_output or {}).get("token_usage", {})
+            gateway.record_external_call("openai", time.monotonic() - started if started else None,
+                                         usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                                         model=model)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._started.pop(run_id, None)
+            gateway.record_external_call("openai", None, error=True, model=model)
+
+    kwargs = {"api_key": api_key} if api_key else {}
+    return ChatOpenAI(
+        temperature=temperature,
+        model=model,
+        http_client=gateway.http_client("openai"),
+        max_retries=gateway.max_retries,
+        timeout=gateway.timeout,
+        callbacks=[GatewayMetricsCallback()],
+        **kwargs,
+    )
@@ -0,0 +1,259 @@
+# metering.py
+
+"""
+Token and cost metering.
+
+Every LLM call the app makes (through the gateway, streams, LangChain, batches) and every
+extraction cache hit is recorded in the current run's ledger: provider, model, tokens,
+latency, whether it was a cache hit, and its price from the single PRICING table. Each run
+is appended to its own JSON Lines file under CACHE_DIR/METERING_DIR as it goes, so ledgers
+survive crashes and can be aggregated across runs per run, domain, day or model:
+
+    with metering_context(url=page_url, purpose="extraction"):
+        format_data(...)             # the call is attributed to the page's domain
+    get_ledger().totals()
+    export_report("costs.json")     # aggregates of every run on disk
+"""
+
+import contextlib
+import contextvars
+import csv
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from assets import (
+    CACHE_DIR,
+    METERING_DIR,
+    METERING_ENABLED,
+    METERING_RUN_BUDGET,
+    PRICING,
+)
+from http_fetcher import get_domain
+
+# Who is calling: set around a page's extraction or pagination detection, read when a call is recorded
+# (None until a metering_context is entered, since a mutable default would be shared by every context)
+_context: contextvars.ContextVar = contextvars.ContextVar("metering_context", default=None)
+_unpriced_models = set()
+
+
+def price_tokens(model: str, input_tokens: int, output_tokens: int, batch: bool = False) -> float:
+    """Dollar price of a call from PRICING; batch=True uses the Batch API rates."""
+    prices = PRICING.get(model)
+    if prices is None:
+        if model not in _unpriced_models:
+            _unpriced_models.add(model)
+            logging.warning(f"No price for model {model}, its calls are metered at $0")
+        return 0.0
+    if batch:
+        if "batch_input" not in prices:
+            raise ValueError(f"{model} has no Batch API pricing")
+        return input_tokens * prices["batch_input"] + output_tokens * prices["batch_output"]
+    return input_tokens * prices["input"] + output_tokens * prices["output"]
+
+
+def supports_batch(model: str) -> bool:
+    return "batch_input" in PRICING.get(model, {})
+
+
+@contextlib.contextmanager
+def metering_context(url: Optional[str] = None, purpose: Optional[str] = None):
+    """Attribute the LLM calls made inside the block to `url`'s domain and to `purpose`."""
+    context = dict(_context.get() or {})
+    if url:
+        context["domain"] = get_domain(url)
+    if purpose:
+        context["purpose"] = purpose
+    token = _context.set(context)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def _provider_of(model: str) -> Optional[str]:
+    from llm_gateway import resolve_model
+    try:
+        return resolve_model(model)[0]
+    except ValueError:
+        return None
+
+
+class MeteringLedger:
+    """One run's call records, kept in memory and appended to `path` as they arrive."""
+
+    def __init__(self, run_id: Optional[str] = None, directory: Optional[str] = os.path.join(CACHE_DIR, METERING_DIR),
+                 budget: Optional[float] = METERING_RUN_BUDGET):
+        self.run_id = run_id or f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+        self.path = os.path.join(directory, f"{self.run_id}.jsonl") if directory else None
+        self.budget = budget
+        self._entries: List[Dict] = []
+        self._cost = 0.0
+        self._over_budget = False
+        self._lock = threading.Lock()
+
+    def record(self, provider: Optional[str], model: str, input_tokens: int = 0, output_tokens: int = 0,
+               latency: Optional[float] = None, cache_hit: bool = False, batch: bool = False,
+               error: Optional[str] = None, saved_tokens: Optional[Dict[str, int]] = None,
+               domain: Optional[str] = None, purpose: Optional[str] = None) -> Dict:
+        context = _context.get() or {}
+        entry = {
+            "run": self.run_id,
+            "time": time.time(),
+            "domain": domain or context.get("domain"),
+            "purpose": purpose or context.get("purpose"),
+            "provider": provider or _provider_of(model),
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency": round(latency, 3) if latency is not None else None,
+            "cache_hit": cache_hit,
+            "batch": batch,
+            "error": error,
+            "cost": price_tokens(model, input_tokens, output_tokens, batch),
+            # What a cache hit would have cost had the call been made
+            "saved_cost": price_tokens(model, saved_tokens["input_tokens"], saved_tokens["output_tokens"])
+                          if saved_tokens else 0.0,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self._cost += entry["cost"]
+            over_budget = self.budget is not None and self._cost > self.budget and not self._over_budget
+            self._over_budget = self._over_budget or over_budget
+            self._append(entry)
+        if over_budget:
+            logging.warning(f"Run {self.run_id} has spent ${self._cost:.4f}, over its ${self.budget:.4f} budget")
+        return entry
+
+    def _append(self, entry: Dict):
+        # Called with the lock held
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write metering ledger {self.path}: {e}")
+
+    def entries(self) -> List[Dict]:
+        with self._lock:
+            return list(self._entries)
+
+    def totals(self) -> Dict:
+        return summarize(self.entries())
+
+    def aggregate(self, by: Sequence[str] = ("domain",)) -> List[Dict]:
+        return aggregate(self.entries(), by)
+
+
+def summarize(entries: Iterable[Dict]) -> Dict:
+    summary = {"calls": 0, "cache_hits": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0,
+               "cost": 0.0, "saved_cost": 0.0, "latency_total": 0.0}
+    timed_calls = 0
+    for entry in entries:
+        summary["calls"] += 0 if entry["cache_hit"] else 1
+        summary["cache_hits"] += 1 if entry["cache_hit"] else 0
+        summary["errors"] += 1 if entry["error"] else 0
+        summary["input_tokens"] += entry["input_tokens"]
+        summary["output_tokens"] += entry["output_tokens"]
+        summary["cost"] += entry["cost"]
+        summary["saved_cost"] += entry.get("saved_cost", 0.0)
+        if entry["latency"] is not None and not entry["cache_hit"]:
+            summary["latency_total"] += entry["latency"]
+            timed_calls += 1
+    # Batch requests have no latency of their own
+    summary["mean_latency"] = summary["latency_total"] / timed_calls if timed_calls else None
+    return summary
+
+
+def aggregate(entries: Iterable[Dict], by: Sequence[str] = ("run", "domain", "day")) -> List[Dict]:
+    """Totals of `entries` grouped by any of run, domain, day, purpose, provider and model."""
+    groups = defaultdict(list)
+    for entry in entries:
+        key = tuple(datetime.fromtimestamp(entry["time"]).strftime("%Y-%m-%d") if name == "day" else entry.get(name)
+                    for name in by)
+        groups[key].append(entry)
+    return [{**dict(zip(by, key, strict=True)), **summarize(group)}
+            for key, group in sorted(groups.items(), key=lambda g: str(g[0]))]
+
+
+def load_entries(directory: str = os.path.join(CACHE_DIR, METERING_DIR), since: Optional[float] = None) -> List[Dict]:
+    """Entries of every run ledger in `directory`, optionally only those recorded after `since`."""
+    entries = []
+    if not os.path.isdir(directory):
+        return entries
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                if since is None or entry["time"] >= since:
+                    entries.append(entry)
+    return entries
+
+
+def export_report(path: str, entries: Optional[List[Dict]] = None) -> str:
+    """
+    Write `entries` (by default every run on disk) for other tools: a .csv path gets one row
+    per call, anything else a JSON document with totals per run, domain, day and model.
+    """
+    entries = load_entries() if entries is None else entries
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".csv"):
+        columns = ["run", "time", "domain", "purpose", "provider", "model", "input_tokens", "output_tokens",
+                   "latency", "cache_hit", "batch", "error", "cost", "saved_cost"]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(entries)
+    else:
+        report = {
+            "generated_at": time.time(),
+            "totals": summarize(entries),
+            "by_run": aggregate(entries, ("run",)),
+            "by_domain": aggregate(entries, ("domain",)),
+            "by_day": aggregate(entries, ("day",)),
+            "by_model": aggregate(entries, ("provider", "model")),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    return path
+
+
+_ledger: Optional[MeteringLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def start_run(run_id: Optional[str] = None) -> MeteringLedger:
+    """Start a new ledger; later calls are recorded in it."""
+    global _ledger
+    with _ledger_lock:
+        _ledger = MeteringLedger(run_id)
+        return _ledger
+
+
+def get_ledger() -> MeteringLedger:
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = MeteringLedger()
+        return _ledger
+
+
+def record_call(provider: Optional[str], model: str, input_tokens: int = 0, output_tokens: int = 0,
+                latency: Optional[float] = None, **details) -> Optional[Dict]:
+    """Record one LLM call (or cache hit) in the current run's ledger."""
+    if not METERING_ENABLED:
+        return None
+    return get_ledger().record(provider, model, input_tokens, output_tokens, latency, **details)
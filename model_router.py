@@ -0,0 +1,325 @@
+# model_router.py
+
+"""
+Latency- and cost-aware model routing for extraction calls.
+
+An explicitly selected model is used as long as the input fits its context and what is left
+of its MODEL_RATE_LIMIT_TPM this minute, and it isn't failing; otherwise the best candidate of
+the same provider takes over, since page data never goes to a provider the user didn't pick
+unless ROUTER_ALLOW_PROVIDER_SWITCH is set.
+With selected_model == AUTO_MODEL the router scores every candidate by
+
+    (estimated cost + ROUTER_SECONDS_VALUE * expected latency) / (1 - error rate)
+
+using the PRICING table, the p50 latency observed for the model (ROUTER_LATENCY_PRIORS
+until it has ROUTER_MIN_SAMPLES calls) and its error rate, and takes the lowest score.
+
+With hedging enabled, a duplicate request goes to the runner-up (of the same provider for
+an explicit selection) when the primary hasn't answered within its observed p95, and
+whichever answers first wins; a primary that fails outright is retried on the runner-up
+straight away. Every decision and its outcome is appended to ROUTER_LOG_FILE for tuning.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from assets import (
+    AUTO_MODEL,
+    CACHE_DIR,
+    MODEL_CONTEXT_TOKENS,
+    MODEL_RATE_LIMIT_TPM,
+    ROUTER_ALLOW_PROVIDER_SWITCH,
+    ROUTER_CANDIDATES,
+    ROUTER_HEDGE_AFTER,
+    ROUTER_HEDGE_ENABLED,
+    ROUTER_HEDGE_WORKERS,
+    ROUTER_LATENCY_PRIORS,
+    ROUTER_LOG_FILE,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_OUTPUT_SHARE,
+    ROUTER_SECONDS_VALUE,
+)
+from llm_gateway import LLMResponse, ProviderMetrics, get_gateway, resolve_model
+from metering import price_tokens
+
+
+class RoutingDecision:
+    def __init__(self, requested: str, primary: str, hedge: Optional[str], input_tokens: int,
+                 scores: Dict[str, float], reason: str):
+        self.requested = requested
+        self.primary = primary
+        self.hedge = hedge
+        self.input_tokens = input_tokens
+        self.scores = scores
+        self.reason = reason
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+class ModelRouter:
+    def __init__(self, candidates: List[str] = ROUTER_CANDIDATES, hedge_enabled: bool = ROUTER_HEDGE_ENABLED,
+                 log_path: Optional[str] = os.path.join(CACHE_DIR, ROUTER_LOG_FILE),
+                 allow_provider_switch: bool = ROUTER_ALLOW_PROVIDER_SWITCH,
+                 hedge_workers: int = ROUTER_HEDGE_WORKERS):
+        self.candidates = list(candidates)
+        self.hedge_enabled = hedge_enabled
+        self.allow_provider_switch = allow_provider_switch
+        self.log_path = log_path
+        self._metrics: Dict[str, ProviderMetrics] = {}
+        self._recent_tokens: Dict[str, deque] = {}  # model -> (time, tokens) of its calls in the last minute
+        self._lock = threading.Lock()
+        # Hedged requests outlive the call that started them, so they can't use a with-block executor
+        # (only calls that may hedge use it; the others run in the caller's thread)
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="hedge")
+
+    # Statistics
+
+    def _model_metrics(self, model: str) -> ProviderMetrics:
+        with self._lock:
+            return self._metrics.setdefault(model, ProviderMetrics())
+
+    def expected_latency(self, model: str) -> float:
+        metrics = self._model_metrics(model)
+        if metrics.calls - metrics.errors >= ROUTER_MIN_SAMPLES:
+            return metrics.percentile(0.5)
+        return ROUTER_LATENCY_PRIORS.get(model, 30)
+
+    def hedge_delay(self, model: str) -> float:
+        metrics = self._model_metrics(model)
+        if metrics.calls - metrics.errors >= ROUTER_MIN_SAMPLES:
+            return metrics.percentile(0.95)
+        return ROUTER_HEDGE_AFTER
+
+    def error_rate(self, model: str) -> float:
+        metrics = self._model_metrics(model)
+        return metrics.errors / metrics.calls if metrics.calls >= ROUTER_MIN_SAMPLES else 0.0
+
+    def estimated_cost(self, model: str, input_tokens: int) -> float:
+        return price_tokens(model, input_tokens, int(input_tokens * ROUTER_OUTPUT_SHARE))
+
+    @staticmethod
+    def provider(model: str) -> Optional[str]:
+        try:
+            return resolve_model(model)[0]
+        except ValueError:
+            return None
+
+    def tokens_last_minute(self, model: str) -> int:
+        cutoff = time.monotonic() - 60
+        with self._lock:
+            recent = self._recent_tokens.get(model)
+            while recent and recent[0][0] < cutoff:
+                recent.popleft()
+            return sum(tokens for _, tokens in recent) if recent else 0
+
+    def within_rate_limit(self, model: str, input_tokens: int) -> bool:
+        """Whether the request fits what is left of the model's MODEL_RATE_LIMIT_TPM this minute."""
+        limit = MODEL_RATE_LIMIT_TPM.get(model)
+        if limit is None:
+            return True
+        return self.tokens_last_minute(model) + input_tokens * (1 + ROUTER_OUTPUT_SHARE) <= limit
+
+    def usable(self, model: str, input_tokens: int) -> bool:
+        try:
+            provider, _ = resolve_model(model)
+        except ValueError:
+            return False
+        fits = input_tokens * (1 + ROUTER_OUTPUT_SHARE) <= MODEL_CONTEXT_TOKENS.get(model, 8192)
+        return (fits and self.within_rate_limit(model, input_tokens)
+                and self.error_rate(model) <= ROUTER_MAX_ERROR_RATE and get_gateway().has_credentials(provider))
+
+    def score(self, model: str, input_tokens: int) -> float:
+        cost = self.estimated_cost(model, input_tokens) + ROUTER_SECONDS_VALUE * self.expected_latency(model)
+        return cost / max(1.0 - self.error_rate(model), 0.05)
+
+    # Routing
+
+    def choose(self, selected_model: str, input_tokens: int) -> RoutingDecision:
+        pool = list(dict.fromkeys(self.candidates + ([selected_model] if selected_model != AUTO_MODEL else [])))
+        scores = {model: self.score(model, input_tokens) for model in pool if self.usable(model, input_tokens)}
+        ranked = sorted(scores, key=scores.get)
+        if selected_model != AUTO_MODEL and not self.allow_provider_switch:
+            # An explicit selection never sends the page to another provider
+            ranked = [model for model in ranked if self.provider(model) == self.provider(selected_model)]
+
+        if selected_model != AUTO_MODEL and selected_model in scores:
+            primary, reason = selected_model, "selected"
+        elif ranked:
+            primary = ranked[0]
+            reason = "auto" if selected_model == AUTO_MODEL else f"{selected_model} unusable for {input_tokens} tokens"
+        else:
+            # Nothing qualifies (e.g. no keys configured); let the call fail loudly on the requested model
+            primary = selected_model if selected_model != AUTO_MODEL else self.candidates[0]
+            reason = "no usable candidate" if selected_model == AUTO_MODEL else \
+                f"{selected_model} unusable for {input_tokens} tokens and no other model of its provider is"
+        hedge = next((model for model in ranked if model != primary), None) if self.hedge_enabled else None
+        return RoutingDecision(selected_model, primary, hedge, input_tokens, scores, reason)
+
+    def complete(self, decision: RoutingDecision, request: Callable[[str], LLMResponse]) -> LLMResponse:
+        """Run request(model) for the decision's primary model, hedging to the runner-up if enabled."""
+        started = time.monotonic()
+        if not decision.hedge:
+            try:
+                response = self._timed(decision.primary, request)
+            except Exception as e:
+                self._log(decision, None, time.monotonic() - started, False, e)
+                raise
+            self._log(decision, decision.primary, time.monotonic() - started, False, None)
+            return response
+
+        # Requests run in copies of the caller's context so they are metered to the caller's page
+        attempts: Dict = {self._submit(decision.primary, request): decision.primary}
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        while attempts:
+            timeout = None
+            if decision.hedge and not hedged:
+                timeout = max(0.0, self.hedge_delay(decision.primary) - (time.monotonic() - started))
+            done, _ = wait(list(attempts), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # The primary is slower than its p95: race a duplicate on the runner-up
+                hedged = True
+                logging.info(f"Hedging {decision.primary} with {decision.hedge} after {time.monotonic() - started:.1f}s")
+                attempts[self._submit(decision.hedge, request)] = decision.hedge
+                continue
+
+            for future in done:
+                model = attempts.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    if decision.hedge and not hedged:
+                        # Fail over immediately instead of waiting for the hedge delay
+                        hedged = True
+                        attempts[self._submit(decision.hedge, request)] = decision.hedge
+                    continue
+                self._log(decision, model, time.monotonic() - started, hedged, None)
+                return response
+
+        self._log(decision, None, time.monotonic() - started, hedged, last_error)
+        raise last_error
+
+    async def complete_async(self, decision: RoutingDecision,
+                             request: Callable[[str], Awaitable[LLMResponse]]) -> LLMResponse:
+        """Async counterpart of complete(); the losing request of a hedge is cancelled."""
+        started = time.monotonic()
+        attempts: Dict = {asyncio.ensure_future(self._timed_async(decision.primary, request)): decision.primary}
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        try:
+            while attempts:
+                timeout = None
+                if decision.hedge and not hedged:
+                    timeout = max(0.0, self.hedge_delay(decision.primary) - (time.monotonic() - started))
+                done, _ = await asyncio.wait(list(attempts), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    logging.info(f"Hedging {decision.primary} with {decision.hedge} "
+                                 f"after {time.monotonic() - started:.1f}s")
+                    attempts[asyncio.ensure_future(self._timed_async(decision.hedge, request))] = decision.hedge
+                    continue
+
+                for future in done:
+                    model = attempts.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        last_error = e
+                        if decision.hedge and not hedged:
+                            hedged = True
+                            attempts[asyncio.ensure_future(self._timed_async(decision.hedge, request))] = decision.hedge
+                        continue
+                    self._log(decision, model, time.monotonic() - started, hedged, None)
+                    return response
+        finally:
+            for future in attempts:
+                future.cancel()
+
+        self._log(decision, None, time.monotonic() - started, hedged, last_error)
+        raise last_error
+
+    def _submit(self, model: str, request: Callable[[str], LLMResponse]):
+        return self._executor.submit(contextvars.copy_context().run, self._timed, model, request)
+
+    def _timed(self, model: str, request: Callable[[str], LLMResponse]) -> LLMResponse:
+        started = time.monotonic()
+        try:
+            response = request(model)
+        except Exception:
+            self._record(model, None, None)
+            raise
+        self._record(model, time.monotonic() - started, response)
+        return response
+
+    async def _timed_async(self, model: str, request: Callable[[str], Awaitable[LLMResponse]]) -> LLMResponse:
+        started = time.monotonic()
+        try:
+            response = await request(model)
+        except asyncio.CancelledError:
+            # Lost a hedge race; neither a failure nor a latency sample
+            raise
+        except Exception:
+            self._record(model, None, None)
+            raise
+        self._record(model, time.monotonic() - started, response)
+        return response
+
+    def _record(self, model: str, latency: Optional[float], response: Optional[LLMResponse]):
+        metrics = self._model_metrics(model)
+        with self._lock:
+            metrics.calls += 1
+            if response is None:
+                metrics.errors += 1
+                return
+            metrics.latencies.append(latency)
+            metrics.input_tokens += response.input_tokens
+            metrics.output_tokens += response.output_tokens
+            if model in MODEL_RATE_LIMIT_TPM:
+                self._recent_tokens.setdefault(model, deque()).append(
+                    (time.monotonic(), response.input_tokens + response.output_tokens))
+
+    def _log(self, decision: RoutingDecision, winner: Optional[str], latency: float, hedged: bool,
+             error: Optional[Exception]):
+        entry = {**decision.as_dict(), "time": time.time(), "winner": winner, "latency": round(latency, 3),
+                 "hedged": hedged, "error": f"{type(error).__name__}: {error}" if error else None}
+        logging.info(f"Routed {decision.input_tokens} tokens to {decision.primary} ({decision.reason}), "
+                     f"answered by {winner} in {latency:.1f}s")
+        if not self.log_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write router log {self.log_path}: {e}")
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model: metrics.as_dict() for model, metrics in self._metrics.items()}
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,169 @@
+# pagination_cache.py
+
+"""
+Per-domain cache of pagination detection results.
+
+A site paginates every listing of one kind the same way, so a result the LLM found for
+one URL is kept under the URL's domain and path shape (/s?, /shop/product-category/*/):
+the same URL gets the stored result back, and other URLs of that shape get the stored
+template re-applied to them, with its page parameter moved onto the new URL. Their last
+page is unknown, so they are expanded open-ended and the crawl stops at the first empty
+or repeated page.
+
+An entry is dropped when the first page its template produces comes back empty or as a
+copy of a page already seen (the crawler calls invalidate()), and after
+PAGINATION_CACHE_TTL. Heuristic results aren't stored: they cost nothing to recompute.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from fnmatch import fnmatch
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from assets import (
+    CACHE_DIR,
+    PAGINATION_CACHE_FILE,
+    PAGINATION_CACHE_TTL,
+    PAGINATION_PARAMS,
+    URL_TRACKING_PARAMS,
+)
+from http_fetcher import get_domain
+from pagination_heuristics import PAGE_SEGMENT, page_number
+from url_utils import normalize_url
+
+PATH_TEMPLATE = re.compile(r"/([^/]+)/\{n\}(/?)")
+
+
+def path_shape(url: str) -> str:
+    """
+    The URL with everything that varies between listings of one kind blurred: page
+    segments are dropped, numeric path segments become {n}, the last segment under a
+    parent (the category or listing slug) and other segments with digits become *, and
+    the query is reduced to "?" when anything but page and tracking parameters is left,
+    since the parameters' names (k, ref, sort...) vary between searches of one site too.
+    """
+    parts = urlsplit(url)
+    segments = PAGE_SEGMENT.sub("", parts.path).split("/")
+    named = [index for index, segment in enumerate(segments) if segment]
+    leaf = named[-1] if len(named) >= 2 else None
+    shape = ["{n}" if segment.isdigit() else "*" if index == leaf or any(c.isdigit() for c in segment)
+             else segment.lower() for index, segment in enumerate(segments)]
+    searched = any(name.lower() not in PAGINATION_PARAMS
+                   and not any(fnmatch(name.lower(), pattern) for pattern in URL_TRACKING_PARAMS)
+                   for name, _ in parse_qsl(parts.query, keep_blank_values=True))
+    return "/".join(shape) + ("?" if searched else "")
+
+
+def template_param(url_template: str) -> Optional[Tuple[str, bool, bool]]:
+    """(parameter, in_path, trailing slash) of the number in a template, or None."""
+    parts = urlsplit(url_template)
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        if value == "{n}":
+            return name, False, False
+    match = PATH_TEMPLATE.search(parts.path)
+    if match:
+        return match.group(1), True, bool(match.group(2))
+    return None
+
+
+def apply_template(url: str, param: str, in_path: bool, trailing_slash: bool = False) -> str:
+    """`url` turned into a template numbered by `param`, replacing any page number it carries."""
+    parts = urlsplit(url)
+    if in_path:
+        path = re.sub(rf"/{re.escape(param)}/\d+(?=/|$)", "", parts.path).rstrip("/")
+        return urlunsplit(parts._replace(path=f"{path}/{param}/{{n}}" + ("/" if trailing_slash else "")))
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name != param]
+    query = urlencode(query + [(param, "{n}")]).replace("%7Bn%7D", "{n}")
+    return urlunsplit(parts._replace(query=query))
+
+
+class PaginationCache:
+    """Pagination results per domain and path shape, persisted between runs."""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, PAGINATION_CACHE_FILE), ttl: float = PAGINATION_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries: Dict[str, Dict[str, Dict]] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._entries = {}
+
+    def _entry(self, url: str, indications: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(get_domain(url), {}).get(path_shape(url))
+        if entry is None or entry["indications"] != indications.strip():
+            return None
+        if time.time() - entry["updated"] > self.ttl:
+            self.invalidate(url, "expired")
+            return None
+        return entry
+
+    def lookup(self, url: str, indications: str = "") -> Optional[Dict]:
+        """PaginationData fields for `url` from a stored result, or None."""
+        entry = self._entry(url, indications)
+        if entry is None:
+            return None
+        result = entry["result"]
+        if normalize_url(url) == entry["url"]:
+            return dict(result)
+        located = template_param(result["url_template"] or "") if result["kind"] != "cursor" else None
+        if located is None:
+            return None  # page_urls and next links belong to the page they were found on
+        param, in_path, trailing_slash = located
+        step = result["step"] or 1
+        current = next((number for _, name, number in page_number(url) if name == param), None)
+        if current is not None:
+            start = current + step
+        elif not any(name == param for _, name, _ in page_number(entry["url"])):
+            start = result["start"]  # found on a first page too
+        else:
+            start = (0 if result["kind"] == "offset" else 1) + step
+        return {"url_template": apply_template(url, param, in_path, trailing_slash), "kind": result["kind"],
+                "start": start, "step": step, "end": None, "next_url": None, "page_urls": [],
+                "confidence": result["confidence"]}
+
+    def store(self, url: str, indications: str, result: Dict, model: str):
+        """Keep an LLM result (the PaginationData fields) for `url`'s domain and path shape."""
+        if not (result.get("url_template") or result.get("next_url") or result.get("page_urls")):
+            return
+        entry = {"url": normalize_url(url), "indications": indications.strip(), "model": model,
+                 "updated": time.time(), "result": result}
+        with self._lock:
+            self._entries.setdefault(get_domain(url), {})[path_shape(url)] = entry
+            self._save()
+
+    def invalidate(self, url: str, reason: str = ""):
+        with self._lock:
+            entry = self._entries.get(get_domain(url), {}).pop(path_shape(url), None)
+            if entry is not None:
+                self._save()
+        if entry is not None:
+            logging.info(f"Dropped cached pagination for {get_domain(url)}{path_shape(url)}: {reason}")
+
+    def _save(self):
+        # Called with the lock held
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=4)
+        except OSError as e:
+            logging.warning(f"Could not save pagination cache to {self.path}: {e}")
+
+
+_cache: Optional[PaginationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_pagination_cache() -> PaginationCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PaginationCache()
+        return _cache
@@ -2,25 +2,90 @@
 
 import os
 import json
-from typing import List, Dict, Tuple, Union
+import itertools
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+from urllib.parse import urljoin
 from pydantic import BaseModel, Field, ValidationError
 
-import tiktoken
 from dotenv import load_dotenv
 
-from openai import OpenAI
-import google.generativeai as genai
-from groq import Groq
-
-
-from api_management import get_api_key
-from assets import PROMPT_PAGINATION, PRICING, LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME
+from llm_gateway import get_gateway
+from model_router import get_router
+from token_accounting import estimate_tokens
+from boilerplate_filter import strip_site_boilerplate
+from assets import (PROMPT_PAGINATION, BOILERPLATE_ENABLED, AUTO_MODEL, PAGINATION_HEURISTICS_ENABLED,
+                    PAGINATION_MIN_CONFIDENCE, PAGINATION_MAX_PAGES, PAGINATION_LINKS_ONLY, PAGINATION_CACHE_ENABLED)
+from metering import price_tokens, metering_context
+from pagination_heuristics import detect_pagination_heuristic, expand_template
+from link_graph import compact_links
+from pagination_cache import get_pagination_cache
+from url_utils import normalize_url
 
 load_dotenv()
 import logging
 
-class PaginationData(BaseModel):
-    page_urls: List[str] = Field(default_factory=list, description="List of pagination URLs, including 'Next' button URL if present")
+class PaginationResponse(BaseModel):
+    """What the LLM is asked to return: a URL template instead of every page URL."""
+    url_template: Optional[str] = Field(default=None, description="Page URL with the changing number replaced by {n}")
+    kind: Optional[str] = Field(default=None, description="'page', 'offset' or 'cursor'")
+    start: Optional[int] = Field(default=None, description="Value of {n} on the first page after the current one")
+    step: Optional[int] = Field(default=None, description="Difference of {n} between consecutive pages")
+    end: Optional[int] = Field(default=None, description="Value of {n} on the last page, null if unknown")
+    next_url: Optional[str] = Field(default=None, description="URL of the 'Next' button if present")
+    page_urls: List[str] = Field(default_factory=list, description="Pagination URLs that follow no template")
+
+class PaginationData(PaginationResponse):
+    confidence: float = Field(default=1.0, description="How sure the detector is of the pages, from 0 to 1")
+    source: str = Field(default="llm", description="'heuristic' when found from the page's links, 'cache' when "
+                                                   "reused from an earlier LLM result, 'llm' otherwise")
+
+    def urls(self, limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Every page URL, generated as it is consumed: the template's range (PAGINATION_MAX_PAGES
+        of it when its end is unknown), then next_url and page_urls; at most `limit` URLs.
+        """
+        expanded = iter(())
+        if self.url_template and self.kind != "cursor":
+            expanded = expand_template(self.url_template, 1 if self.start is None else self.start, self.step or 1,
+                                       self.end, limit or (PAGINATION_MAX_PAGES if self.end is None else None))
+        seen = set()
+        for url in itertools.chain(expanded, [self.next_url] if self.next_url else [], self.page_urls):
+            key = normalize_url(url)
+            if key not in seen:
+                seen.add(key)
+                yield url
+                if limit is not None and len(seen) >= limit:
+                    return
+
+    def with_page_urls(self) -> "PaginationData":
+        """
+        A copy whose page_urls lists the template's pages too, for callers that read page_urls:
+        at most PAGINATION_MAX_PAGES of them. urls() streams the whole range without building a list.
+        """
+        listed = list(self.urls(PAGINATION_MAX_PAGES))
+        seen = {normalize_url(url) for url in listed}
+        listed += [url for url in self.page_urls if normalize_url(url) not in seen]
+        return self.model_copy(update={"page_urls": listed})
+
+def resolve_pagination_response(url: str, response: PaginationResponse) -> PaginationData:
+    """Make the model's URLs absolute against the page's and drop a template without {n}."""
+    data = PaginationData(**response.model_dump())
+    if data.url_template and "{n}" not in data.url_template:
+        logging.warning(f"Ignoring pagination template without {{n}}: {data.url_template}")
+        data.url_template = None
+    data.url_template = urljoin(url, data.url_template) if data.url_template else None
+    data.next_url = urljoin(url, data.next_url) if data.next_url else None
+    data.page_urls = [urljoin(url, page_url) for page_url in data.page_urls]
+    return data
+
+# OpenAI models answer with structured output; the others get these chat options and a JSON reply
+OPENAI_PAGINATION_MODELS = ["gpt-4o-mini", "gpt-4o-2024-08-06"]
+PAGINATION_CHAT_OPTIONS = {
+    "gemini-1.5-flash": {"response_schema": PaginationResponse},
+    # Local Llama served by LM Studio's OpenAI-compatible endpoint
+    "Llama3.1 8B": {"temperature": 0.7},
+    "Groq Llama3.1 70b": {},
+}
 
 def calculate_pagination_price(token_counts: Dict[str, int], model: str) -> float:
     """
@@ -33,171 +98,171 @@ def calculate_pagination_price(token_counts: Dict[str, int], model: str) -> floa
     Returns:
     float: The total price for the pagination operation.
     """
-    input_tokens = token_counts['input_tokens']
-    output_tokens = token_counts['output_tokens']
-    
-    input_price = input_tokens * PRICING[model]['input']
-    output_price = output_tokens * PRICING[model]['output']
-    
-    return input_price + output_price
+    return price_tokens(model, token_counts['input_tokens'], token_counts['output_tokens'])
 
-def detect_pagination_elements(url: str, indications: str, selected_model: str, markdown_content: str) -> Tuple[Union[PaginationData, Dict, str], Dict, float]:
+def parse_pagination_response(response_content: str) -> PaginationResponse:
+    """Turn a JSON reply from a model without structured output into a PaginationResponse."""
+    try:
+        parsed_data = json.loads(response_content.strip())
+        if isinstance(parsed_data, dict):
+            parsed_data["page_urls"] = parsed_data.get("page_urls") or []
+            return PaginationResponse.model_validate(parsed_data)
+    except (json.JSONDecodeError, ValidationError, AttributeError):
+        pass
+    logging.error("Failed to parse pagination response as JSON")
+    return PaginationData(confidence=0.0)
+
+def detect_pagination_heuristically(url: str, indications: str, markdown_content: str, html_content=None):
+    """
+    PaginationData from the page's links alone when that is confident enough, else None.
+    User indications can ask for anything, so they always go to the LLM.
+    """
+    if not PAGINATION_HEURISTICS_ENABLED or indications.strip():
+        return None
+    result = detect_pagination_heuristic(url, markdown_content, html_content)
+    logging.info(f"Pagination heuristics for {url}: {result.confidence:.2f} confidence from {result.signals}")
+    if result.confidence < PAGINATION_MIN_CONFIDENCE:
+        return None
+    return PaginationData(**result.fields(), confidence=result.confidence, source="heuristic")
+
+def cached_pagination(url: str, indications: str) -> Optional[PaginationData]:
+    """An earlier LLM result for this URL, or its template applied to this URL, from the pagination cache."""
+    if not PAGINATION_CACHE_ENABLED:
+        return None
+    fields = get_pagination_cache().lookup(url, indications)
+    if fields is None:
+        return None
+    logging.info(f"Pagination for {url} reused from the pagination cache")
+    return PaginationData(**{**fields, "source": "cache"})
+
+def remember_pagination(url: str, indications: str, pagination_data: PaginationData, model: str):
+    if PAGINATION_CACHE_ENABLED and pagination_data.confidence > 0:
+        get_pagination_cache().store(url, indications, pagination_data.model_dump(), model)
+
+def detect_pagination_elements(url: str, indications: str, selected_model: str, markdown_content: str,
+                               html_content=None) -> Tuple[Union[PaginationData, Dict, str], Dict, float]:
     try:
         """
-        Uses AI models to analyze markdown content and extract pagination elements.
+        Finds the pagination URLs of a page: from its links when rel="next", a next anchor or
+        numbered page links make that unambiguous, then from the pagination cache, otherwise
+        by asking the selected model.
 
         Args:
-            selected_model (str): The name of the OpenAI model to use.
+            selected_model (str): The name of the model to fall back to.
             markdown_content (str): The markdown content to analyze.
+            html_content (str): The page's html, optional; gives the heuristics rel and aria attributes.
 
         Returns:
             Tuple[PaginationData, Dict, float]: Parsed pagination data, token counts, and pagination price.
+            The data's page_urls holds the first PAGINATION_MAX_PAGES pages; urls() yields them all.
         """ 
-        prompt_pagination = PROMPT_PAGINATION+"\n The url of the page to extract pagination from   "+url+"if the urls that you find are not complete combine them intelligently in a way that fit the pattern **ALWAYS GIVE A FULL URL**"
-        if indications != "":
-            prompt_pagination +=PROMPT_PAGINATION+"\n\n these are the users indications that, pay special attention to them: "+indications+"\n\n below are the markdowns of the website: \n\n"
-        else:
-            prompt_pagination +=PROMPT_PAGINATION+"\n There are no user indications in this case just apply the logic described. \n\n below are the markdowns of the website: \n\n"
-
-        if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
-            # Use OpenAI API
-            client = OpenAI(api_key=get_api_key('OPENAI_API_KEY'))
-            completion = client.beta.chat.completions.parse(
-                model=selected_model,
-                messages=[
-                    {"role": "system", "content": prompt_pagination},
-                    {"role": "user", "content": markdown_content},
-                ],
-                response_format=PaginationData
-            )
-
-            # Extract the parsed response
-            parsed_response = completion.choices[0].message.parsed
-
-            # Calculate tokens using tiktoken
-            encoder = tiktoken.encoding_for_model(selected_model)
-            input_token_count = len(encoder.encode(markdown_content))
-            output_token_count = len(encoder.encode(json.dumps(parsed_response.dict())))
-            token_counts = {
-                "input_tokens": input_token_count,
-                "output_tokens": output_token_count
-            }
-
-            # Calculate the price
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            return parsed_response, token_counts, pagination_price
-
-        elif selected_model == "gemini-1.5-flash":
-            # Use Google Gemini API
-            genai.configure(api_key=get_api_key("GOOGLE_API_KEY"))
-            model = genai.GenerativeModel(
-                'gemini-1.5-flash',
-                generation_config={
-                    "response_mime_type": "application/json",
-                    "response_schema": PaginationData
-                }
-            )
-            prompt = f"{prompt_pagination}\n{markdown_content}"
-            # Count input tokens using Gemini's method
-            input_tokens = model.count_tokens(prompt)
-            completion = model.generate_content(prompt)
-            # Extract token counts from usage_metadata
-            usage_metadata = completion.usage_metadata
-            token_counts = {
-                "input_tokens": usage_metadata.prompt_token_count,
-                "output_tokens": usage_metadata.candidates_token_count
-            }
-            # Get the result
-            response_content = completion.text
-            
-            # Log the response content and its type
-            logging.info(f"Gemini Flash response type: {type(response_content)}")
-            logging.info(f"Gemini Flash response content: {response_content}")
-            
-            # Try to parse the response as JSON
-            try:
-                parsed_data = json.loads(response_content)
-                if isinstance(parsed_data, dict) and 'page_urls' in parsed_data:
-                    pagination_data = PaginationData(**parsed_data)
-                else:
-                    pagination_data = PaginationData(page_urls=[])
-            except json.JSONDecodeError:
-                logging.error("Failed to parse Gemini Flash response as JSON")
-                pagination_data = PaginationData(page_urls=[])
-
-            # Calculate the price
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            return pagination_data, token_counts, pagination_price
-
-        elif selected_model == "Llama3.1 8B":
-            # Use Llama model via OpenAI API pointing to local server
-            openai.api_key = "lm-studio"
-            openai.api_base = "http://localhost:1234/v1"
-            response = openai.ChatCompletion.create(
-                model=LLAMA_MODEL_FULLNAME,
-                messages=[
-                    {"role": "system", "content": prompt_pagination},
-                    {"role": "user", "content": markdown_content},
-                ],
-                temperature=0.7,
-            )
-            response_content = response['choices'][0]['message']['content'].strip()
-            # Try to parse the JSON
-            try:
-                pagination_data = json.loads(response_content)
-            except json.JSONDecodeError:
-                pagination_data = {"next_buttons": [], "page_urls": []}
-            # Token counts
-            token_counts = {
-                "input_tokens": response['usage']['prompt_tokens'],
-                "output_tokens": response['usage']['completion_tokens']
-            }
-            # Calculate the price
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            return pagination_data, token_counts, pagination_price
-
-        elif selected_model == "Groq Llama3.1 70b":
-            # Use Groq client
-            client = Groq(api_key=get_api_key("GROQ_API_KEY"))
-            response = client.chat.completions.create(
-                model=GROQ_LLAMA_MODEL_FULLNAME,
-                messages=[
-                    {"role": "system", "content": prompt_pagination},
-                    {"role": "user", "content": markdown_content},
-                ],
-            )
-            response_content = response.choices[0].message.content.strip()
-            # Try to parse the JSON
-            try:
-                pagination_data = json.loads(response_content)
-            except json.JSONDecodeError:
-                pagination_data = {"page_urls": []}
-            # Token counts
-            token_counts = {
-                "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens
-            }
-            # Calculate the price
-            pagination_price = calculate_pagination_price(token_counts, selected_model)
-
-            '''# Ensure the pagination_data is a dictionary
-            if isinstance(pagination_data, PaginationData):
-                pagination_data = pagination_data.model_dump()
-            elif not isinstance(pagination_data, dict):
-                pagination_data = {"page_urls": []}'''
-
-            return pagination_data, token_counts, pagination_price
-
-        else:
-            raise ValueError(f"Unsupported model: {selected_model}")
+        pagination_data = (detect_pagination_heuristically(url, indications, markdown_content, html_content)
+                           or cached_pagination(url, indications))
+        if pagination_data is not None:
+            return pagination_data.with_page_urls(), {"input_tokens": 0, "output_tokens": 0}, 0.0
+
+        messages, selected_model = pagination_request(url, indications, selected_model, markdown_content,
+                                                      html_content)
+        if messages is None:
+            return PaginationData(confidence=0.0), {"input_tokens": 0, "output_tokens": 0}, 0.0
+        with metering_context(url=url, purpose="pagination"):
+            gateway = get_gateway()
+
+            if selected_model in OPENAI_PAGINATION_MODELS:
+                # OpenAI structured output, parsed straight into PaginationResponse
+                response = gateway.parse(selected_model, messages, PaginationResponse)
+                pagination_data = resolve_pagination_response(url, response.parsed)
+
+            elif selected_model in PAGINATION_CHAT_OPTIONS:
+                response = gateway.chat(selected_model, messages, **PAGINATION_CHAT_OPTIONS[selected_model])
+                logging.info(f"{selected_model} pagination response: {response.content}")
+                pagination_data = resolve_pagination_response(url, parse_pagination_response(response.content))
+
+            else:
+                raise ValueError(f"Unsupported model: {selected_model}")
+
+        remember_pagination(url, indications, pagination_data, selected_model)
+        token_counts = response.token_counts
+        pagination_price = calculate_pagination_price(token_counts, selected_model)
+
+        return pagination_data.with_page_urls(), token_counts, pagination_price
 
     except Exception as e:
         logging.error(f"An error occurred in detect_pagination_elements: {e}")
         # Return default values if an error occurs
-        return PaginationData(page_urls=[]), {"input_tokens": 0, "output_tokens": 0}, 0.0
+        return PaginationData(confidence=0.0), {"input_tokens": 0, "output_tokens": 0}, 0.0
+
+
+async def detect_pagination_elements_async(url: str, indications: str, selected_model: str, markdown_content: str,
+                                           html_content=None) -> Tuple[PaginationData, Dict, float]:
+    """Async counterpart of detect_pagination_elements, on the providers' async clients."""
+    try:
+        pagination_data = (detect_pagination_heuristically(url, indications, markdown_content, html_content)
+                           or cached_pagination(url, indications))
+        if pagination_data is not None:
+            return pagination_data.with_page_urls(), {"input_tokens": 0, "output_tokens": 0}, 0.0
+
+        messages, selected_model = pagination_request(url, indications, selected_model, markdown_content,
+                                                      html_content)
+        if messages is None:
+            return PaginationData(confidence=0.0), {"input_tokens": 0, "output_tokens": 0}, 0.0
+        with metering_context(url=url, purpose="pagination"):
+            gateway = get_gateway()
+
+            if selected_model in OPENAI_PAGINATION_MODELS:
+                response = await gateway.aparse(selected_model, messages, PaginationResponse)
+                pagination_data = resolve_pagination_response(url, response.parsed)
+            elif selected_model in PAGINATION_CHAT_OPTIONS:
+                response = await gateway.achat(selected_model, messages, **PAGINATION_CHAT_OPTIONS[selected_model])
+                pagination_data = resolve_pagination_response(url, parse_pagination_response(response.content))
+            else:
+                raise ValueError(f"Unsupported model: {selected_model}")
+
+        remember_pagination(url, indications, pagination_data, selected_model)
+        token_counts = response.token_counts
+        return pagination_data.with_page_urls(), token_counts, calculate_pagination_price(token_counts, selected_model)
+
+    except Exception as e:
+        logging.error(f"An error occurred in detect_pagination_elements_async: {e}")
+        return PaginationData(confidence=0.0), {"input_tokens": 0, "output_tokens": 0}, 0.0
+
+
+def pagination_request(url: str, indications: str, selected_model: str, markdown_content: str, html_content=None):
+    """
+    Build the pagination prompt messages and resolve AUTO_MODEL; returns (messages, model).
+    With PAGINATION_LINKS_ONLY the model gets the page's ranked links rather than its markdown;
+    when no link looks like pagination, messages is None unless there are indications to follow.
+    """
+    links = compact_links(url, markdown_content, html_content) if PAGINATION_LINKS_ONLY else ""
+    if PAGINATION_LINKS_ONLY and not links and not indications.strip():
+        logging.info(f"No pagination-looking links on {url}, not asking the model")
+        return None, selected_model
+    if links:
+        source = ("the links of the page most likely to be pagination, in page order, one per line as "
+                  "[anchor text](url) followed by hints: rel=next or next for next buttons, pager when the link "
+                  "is inside a pagination block, a quoted page count near it, and how far down the page it is")
+    else:
+        source = "the markdowns of the website"
+    prompt_pagination = PROMPT_PAGINATION+"\n The url of the page to extract pagination from   "+url+"if the urls that you find are not complete combine them intelligently in a way that fit the pattern **ALWAYS GIVE A FULL URL**"
+    if indications != "":
+        prompt_pagination +="\n\n these are the users indications that, pay special attention to them: "+indications+"\n\n below are "+source+": \n\n"
+    else:
+        prompt_pagination +="\n There are no user indications in this case just apply the logic described. \n\n below are "+source+": \n\n"
+
+    if links:
+        markdown_content = links
+    # Menus and footers repeated on every page of the site can't hold this page's pagination
+    elif BOILERPLATE_ENABLED:
+        markdown_content = strip_site_boilerplate(url, markdown_content)
+
+    messages = [
+        {"role": "system", "content": prompt_pagination},
+        {"role": "user", "content": markdown_content},
+    ]
+
+    if selected_model == AUTO_MODEL:
+        selected_model = get_router().choose(selected_model, estimate_tokens(prompt_pagination + markdown_content)).primary
+    return messages, selected_model
 
 
 if __name__ == "__main__":
@@ -216,6 +281,6 @@ if __name__ == "__main__":
     # Call the detect_pagination_elements function
     pagination_data, token_counts, pagination_price = detect_pagination_elements(url,"",selected_model, markdown_content)
     
-    print("Page URLs:", pagination_data.page_urls)
+    print("Page URLs:", list(pagination_data.urls()))
     print("Pagination Price:", pagination_price)
 
@@ -0,0 +1,278 @@
+# pagination_heuristics.py
+
+"""
+Deterministic pagination detection.
+
+Most listing pages expose their pagination in ways that need no model to read:
+a rel="next" link, a "Next"/"›" anchor, or a row of links that differ only in a page
+number (?page=2, &p=3, /page/4, ?start=40). This module finds those signals in the
+page's html (or, without html, in its markdown links) within milliseconds and scores
+how sure it is; pagination_detector only asks the LLM when the score is low.
+
+A numbered series is summarised as a URL template rather than a list: the changing
+number becomes {n}, with the first value, the step between pages and the last value seen,
+
+    https://example.com/list?q=tv&page={n}   start=2 step=1 end=48
+    https://example.com/list?start={n}       start=20 step=20 end=200   (offset)
+
+and expand_template() generates the page URLs from it lazily, as they are consumed.
+Cursor pagination (?cursor=abc) can't be expanded; only its next URL is known.
+"""
+
+import itertools
+import math
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from assets import PAGINATION_CURSOR_PARAMS, PAGINATION_OFFSET_PARAMS, PAGINATION_PARAMS
+from html_processing import WHITESPACE, parse_html
+from url_utils import normalize_url
+
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\(([^)\s]+)[^)]*\)")
+NEXT_LABEL = re.compile(r"^(?:next(?:\s+page|\s+results)?\s*[>»›→]*|[>»›→]+|more results|older posts)$",
+                        re.IGNORECASE)
+NEXT_CLASS = re.compile(r"(?:^|[\s_-])next(?:$|[\s_-])", re.IGNORECASE)
+PAGE_SEGMENT = re.compile(r"/(page|p)/(\d+)(?=/|$)", re.IGNORECASE)
+NUMBER = re.compile(r"^\d{1,5}$")
+
+
+class PageLink:
+    def __init__(self, url: str, text: str = "", rel: str = "", label: str = "", css_class: str = ""):
+        self.url = url
+        self.text = text
+        self.rel = rel.lower()
+        self.label = label
+        self.css_class = css_class
+
+    def is_next(self) -> bool:
+        return ("next" in self.rel.split() or NEXT_LABEL.match(self.text) is not None
+                or NEXT_LABEL.match(self.label) is not None or NEXT_CLASS.search(self.css_class) is not None)
+
+
+class PageSeries:
+    """Links that differ only in one numeric page parameter (or /page/N path segment)."""
+
+    def __init__(self, key: Tuple, param: str):
+        self.key = key
+        self.param = param
+        self.in_path = "{}" in key[1]
+        self.pages: Dict[int, str] = {}
+        self.numbered_anchors = 0
+
+    @property
+    def known_param(self) -> bool:
+        return self.param.lower() in PAGINATION_PARAMS
+
+    def urls(self, exclude: Optional[str] = None) -> List[str]:
+        return [url for _, url in sorted(self.pages.items()) if normalize_url(url) != exclude]
+
+    def template(self, page_url: Optional[str] = None) -> Dict:
+        """
+        The series as url_template/kind/start/step/end. Pages step by one; offsets by the
+        largest step all the linked offsets are multiples of. The start is the first page
+        after `page_url` (the current page; without a number it is the first page), so
+        expanding doesn't revisit it or the pages before it.
+        """
+        numbers = sorted(self.pages)
+        kind = "offset" if self.param.lower() in PAGINATION_OFFSET_PARAMS else "page"
+        step = 1
+        if kind == "offset":
+            step = math.gcd(*[b - a for a, b in itertools.pairwise(numbers)])
+        current = next((number for key, _, number in page_number(page_url) if key == self.key), None) \
+            if page_url else None
+        if current is None:
+            current = 0 if kind == "offset" or numbers[0] == 0 else 1
+        later = [number for number in numbers if number > current]
+        return {
+            "url_template": template_url(self.pages[numbers[0]], self.param, self.in_path),
+            "kind": kind,
+            "start": later[0] if later else current + step,  # past `end` on the last page: nothing to expand
+            "step": step,
+            "end": numbers[-1],
+        }
+
+
+class HeuristicResult:
+    def __init__(self, confidence: float, signals: List[str], url_template: Optional[str] = None,
+                 kind: Optional[str] = None, start: Optional[int] = None, step: Optional[int] = None,
+                 end: Optional[int] = None, next_url: Optional[str] = None):
+        self.confidence = confidence
+        self.signals = signals
+        self.url_template = url_template
+        self.kind = kind
+        self.start = start
+        self.step = step
+        self.end = end
+        self.next_url = next_url
+
+    def fields(self) -> Dict:
+        return {name: getattr(self, name) for name in ("url_template", "kind", "start", "step", "end", "next_url")}
+
+
+def template_url(url: str, param: str, in_path: bool = False) -> str:
+    """`url` with the value of its page parameter (or /page/N segment) replaced by {n}."""
+    parts = urlsplit(url)
+    if in_path:
+        path = PAGE_SEGMENT.sub(lambda match: f"/{match.group(1)}/{{n}}", parts.path, count=1)
+        return urlunsplit(parts._replace(path=path))
+    query = re.sub(rf"(^|&)({re.escape(param)}=)\d+", r"\1\2{n}", parts.query, count=1)
+    return urlunsplit(parts._replace(query=query))
+
+
+def expand_template(url_template: str, start: int = 1, step: int = 1, end: Optional[int] = None,
+                    limit: Optional[int] = None) -> Iterator[str]:
+    """
+    Page URLs of a template, generated one at a time: start, start+step, ... up to `end`
+    inclusive, and at most `limit` of them (needed when `end` is unknown).
+    """
+    step = step if step and step > 0 else 1
+    value, count = start, 0
+    while (end is None or value <= end) and (limit is None or count < limit):
+        yield url_template.replace("{n}", str(value))
+        value += step
+        count += 1
+
+
+def is_cursor_url(url: str) -> bool:
+    """A next link carrying an opaque cursor (?cursor=eyJ..., ?after=abc) rather than a number."""
+    return any(name.lower() in PAGINATION_CURSOR_PARAMS and value and not value.isdigit()
+               for name, value in parse_qsl(urlsplit(url).query))
+
+
+def links_from_html(html_content, base_url: str) -> List[PageLink]:
+    tree = parse_html(html_content)
+    links = []
+    for element in tree.iter("a", "link"):
+        href = (element.get("href") or "").strip()
+        if not href or href.startswith(("javascript:", "mailto:", "tel:", "#")):
+            continue
+        if element.tag == "link" and "next" not in (element.get("rel") or "").lower().split():
+            continue
+        links.append(PageLink(
+            urljoin(base_url, href),
+            WHITESPACE.sub(" ", element.text_content()).strip() if element.tag == "a" else "",
+            element.get("rel") or "",
+            (element.get("aria-label") or element.get("title") or "").strip(),
+            element.get("class") or "",
+        ))
+    return links
+
+
+def links_from_markdown(markdown: str, base_url: str) -> List[PageLink]:
+    return [PageLink(urljoin(base_url, href), WHITESPACE.sub(" ", text).strip())
+            for text, href in MARKDOWN_LINK.findall(markdown or "")]
+
+
+def page_number(url: str) -> List[Tuple[Tuple, str, int]]:
+    """
+    Every way `url` could be one page of a series: (series key, parameter, page number)
+    for each numeric query parameter and for a /page/N path segment.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    host = (parts.hostname or "").lower()
+    readings = []
+    for index, (name, value) in enumerate(query):
+        if value.isdigit():
+            rest = urlencode(sorted(query[:index] + query[index + 1:]))
+            readings.append(((host, parts.path.rstrip("/"), rest, name), name, int(value)))
+    match = PAGE_SEGMENT.search(parts.path)
+    if match:
+        template = parts.path[:match.start()] + f"/{match.group(1)}/{{}}" + parts.path[match.end():]
+        readings.append(((host, template, urlencode(sorted(query)), match.group(1)), match.group(1),
+                         int(match.group(2))))
+    return readings
+
+
+def find_series(links: List[PageLink], page_url: str) -> List[PageSeries]:
+    series: Dict[Tuple, PageSeries] = {}
+    for link in links:
+        for key, param, number in page_number(link.url):
+            entry = series.setdefault(key, PageSeries(key, param))
+            entry.pages.setdefault(number, link.url)
+            if NUMBER.match(link.text) and int(link.text) in (number, number + 1):
+                # Anchor text matching the value (page=N, or zero-based page=N-1)
+                entry.numbered_anchors += 1
+    # The current page belongs to its series even if it doesn't link to itself
+    for key, param, number in page_number(page_url):
+        if key in series:
+            series[key].pages.setdefault(number, page_url)
+    return [entry for entry in series.values()
+            if len(entry.pages) >= 2 and (entry.known_param or entry.numbered_anchors >= 2)]
+
+
+def next_link_template(next_url: str, page_url: str) -> Optional[Dict]:
+    """
+    Template from a lone next link numbered by a known page parameter (?pg=2 from a page
+    without pg); its last page is unknown.
+    """
+    current = {key: number for key, _, number in page_number(page_url)}
+    for key, param, number in page_number(next_url):
+        if param.lower() not in PAGINATION_PARAMS:
+            continue
+        step = 1
+        if param.lower() in PAGINATION_OFFSET_PARAMS:
+            step = number - current.get(key, 0)
+        if step > 0:
+            return {"url_template": template_url(next_url, param, "{}" in key[1]),
+                    "kind": "offset" if param.lower() in PAGINATION_OFFSET_PARAMS else "page",
+                    "start": number, "step": step, "end": None}
+    return None
+
+
+def series_confidence(entry: PageSeries) -> float:
+    confidence = 0.55 + 0.1 * min(len(entry.pages) - 1, 3)
+    if entry.known_param:
+        confidence += 0.05
+    if entry.numbered_anchors >= 2:
+        confidence += 0.1
+    return min(confidence, 0.95)
+
+
+def detect_pagination_heuristic(url: str, markdown: Optional[str] = None, html_content=None) -> HeuristicResult:
+    """
+    Pagination URLs of a listing page from its links alone, with a 0-1 confidence.
+
+    Signals, strongest first: rel="next", a next-page anchor (text, aria-label or class),
+    and series of same-site links that differ only in a page number. A series is returned
+    as a URL template, a next link on its own as next_url.
+    """
+    links = links_from_html(html_content, url) if html_content else links_from_markdown(markdown, url)
+    host = (urlsplit(url).hostname or "").lower()
+    current = normalize_url(url)
+    links = [link for link in links if (urlsplit(link.url).hostname or "").lower() == host]
+
+    signals, confidence = [], 0.0
+    next_urls = []
+    for link in links:
+        if link.is_next() and normalize_url(link.url) != current and link.url not in next_urls:
+            next_urls.append(link.url)
+            strength = 0.95 if "next" in link.rel.split() else 0.8
+            confidence = max(confidence, strength)
+            signals.append("rel=next" if strength > 0.9 else "next anchor")
+
+    result = HeuristicResult(confidence, signals, next_url=next_urls[0] if next_urls else None)
+    if result.next_url and is_cursor_url(result.next_url):
+        result.kind = "cursor"
+        signals.append("cursor")
+
+    series = sorted(find_series(links, url), key=series_confidence, reverse=True)
+    if series:
+        best = series[0]
+        for name, value in best.template(url).items():
+            setattr(result, name, value)
+        result.confidence = max(result.confidence, series_confidence(best))
+        signals.append(f"{len(best.pages)} pages numbered by '{best.param}'")
+        series_urls = {normalize_url(page_url) for page_url in best.urls()}
+        if any(normalize_url(next_url) in series_urls for next_url in next_urls):
+            # Two independent signals point at the same pages
+            result.confidence = min(0.99, result.confidence + 0.05)
+
+    elif result.next_url and result.kind != "cursor":
+        for name, value in (next_link_template(result.next_url, url) or {}).items():
+            setattr(result, name, value)
+
+    if not result.url_template and not result.next_url:
+        result.confidence = 0.0
+    return result
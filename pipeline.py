@@ -0,0 +1,300 @@
+# pipeline.py
+
+"""
+Staged, concurrent scrape pipeline for many URLs.
+
+Each URL flows through four stages connected by bounded queues:
+
+    fetch -> convert (html to markdown) -> extract (LLM) -> persist (raw markdown, JSON, Excel)
+
+Every stage has its own worker threads, so fetching page N+1 overlaps the LLM call
+for page N and disk writes never hold up either. Bounded queues apply backpressure
+when a stage falls behind, and `cancel()` stops all stages after their current page.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from assets import (
+    PIPELINE_CONVERT_WORKERS,
+    PIPELINE_EXTRACT_WORKERS,
+    PIPELINE_FETCH_WORKERS,
+    PIPELINE_PERSIST_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    TEMPLATES_ENABLED,
+)
+from driver_pool import describe_pool_usage, get_driver_pool_stats
+from extraction_cache import get_extraction_cache
+from metering import metering_context, start_run
+from schema_registry import field_names
+from scraper import (
+    calculate_price,
+    create_dynamic_listing_model,
+    create_listings_container_model,
+    fetch_html,
+    format_data_chunked,
+    html_to_markdown_with_readability,
+    save_formatted_data,
+    save_raw_data,
+)
+from wrapper_induction import extract_with_templates, get_template_stats
+
+_DONE = object()
+
+
+class PageJob:
+    """Everything the pipeline knows about one URL as it moves through the stages."""
+
+    def __init__(self, url: str, file_number: int):
+        self.url = url
+        self.file_number = file_number
+        self.html: Optional[str] = None
+        self.markdown: Optional[str] = None
+        self.formatted_data = None
+        self.token_counts = {"input_tokens": 0, "output_tokens": 0}
+        self.total_cost = 0.0
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+    def result(self) -> Dict:
+        return {
+            "url": self.url,
+            "file_number": self.file_number,
+            "input_tokens": self.token_counts["input_tokens"],
+            "output_tokens": self.token_counts["output_tokens"],
+            "total_cost": self.total_cost,
+            "formatted_data": self.formatted_data,
+            "error": self.error,
+            "timings": self.timings,
+        }
+
+
+class StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_started: Optional[float] = None
+        self.last_finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, started: float, finished: float, ok: bool):
+        with self._lock:
+            self.processed += 1
+            if not ok:
+                self.failed += 1
+            self.busy_seconds += finished - started
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            if self.last_finished is None or finished > self.last_finished:
+                self.last_finished = finished
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            active = (self.last_finished - self.first_started) if self.processed else 0.0
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "processed": self.processed,
+                "failed": self.failed,
+                "pages_per_second": self.processed / active if active > 0 else 0.0,
+                "avg_seconds_per_page": self.busy_seconds / self.processed if self.processed else 0.0,
+                "utilisation": self.busy_seconds / (self.workers * active) if active > 0 else 0.0,
+            }
+
+
+class ScrapePipeline:
+    def __init__(self, fields: List[str], selected_model: str, output_folder: str,
+                 fetch: Callable[[str], str] = fetch_html,
+                 convert: Callable[[str, str], str] = html_to_markdown_with_readability,
+                 fetch_workers: int = PIPELINE_FETCH_WORKERS,
+                 convert_workers: int = PIPELINE_CONVERT_WORKERS,
+                 extract_workers: int = PIPELINE_EXTRACT_WORKERS,
+                 persist_workers: int = PIPELINE_PERSIST_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE):
+        """
+        Args:
+            fields (List[str]): Names of the fields to extract from every page.
+            selected_model (str): Model used for extraction and pricing.
+            output_folder (str): Folder receiving rawData_N.md and sorted_data_N.json/.xlsx.
+            fetch (Callable): url -> html, defaults to scraper.fetch_html.
+            convert (Callable): (html, url) -> markdown; the url resolves relative links.
+            *_workers (int): Concurrency limit of each stage.
+            queue_size (int): Capacity of the queue in front of each stage after fetch.
+        """
+        self.fields = fields
+        self.selected_model = selected_model
+        self.output_folder = output_folder
+        self._fetch = fetch
+        self._convert = convert
+        self.queue_size = queue_size
+
+        self.listing_model = create_dynamic_listing_model(fields)
+        self.container_model = create_listings_container_model(self.listing_model)
+
+        self._stages = [
+            ("fetch", self._fetch_page, fetch_workers),
+            ("convert", self._convert_page, convert_workers),
+            ("extract", self._extract_page, extract_workers),
+            ("persist", self._persist_page, persist_workers),
+        ]
+        self._stats = {name: StageStats(name, workers) for name, _, workers in self._stages}
+        self._cancelled = threading.Event()
+        self._results: List[PageJob] = []
+        self._results_lock = threading.Lock()
+
+    def cancel(self):
+        """Stop the pipeline; pages already inside a stage finish, queued pages are dropped."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def stats(self) -> List[Dict]:
+        """Throughput and utilisation of every stage."""
+        return [self._stats[name].as_dict() for name, _, _ in self._stages]
+
+    def run(self, urls: List[str], first_file_number: int = 1) -> List[Dict]:
+        """Process all URLs and return one result dict per finished URL, in input order (cancelled pages are left out)."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self._stages]
+        threads = []
+        for index, (name, handler, workers) in enumerate(self._stages):
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            next_workers = self._stages[index + 1][2] if outbox is not None else 0
+            remaining = {"workers": workers}
+            lock = threading.Lock()
+            for worker in range(workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(name, handler, inbox, outbox, next_workers, remaining, lock),
+                    name=f"pipeline-{name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for offset, url in enumerate(urls):
+            if self.cancelled:
+                break
+            self._put(queues[0], PageJob(url, first_file_number + offset))
+        for _ in range(self._stages[0][2]):
+            queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        with self._results_lock:
+            jobs = sorted(self._results, key=lambda job: job.file_number)
+        return [job.result() for job in jobs]
+
+    def _put(self, target: queue.Queue, item):
+        # Poll so a cancelled run doesn't block forever on a full queue
+        while not self.cancelled:
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self, name, handler, inbox, outbox, next_workers, remaining, lock):
+        stats = self._stats[name]
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                break
+            if self.cancelled:
+                continue
+            started = time.monotonic()
+            try:
+                handler(job)
+                ok = True
+            except Exception as e:
+                job.error = f"{name}: {e}"
+                logging.error(f"Pipeline stage '{name}' failed for {job.url}: {e}")
+                ok = False
+            finished = time.monotonic()
+            job.timings[name] = finished - started
+            stats.record(started, finished, ok)
+
+            if ok and outbox is not None:
+                self._put(outbox, job)
+            else:
+                # Last stage or failed page: the job is finished
+                with self._results_lock:
+                    self._results.append(job)
+
+        with lock:
+            remaining["workers"] -= 1
+            last = remaining["workers"] == 0
+        if last and outbox is not None:
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    def _fetch_page(self, job: PageJob):
+        job.html = self._fetch(job.url)
+
+    def _convert_page(self, job: PageJob):
+        job.markdown = self._convert(job.html, job.url)
+        if not TEMPLATES_ENABLED:
+            job.html = None  # markdown is all later stages need; free the (large) html
+
+    def _extract_page(self, job: PageJob):
+        def llm_extract():
+            return format_data_chunked(job.markdown, self.container_model, self.listing_model, self.selected_model,
+                                       url=job.url)
+
+        with metering_context(url=job.url, purpose="extraction"):
+            if job.html is not None:
+                job.formatted_data, job.token_counts = extract_with_templates(job.url, job.html, field_names(self.fields),
+                                                                              llm_extract)
+                job.html = None
+            else:
+                job.formatted_data, job.token_counts = llm_extract()
+        _, _, job.total_cost = calculate_price(job.token_counts, self.selected_model)
+
+    def _persist_page(self, job: PageJob):
+        n = job.file_number
+        save_raw_data(job.markdown, self.output_folder, f'rawData_{n}.md')
+        save_formatted_data(job.formatted_data, self.output_folder, f'sorted_data_{n}.json', f'sorted_data_{n}.xlsx',
+                            self.fields)
+
+
+def scrape_urls(urls: List[str], fields: List[str], selected_model: str, output_folder: str,
+                pipeline: Optional[ScrapePipeline] = None) -> List[Dict]:
+    """Scrape many URLs concurrently. Pass your own `pipeline` to be able to cancel it or read its stats."""
+    pipeline = pipeline or ScrapePipeline(fields, selected_model, output_folder)
+    ledger = start_run()
+    # The extraction cache is shared by every run in the process; report only this run's share
+    cache_before = get_extraction_cache().stats()
+    pool_before = get_driver_pool_stats()
+    results = pipeline.run(urls)
+    for stage in pipeline.stats():
+        print(f"{stage['stage']}: {stage['processed']} pages, {stage['pages_per_second']:.2f} pages/s, "
+              f"{stage['utilisation']:.0%} busy")
+    cache_after = get_extraction_cache().stats()
+    cache = {key: cache_after[key] - cache_before[key]
+             for key in ("hits", "misses", "expired", "input_tokens_saved", "output_tokens_saved")}
+    lookups = cache["hits"] + cache["misses"] + cache["expired"]
+    hit_rate = cache["hits"] / lookups if lookups else 0.0
+    print(f"extraction cache: {hit_rate:.0%} hit rate ({cache['hits']} hits, {cache['misses']} misses), "
+          f"{cache['input_tokens_saved'] + cache['output_tokens_saved']:,} tokens saved")
+    pool_usage = describe_pool_usage(pool_before)
+    if pool_usage:
+        print(pool_usage)
+    templates = get_template_stats()
+    if templates:
+        print(f"extraction templates: {templates.get('templated', 0)} pages without the LLM, "
+              f"{templates.get('verified', 0)} verified, {templates.get('learned', 0)} learned")
+    totals = ledger.totals()
+    print(f"LLM usage (run {ledger.run_id}): {totals['calls']} calls, {totals['cache_hits']} cache hits, "
+          f"{totals['input_tokens'] + totals['output_tokens']:,} tokens, ${totals['cost']:.4f} "
+          f"(${totals['saved_cost']:.4f} saved by the cache)")
+    return results
@@ -0,0 +1,135 @@
+# resource_blocking.py
+
+"""
+Request blocking for headless Chrome through the DevTools protocol.
+
+A blocking profile (see BLOCKING_PROFILES in assets.py) lists resource types and URL
+patterns that Chrome should never download. Profiles are applied per navigation with
+`Network.setBlockedURLs`, so pooled drivers can switch profiles between pages.
+Chrome's performance log is used afterwards to count what was blocked and how many
+bytes the page actually transferred.
+"""
+
+import json
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List
+
+from assets import BLOCKING_PROFILES
+
+# File extensions Chrome is told to refuse for each blocked resource type
+RESOURCE_TYPE_EXTENSIONS = {
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"],
+    "media": ["mp4", "webm", "m3u8", "mpd", "mp3", "ogg", "wav", "mov"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "stylesheet": ["css"],
+}
+
+# Chrome's error text for requests refused by Network.setBlockedURLs
+BLOCKED_BY_CLIENT = "inspector"
+
+
+def build_blocked_url_patterns(profile_name: str) -> List[str]:
+    """Expand a blocking profile into the wildcard patterns understood by Network.setBlockedURLs."""
+    if profile_name not in BLOCKING_PROFILES:
+        raise ValueError(f"Unknown blocking profile: {profile_name}")
+    profile = BLOCKING_PROFILES[profile_name]
+    patterns = []
+    for resource_type in profile["resource_types"]:
+        for extension in RESOURCE_TYPE_EXTENSIONS.get(resource_type, []):
+            patterns.append(f"*.{extension}")
+            patterns.append(f"*.{extension}?*")
+    patterns.extend(profile["url_patterns"])
+    return patterns
+
+
+def apply_blocking_profile(driver, profile_name: str):
+    """Set the blocked URL patterns for the next navigation of `driver`."""
+    patterns = build_blocked_url_patterns(profile_name)
+    # Drop log entries left over from the previous page so the counters only cover this one
+    drain_performance_log(driver)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def drain_performance_log(driver) -> List[Dict]:
+    try:
+        return driver.get_log("performance")
+    except Exception:
+        # Performance logging isn't enabled on drivers not created by setup_selenium
+        return []
+
+
+def collect_blocking_stats(driver) -> Dict:
+    """Count blocked requests and transferred bytes for the page loaded since apply_blocking_profile."""
+    request_types = {}
+    blocked = Counter()
+    transferred_bytes = 0
+    requests_finished = 0
+
+    for entry in drain_performance_log(driver):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            request_types[params.get("requestId")] = params.get("type", "Other")
+        elif method == "Network.loadingFinished":
+            requests_finished += 1
+            transferred_bytes += params.get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed" and params.get("blockedReason") == BLOCKED_BY_CLIENT:
+            resource_type = params.get("type") or request_types.get(params.get("requestId"), "Other")
+            blocked[resource_type] += 1
+
+    return {
+        "blocked_requests": sum(blocked.values()),
+        "blocked_by_type": dict(blocked),
+        "requests_finished": requests_finished,
+        "transferred_bytes": transferred_bytes,
+    }
+
+
+class BlockingCounters:
+    """Running totals per blocking profile across all fetched pages."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict] = {}
+
+    def add(self, profile_name: str, page_stats: Dict):
+        with self._lock:
+            totals = self._totals.setdefault(profile_name, {
+                "pages": 0, "blocked_requests": 0, "blocked_by_type": Counter(),
+                "requests_finished": 0, "transferred_bytes": 0,
+            })
+            totals["pages"] += 1
+            totals["blocked_requests"] += page_stats["blocked_requests"]
+            totals["blocked_by_type"].update(page_stats["blocked_by_type"])
+            totals["requests_finished"] += page_stats["requests_finished"]
+            totals["transferred_bytes"] += page_stats["transferred_bytes"]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: {**totals, "blocked_by_type": dict(totals["blocked_by_type"])}
+                    for name, totals in self._totals.items()}
+
+
+blocking_counters = BlockingCounters()
+
+
+def get_blocking_stats() -> Dict[str, Dict]:
+    return blocking_counters.snapshot()
+
+
+def record_page_blocking(driver, profile_name: str) -> Dict:
+    """Collect the stats for the current page and add them to the running totals."""
+    try:
+        page_stats = collect_blocking_stats(driver)
+    except Exception as e:
+        logging.warning(f"Could not collect request blocking stats: {e}")
+        return {}
+    blocking_counters.add(profile_name, page_stats)
+    return page_stats
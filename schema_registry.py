@@ -0,0 +1,194 @@
+# schema_registry.py
+
+"""
+Typed listing schemas.
+
+Fields are requested as plain names ("name", "price") or with a declared type
+("price:money"). The LLM still extracts every field as text, so prompts, caches and
+templates see only the bare names; the types are applied afterwards, when the listings
+become a DataFrame, by vectorised pandas parsers (one pass per column, not per row).
+Prices like "R 2,499.00" become 2499.0 with the currency in a separate column, and
+ratings like "4.1 out of 5 stars" become 4.1, so the Excel output sorts and filters as numbers.
+A value that doesn't parse ("Call for price", "Excellent") is kept as text in a
+"<field>_raw" column next to the typed one, so nothing the page said is lost.
+
+Pydantic models are cached by field signature instead of being rebuilt for every page.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Tuple, Type
+
+import pandas as pd
+from pydantic import BaseModel, create_model
+
+from assets import FIELD_TYPE_HINTS, FIELD_TYPES
+
+# "2 499,00" (space-grouped thousands) or "2,499.00" / "4.1" / "12"
+NUMBER = r"(-?\d{1,3}(?:[\s\u00a0]\d{3})+(?:[.,]\d{1,2})?(?!\d)|-?\d+(?:[.,]\d+)*)"
+CURRENCY_SYMBOL = r"(R\$|[$€£¥₹₩₽₺]|\bR(?=\s?\d))"
+# ISO 4217 codes seen on listing sites, since most capitalised three-letter words ("NEW", "USB") are not currencies
+CURRENCY_CODES = ("USD", "EUR", "GBP", "JPY", "CNY", "INR", "ZAR", "AUD", "CAD", "NZD", "CHF", "SEK", "NOK", "DKK",
+                  "PLN", "CZK", "HUF", "RON", "TRY", "RUB", "UAH", "BRL", "MXN", "ARS", "CLP", "COP", "PEN", "KRW",
+                  "SGD", "HKD", "TWD", "THB", "MYR", "IDR", "PHP", "VND", "AED", "SAR", "ILS", "EGP", "NGN", "KES",
+                  "GHS", "MAD", "PKR", "BDT")
+CURRENCY_CODE = rf"\b({'|'.join(CURRENCY_CODES)})\b"
+MULTIPLIERS = {"k": 1_000, "m": 1_000_000, "b": 1_000_000_000}
+
+
+class FieldSpec:
+    def __init__(self, name: str, type: str = "text"):
+        if type not in FIELD_TYPES:
+            raise ValueError(f"Unknown field type '{type}' for '{name}', expected one of {FIELD_TYPES}")
+        self.name = name
+        self.type = type
+
+    def __repr__(self):
+        return f"{self.name}:{self.type}"
+
+
+def infer_field_type(name: str) -> str:
+    lowered = name.lower()
+    for pattern, field_type in FIELD_TYPE_HINTS:
+        if re.search(pattern, lowered):
+            return field_type
+    return "text"
+
+
+def parse_field(field: str) -> FieldSpec:
+    """'price:money' -> FieldSpec('price', 'money'); a bare name gets its type from FIELD_TYPE_HINTS."""
+    name, _, declared = field.partition(":")
+    name = name.strip()
+    return FieldSpec(name, declared.strip().lower() if declared.strip() else infer_field_type(name))
+
+
+def parse_fields(fields: List[str]) -> List[FieldSpec]:
+    return [parse_field(field) for field in fields]
+
+
+def field_names(fields: List[str]) -> List[str]:
+    """The names the LLM extracts, without type declarations."""
+    return [spec.name for spec in parse_fields(fields)]
+
+
+# Vectorised column parsers
+
+def parse_number_column(values: pd.Series) -> pd.Series:
+    """
+    First number in each value as a float, reading "2,499.00", "2.499,00" and "2 499" alike:
+    the last separator is the decimal point when one or two digits follow it.
+    """
+    text = values.astype("string").str.extract(NUMBER, expand=False).str.replace(r"\s", "", regex=True)
+    last_comma = text.str.rfind(",")
+    last_dot = text.str.rfind(".")
+    decimals = text.str.len() - pd.concat([last_comma, last_dot], axis=1).max(axis=1) - 1
+    comma_decimal = (last_comma > last_dot) & decimals.isin([1, 2])
+    dot_thousands = (last_dot > last_comma) & (text.str.count(r"\.") > 1)
+
+    normalized = text.where(~comma_decimal, text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    normalized = normalized.where(comma_decimal | dot_thousands, normalized.str.replace(",", "", regex=False))
+    normalized = normalized.where(~dot_thousands, normalized.str.replace(".", "", regex=False))
+    return pd.to_numeric(normalized, errors="coerce").astype("Float64")
+
+
+def parse_money_column(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """(amount, currency) columns; the currency is the value's symbol, or else its ISO code."""
+    text = values.astype("string")
+    symbol = text.str.extract(CURRENCY_SYMBOL, expand=False)
+    code = text.str.extract(CURRENCY_CODE, expand=False)
+    return parse_number_column(values), symbol.fillna(code).str.strip()
+
+
+def parse_rating_column(values: pd.Series) -> pd.Series:
+    """'4.1 out of 5 stars' -> 4.1; a bare 'x/5' keeps x."""
+    return parse_number_column(values)
+
+
+def parse_int_column(values: pd.Series) -> pd.Series:
+    """'1,234 ratings' -> 1234, '2.3K reviews' -> 2300."""
+    text = values.astype("string")
+    numbers = parse_number_column(text)
+    suffix = text.str.extract(r"\d\s*([kKmMbB])\b", expand=False).str.lower()
+    multiplier = suffix.map(MULTIPLIERS).astype("Float64").fillna(1)
+    return (numbers * multiplier).round().astype("Int64")
+
+
+def parse_url_column(values: pd.Series) -> pd.Series:
+    text = values.astype("string").str.strip().str.strip("<>")
+    return text.where(text.str.match(r"^(?:https?://|/|www\.)"), pd.NA)
+
+
+def typed_dataframe(listings: List[Dict], fields: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    DataFrame of extracted listings with each field converted to its type.
+
+    Without `fields`, every column is typed from its name. Money fields get an extra
+    "<field>_currency" column when any currency was found, and any typed field a
+    "<field>_raw" column with the values that didn't parse.
+    """
+    df = pd.DataFrame(listings)
+    specs = parse_fields(fields) if fields else [FieldSpec(column, infer_field_type(column))
+                                                 for column in df.columns if isinstance(column, str)]
+    for spec in specs:
+        if spec.name not in df.columns or spec.type == "text":
+            continue
+        column = df[spec.name].where(df[spec.name].notna(), None)
+        extra: Dict[str, pd.Series] = {}
+        if spec.type == "money":
+            parsed, currency = parse_money_column(column)
+            if currency.notna().any():
+                extra[f"{spec.name}_currency"] = currency
+        elif spec.type == "rating":
+            parsed = parse_rating_column(column)
+        elif spec.type == "int":
+            parsed = parse_int_column(column)
+        else:
+            parsed = parse_url_column(column)
+
+        text = column.astype("string").str.strip()
+        unparsed = text.notna() & (text != "") & parsed.isna()
+        if unparsed.any():
+            extra[f"{spec.name}_raw"] = text.where(unparsed, pd.NA)
+        df[spec.name] = parsed
+        for offset, (name, values) in enumerate(extra.items(), start=1):
+            df.insert(df.columns.get_loc(spec.name) + offset, name, values)
+    return df
+
+
+class SchemaRegistry:
+    """Listing and container models cached by field signature."""
+
+    def __init__(self):
+        self._listing_models: Dict[Tuple[str, ...], Type[BaseModel]] = {}
+        self._container_models: Dict[Type[BaseModel], Type[BaseModel]] = {}
+        self._lock = threading.Lock()
+
+    def listing_model(self, fields: List[str]) -> Type[BaseModel]:
+        names = tuple(field_names(fields))
+        with self._lock:
+            model = self._listing_models.get(names)
+            if model is None:
+                # The LLM returns every field as text; typing happens in typed_dataframe
+                model = create_model('DynamicListingModel', **{name: (str, ...) for name in names})
+                self._listing_models[names] = model
+            return model
+
+    def container_model(self, listing_model: Type[BaseModel]) -> Type[BaseModel]:
+        with self._lock:
+            model = self._container_models.get(listing_model)
+            if model is None:
+                model = create_model('DynamicListingsContainer', listings=(List[listing_model], ...))
+                self._container_models[listing_model] = model
+            return model
+
+
+_registry: Optional[SchemaRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_schema_registry() -> SchemaRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SchemaRegistry()
+        return _registry
@@ -1,15 +1,15 @@
+import asyncio
+import contextvars
 import os
-import random
-import time
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Type
+from functools import lru_cache
+from typing import List, Dict, Tuple, Type
 
-import pandas as pd
-from bs4 import BeautifulSoup
-from pydantic import BaseModel, Field, create_model
-import tiktoken
+import requests
+from pydantic import BaseModel, Field
 import streamlit as st
 
 from dotenv import load_dotenv
@@ -23,12 +23,23 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
 
-from openai import OpenAI
-import google.generativeai as genai
-from groq import Groq
-
-from api_management import get_api_key
-from assets import USER_AGENTS,PRICING,HEADLESS_OPTIONS,SYSTEM_MESSAGE,USER_MESSAGE,LLAMA_MODEL_FULLNAME,GROQ_LLAMA_MODEL_FULLNAME,HEADLESS_OPTIONS_DOCKER
+from llm_gateway import get_gateway
+from model_router import get_router
+from driver_pool import get_driver_pool
+from scroll_engine import adaptive_scroll
+from resource_blocking import apply_blocking_profile, record_page_blocking
+from token_accounting import truncate_to_tokens, count_tokens
+from chunking import chunk_budget, chunk_markdown, merge_listings
+from html_processing import parse_html, clean_tree, tree_to_text, serialize_tree
+from content_extraction import convert_html_to_markdown
+from fetch_cache import get_fetch_cache
+from extraction_cache import get_extraction_cache
+from wrapper_induction import extract_with_templates, extract_with_templates_async
+from boilerplate_filter import strip_site_boilerplate_chunks
+from schema_registry import get_schema_registry, typed_dataframe, field_names
+from metering import price_tokens, metering_context
+from http_fetcher import fetch_html_http, needs_javascript, get_fetch_mode_memory, get_domain, BROWSER_RETRY_STATUSES
+from assets import USER_AGENTS,PRICING,HEADLESS_OPTIONS,SYSTEM_MESSAGE,USER_MESSAGE,LLAMA_MODEL_FULLNAME,GROQ_LLAMA_MODEL_FULLNAME,HEADLESS_OPTIONS_DOCKER,DEFAULT_BLOCKING_PROFILE,FETCH_CACHE_ENABLED,EXTRACTION_CHUNK_WORKERS,EXTRACTION_CACHE_ENABLED,TEMPLATES_ENABLED,BOILERPLATE_ENABLED,ASYNC_SCRAPE_CONCURRENCY
 load_dotenv()
 
 
@@ -46,9 +57,15 @@ def is_running_in_docker():
     except Exception:
         return False
 
+@lru_cache(maxsize=1)
+def get_chromedriver_path():
+    """Resolve chromedriver once per process instead of on every driver launch."""
+    return ChromeDriverManager().install()
+
+
 def setup_selenium(attended_mode=False):
     options = Options()
-    service = Service(ChromeDriverManager().install())
+    service = Service(get_chromedriver_path())
 
     # Apply headless options based on whether the code is running in Docker
     if is_running_in_docker():
@@ -60,6 +77,9 @@ def setup_selenium(attended_mode=False):
         for option in HEADLESS_OPTIONS:
             options.add_argument(option)
 
+    # Performance logging lets resource_blocking count blocked requests and transferred bytes
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
     # Initialize the WebDriver
     driver = webdriver.Chrome(service=service, options=options)
     return driver
@@ -67,71 +87,129 @@ def setup_selenium(attended_mode=False):
 
 
 
-def fetch_html_selenium(url, attended_mode=False, driver=None):
+def get_pool():
+    """Shared pool of warm headless drivers used for unattended fetches."""
+    return get_driver_pool(setup_selenium)
+
+
+def fetch_html_selenium(url, attended_mode=False, driver=None, target_items=None, item_selector=None,
+                        blocking_profile=DEFAULT_BLOCKING_PROFILE, use_cache=FETCH_CACHE_ENABLED):
+    if driver is None and not attended_mode:
+        # Browser pages have no validators to revalidate with, so they are served from cache until the TTL expires
+        cache_profile = f"browser:{blocking_profile}:{target_items or ''}:{item_selector or ''}"
+        if use_cache:
+            cached = get_fetch_cache().get(url, cache_profile)
+            if cached is not None and cached.is_fresh:
+                return cached.html
+
+        # Borrow a warm driver from the pool instead of launching Chrome for every page
+        with get_pool().driver() as pooled_driver:
+            load_page(pooled_driver, url, blocking_profile)
+            html = read_page_source(pooled_driver, attended_mode, target_items, item_selector)
+            report_blocking(pooled_driver, url, blocking_profile)
+
+        if use_cache:
+            get_fetch_cache().put(url, cache_profile, html)
+        return html
+
     if driver is None:
         driver = setup_selenium(attended_mode)
         should_quit = True
-        if not attended_mode:
-            driver.get(url)
     else:
         should_quit = False
         # Do not navigate to the URL if in attended mode and driver is already initialized
         if not attended_mode:
-            driver.get(url)
+            load_page(driver, url, blocking_profile)
 
     try:
+        html = read_page_source(driver, attended_mode, target_items, item_selector)
         if not attended_mode:
-            # Add more realistic actions like scrolling
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-            time.sleep(random.uniform(1.1, 1.8))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/1.2);")
-            time.sleep(random.uniform(1.1, 1.8))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/1);")
-            time.sleep(random.uniform(1.1, 1.8))
-        # Get the page source from the current page
-        html = driver.page_source
+            report_blocking(driver, url, blocking_profile)
         return html
     finally:
         if should_quit:
             driver.quit()
 
 
+def load_page(driver, url, blocking_profile=DEFAULT_BLOCKING_PROFILE):
+    """Navigate to url with the given network blocking profile applied."""
+    apply_blocking_profile(driver, blocking_profile)
+    driver.get(url)
 
 
-def clean_html(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Remove headers and footers based on common HTML tags or classes
-    for element in soup.find_all(['header', 'footer']):
-        element.decompose()  # Remove these tags and their content
+def report_blocking(driver, url, blocking_profile):
+    """Count what the blocking profile stopped while loading and scrolling the page."""
+    page_stats = record_page_blocking(driver, blocking_profile)
+    if page_stats.get("blocked_requests"):
+        print(f"Blocked {page_stats['blocked_requests']} requests on {url} ({blocking_profile} profile)")
 
-    return str(soup)
 
+def read_page_source(driver, attended_mode=False, target_items=None, item_selector=None):
+    if not attended_mode:
+        # Scroll until lazy-loaded content stops arriving rather than sleeping a fixed time
+        report = adaptive_scroll(driver, target_items=target_items, item_selector=item_selector)
+        print(f"Scrolled {report.url} {report.scrolls} times in {report.elapsed_ms:.0f} ms ({report.stop_reason})")
+    # Get the page source from the current page
+    html = driver.page_source
+    return html
 
-# Comment out the problematic import
-# import html2text
 
-# Add a simple replacement function
-def html_to_plain_text(html):
-    """Simple function to extract text from HTML without html2text."""
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(html, 'html.parser')
-    return soup.get_text()
+def fetch_html(url, fetch_mode="auto", attended_mode=False, driver=None, blocking_profile=DEFAULT_BLOCKING_PROFILE):
+    """
+    Fetch a page, using plain HTTP when the site renders server-side and the browser otherwise.
 
-# Then replace any usage of html2text with this function
+    fetch_mode is "auto" (probe HTTP first and remember per domain what worked),
+    "http" (never start a browser) or "browser" (always use Selenium).
+    blocking_profile names an entry of BLOCKING_PROFILES applied when the browser is used.
+    """
+    if fetch_mode == "browser" or attended_mode or driver is not None:
+        return fetch_html_selenium(url, attended_mode, driver, blocking_profile=blocking_profile)
+    if fetch_mode == "http":
+        return fetch_html_http(url).text
 
+    memory = get_fetch_mode_memory()
+    domain = get_domain(url)
+    if memory.get(domain) == "browser":
+        return fetch_html_selenium(url, blocking_profile=blocking_profile)
 
-def html_to_markdown_with_readability(html_content):
+    try:
+        html = fetch_html_http(url).text
+        needs_browser, reason = needs_javascript(html)
+    except requests.RequestException as e:
+        status = getattr(e.response, "status_code", None)
+        if status is not None and status not in BROWSER_RETRY_STATUSES:
+            raise
+        needs_browser, reason = True, f"http fetch failed: {e}"
+
+    if needs_browser:
+        print(f"Falling back to the browser for {domain}: {reason}")
+        html = fetch_html_selenium(url, blocking_profile=blocking_profile)
+        # Only pin the domain to the browser if the browser actually got more than plain HTTP did
+        if not needs_javascript(html)[0]:
+            memory.record(domain, "browser", reason)
+        return html
+
+    memory.record(domain, "http", reason)
+    return html
+
+
+
+
+def clean_html(html_content):
+    # Remove scripts, styles, headers, footers and hidden elements
+    return serialize_tree(clean_tree(parse_html(html_content)))
 
-    
-    cleaned_html = clean_html(html_content)  
-    
-    # Convert to markdown
-    markdown_converter = html2text.HTML2Text()
-    markdown_converter.ignore_links = False
-    markdown_content = markdown_converter.handle(cleaned_html)
-    
-    return markdown_content
+
+def html_to_plain_text(html):
+    """Extract the visible text of a page."""
+    return tree_to_text(clean_tree(parse_html(html)))
+
+
+def html_to_markdown_with_readability(html_content, base_url=None, main_content=True):
+    """Convert a page to markdown, keeping only its main content and pagination by default."""
+    markdown, report = convert_html_to_markdown(html_content, base_url, main_content)
+    print(f"Converted {base_url or 'page'}: {report}")
+    return markdown
 
 
     
@@ -147,31 +225,23 @@ def save_raw_data(raw_data: str, output_folder: str, file_name: str):
 
 def create_dynamic_listing_model(field_names: List[str]) -> Type[BaseModel]:
     """
-    Dynamically creates a Pydantic model based on provided fields.
-    field_name is a list of names of the fields to extract from the markdown.
+    Pydantic model for the fields to extract from the markdown, cached by field signature.
+    Fields may declare a type ("price:money"); see schema_registry.py.
     """
-    # Create field definitions using aliases for Field parameters
-    field_definitions = {field: (str, ...) for field in field_names}
-    # Dynamically create the model with all field
-    return create_model('DynamicListingModel', **field_definitions)
+    return get_schema_registry().listing_model(field_names)
 
 
 def create_listings_container_model(listing_model: Type[BaseModel]) -> Type[BaseModel]:
     """
     Create a container model that holds a list of the given listing model.
     """
-    return create_model('DynamicListingsContainer', listings=(List[listing_model], ...))
+    return get_schema_registry().container_model(listing_model)
 
 
 
 
 def trim_to_token_limit(text, model, max_tokens=120000):
-    encoder = tiktoken.encoding_for_model(model)
-    tokens = encoder.encode(text)
-    if len(tokens) > max_tokens:
-        trimmed_text = encoder.decode(tokens[:max_tokens])
-        return trimmed_text
-    return text
+    return truncate_to_tokens(text, max_tokens, model)
 
 def generate_system_message(listing_model: BaseModel) -> str:
     """
@@ -211,45 +281,209 @@ def generate_system_message(listing_model: BaseModel) -> str:
 
 
 
-def format_data(markdown_content, container_model, listing_model, selected_model):
+def parse_json_content(content):
+    """Parse a model's JSON reply, tolerating a surrounding markdown code fence."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else ""
+        content = content.rsplit("```", 1)[0]
+    return json.loads(content)
+
+
+def prepare_extraction(markdown_content, listing_model, selected_model, use_cache, cache_key=None):
+    """
+    Shared first half of format_data and format_data_async.
+
+    Returns (fields, messages, routing decision, cached result or None).
+    """
+    fields = list(listing_model.model_fields)
+    
+    # Generate system message for the model
+    system_message = generate_system_message(listing_model)
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": USER_MESSAGE + markdown_content},
+    ]
+    
+    # The selected model, unless it can't take this input; AUTO_MODEL lets the router choose
+    decision = get_router().choose(selected_model, count_tokens(system_message + USER_MESSAGE + markdown_content,
+                                                                "gpt-4o-mini"))
+    
+    # Unchanged markdown with the same fields was already extracted: no model call, nothing to pay
+    cached = None
+    if use_cache:
+        hit = get_extraction_cache().get(cache_key or markdown_content, fields, decision.primary)
+        if hit is not None:
+            cached = hit.data, {"input_tokens": 0, "output_tokens": 0}
+    return fields, messages, decision, cached
+
+
+def finish_extraction(markdown_content, fields, decision, response, use_cache):
+    """
+    Shared second half of format_data and format_data_async: parse and cache the reply.
+
+    The reply is cached under the decision's primary model, the one prepare_extraction looks
+    up, even when a hedge answered: otherwise it would be stored under a key never read.
+    """
+    # Structured output arrives parsed into the container model
+    formatted_data = response.parsed.model_dump() if response.parsed is not None else response.content
+    
+    # Parse the formatted data if it's a string
+    if isinstance(formatted_data, str):
+        formatted_data = parse_json_content(formatted_data)
+    
+    if use_cache:
+        get_extraction_cache().put(markdown_content, fields, decision.primary, formatted_data, response.token_counts)
+    # The router may have picked or hedged to another model than the selected one: price with the one that answered
+    return formatted_data, {**response.token_counts, "models": {response.model: dict(response.token_counts)}}
+
+
+def uses_structured_output(model, container_model) -> bool:
+    """OpenAI models answer in the container model's schema; the others are asked for a JSON object."""
+    return container_model is not None and get_router().provider(model) == "openai"
+
+
+def format_data(markdown_content, container_model, listing_model, selected_model, use_cache=EXTRACTION_CACHE_ENABLED,
+                cache_key=None):
+    """
+    Extract the listings of `markdown_content` with the selected (or routed) model.
+
+    `container_model` is the schema of the answer, enforced as structured output where the
+    model supports it. `cache_key` is the text the extraction is cached under, when it isn't
+    the markdown sent.
+    """
     try:
-        # Use OpenAI API
-        client = OpenAI(api_key=get_api_key('OPENAI_API_KEY'))
+        fields, messages, decision, cached = prepare_extraction(markdown_content, listing_model, selected_model,
+                                                                use_cache, cache_key)
+        if cached is not None:
+            return cached
         
-        # Generate system message for the model
-        system_message = generate_system_message(listing_model)
-        
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": USER_MESSAGE + markdown_content},
-            ],
-            response_format={"type": "json_object"}
-        )
-        
-        formatted_data = completion.choices[0].message.content
+        def request(model):
+            if uses_structured_output(model, container_model):
+                return get_gateway().parse(model, messages, container_model)
+            return get_gateway().chat(model, messages, json_mode=True)
+
+        response = get_router().complete(decision, request)
+        return finish_extraction(cache_key or markdown_content, fields, decision, response, use_cache)
         
-        # Get token counts from the completion object
-        token_counts = {
-            "input_tokens": completion.usage.prompt_tokens,
-            "output_tokens": completion.usage.completion_tokens
-        }
+    except Exception as e:
+        st.error(f"Error in format_data: {str(e)}")
+        return {}, {"input_tokens": 0, "output_tokens": 0}
+
+
+async def format_data_async(markdown_content, container_model, listing_model, selected_model,
+                            use_cache=EXTRACTION_CACHE_ENABLED, cache_key=None):
+    """
+    Async counterpart of format_data, on the providers' async clients. Token counting and the
+    extraction cache's SQLite reads and writes run in a worker thread, off the event loop.
+    """
+    try:
+        fields, messages, decision, cached = await asyncio.to_thread(
+            prepare_extraction, markdown_content, listing_model, selected_model, use_cache, cache_key)
+        if cached is not None:
+            return cached
         
-        # Parse the formatted data if it's a string
-        if isinstance(formatted_data, str):
-            formatted_data = json.loads(formatted_data)
-            
-        return formatted_data, token_counts
+        async def request(model):
+            if uses_structured_output(model, container_model):
+                return await get_gateway().aparse(model, messages, container_model)
+            return await get_gateway().achat(model, messages, json_mode=True)
+
+        response = await get_router().complete_async(decision, request)
+        return await asyncio.to_thread(finish_extraction, cache_key or markdown_content, fields, decision, response,
+                                       use_cache)
         
     except Exception as e:
-        st.error(f"Error in format_data: {str(e)}")
+        st.error(f"Error in format_data_async: {str(e)}")
         return {}, {"input_tokens": 0, "output_tokens": 0}
 
 
 
-def save_formatted_data(formatted_data, output_folder: str, json_file_name: str, excel_file_name: str):
-    """Save formatted data as JSON and Excel in the specified output folder."""
+def extraction_chunk_tokens(listing_model, selected_model):
+    """Chunk budget that leaves room for the extraction prompt in the selected model's context."""
+    prompt_tokens = count_tokens(generate_system_message(listing_model) + USER_MESSAGE, "gpt-4o-mini")
+    return chunk_budget(selected_model, prompt_tokens)
+
+
+def page_chunks(markdown_content, max_tokens, url=None):
+    """
+    (chunks, prompts) of a page: the chunks are cut from the unfiltered markdown and key the
+    extraction cache, the prompts are the same chunks with the site's boilerplate removed.
+    Filtering changes as the site's profile grows; the cache key must not.
+    """
+    chunks = chunk_markdown(markdown_content, max_tokens, "gpt-4o-mini")
+    if len(chunks) <= 1:
+        chunks = [markdown_content]
+    prompts = strip_site_boilerplate_chunks(url, chunks) if url and BOILERPLATE_ENABLED else chunks
+    return chunks, prompts
+
+
+def format_data_chunked(markdown_content, container_model, listing_model, selected_model,
+                        max_tokens=None, max_workers=EXTRACTION_CHUNK_WORKERS, url=None):
+    """
+    Extract listings from markdown of any length.
+
+    The markdown is split on structural boundaries into chunks under max_tokens,
+    the chunks are sent to format_data concurrently, and the listings are merged
+    and de-duplicated, so nothing at the bottom of long pages is dropped.
+    Without max_tokens, chunks are sized to fit the selected model's context.
+    Given the page url, blocks repeated across the site's pages are removed from each chunk.
+    """
+    max_tokens = max_tokens or extraction_chunk_tokens(listing_model, selected_model)
+    chunks, prompts = page_chunks(markdown_content, max_tokens, url)
+    if len(chunks) == 1:
+        return format_data(prompts[0], container_model, listing_model, selected_model, cache_key=chunks[0])
+
+    print(f"Extracting {len(chunks)} chunks of up to {max_tokens} tokens in parallel")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        # Each chunk runs in a copy of the caller's context, so its calls are metered to the same page
+        futures = [executor.submit(contextvars.copy_context().run, format_data, prompt, container_model, listing_model,
+                                   selected_model, cache_key=chunk)
+                   for chunk, prompt in zip(chunks, prompts, strict=True)]
+        results = [future.result() for future in futures]
+
+    return merge_chunk_results(results)
+
+
+async def format_data_chunked_async(markdown_content, container_model, listing_model, selected_model,
+                                    max_tokens=None, url=None):
+    """
+    Async counterpart of format_data_chunked: the chunks are awaited together on the event loop,
+    after being cut (token counting, boilerplate filtering) in a worker thread.
+    """
+    max_tokens = max_tokens or await asyncio.to_thread(extraction_chunk_tokens, listing_model, selected_model)
+    chunks, prompts = await asyncio.to_thread(page_chunks, markdown_content, max_tokens, url)
+    if len(chunks) == 1:
+        return await format_data_async(prompts[0], container_model, listing_model, selected_model,
+                                       cache_key=chunks[0])
+
+    print(f"Extracting {len(chunks)} chunks of up to {max_tokens} tokens concurrently")
+    results = await asyncio.gather(
+        *(format_data_async(prompt, container_model, listing_model, selected_model, cache_key=chunk)
+          for chunk, prompt in zip(chunks, prompts, strict=True)))
+    return merge_chunk_results(results)
+
+
+def merge_chunk_results(results):
+    token_counts = {"input_tokens": 0, "output_tokens": 0, "models": {}}
+    for _, chunk_counts in results:
+        token_counts["input_tokens"] += chunk_counts["input_tokens"]
+        token_counts["output_tokens"] += chunk_counts["output_tokens"]
+        for model, counts in chunk_counts.get("models", {}).items():
+            served = token_counts["models"].setdefault(model, {"input_tokens": 0, "output_tokens": 0})
+            served["input_tokens"] += counts["input_tokens"]
+            served["output_tokens"] += counts["output_tokens"]
+    return {"listings": merge_listings([data for data, _ in results])}, token_counts
+
+
+
+def save_formatted_data(formatted_data, output_folder: str, json_file_name: str, excel_file_name: str,
+                        fields: List[str] = None):
+    """
+    Save formatted data as JSON and Excel in the specified output folder.
+
+    The Excel sheet and returned DataFrame are typed (numbers for prices, ratings and counts)
+    from the fields' declared types, or from the column names when fields aren't given.
+    """
     os.makedirs(output_folder, exist_ok=True)
     
     # Parse the formatted data if it's a JSON string (from Gemini API)
@@ -279,7 +513,7 @@ def save_formatted_data(formatted_data, output_folder: str, json_file_name: str,
 
     # Create DataFrame
     try:
-        df = pd.DataFrame(data_for_df)
+        df = typed_dataframe(data_for_df, fields)
         print("DataFrame created successfully.")
 
         # Save the DataFrame to an Excel file
@@ -292,20 +526,20 @@ def save_formatted_data(formatted_data, output_folder: str, json_file_name: str,
         print(f"Error creating DataFrame or saving Excel: {str(e)}")
         return None
 
-def calculate_price(token_counts, model):
-    # Fixed pricing for gpt-4o-mini
-    PRICE_PER_1K_TOKENS = {
-        "input": 0.01,   # $0.01 per 1K input tokens
-        "output": 0.03   # $0.03 per 1K output tokens
-    }
-    
+def calculate_price(token_counts, model, batch=False):
+    """
+    Tokens and cost of an extraction. Counts that say which models served them ("models",
+    from format_data) are priced per serving model, others at `model`'s rates.
+    """
     input_tokens = token_counts["input_tokens"]
     output_tokens = token_counts["output_tokens"]
+    served = token_counts.get("models")
+    if served is None:
+        served = {model: token_counts} if input_tokens or output_tokens else {}
     
-    input_cost = (input_tokens / 1000) * PRICE_PER_1K_TOKENS["input"]
-    output_cost = (output_tokens / 1000) * PRICE_PER_1K_TOKENS["output"]
-    
-    total_cost = input_cost + output_cost
+    # Same PRICING table as the metering ledger; batch requests are billed at the Batch API rates
+    total_cost = sum(price_tokens(served_model, counts["input_tokens"], counts["output_tokens"], batch)
+                     for served_model, counts in served.items())
     
     return input_tokens, output_tokens, total_cost
 
@@ -316,8 +550,9 @@ def generate_unique_folder_name(url):
     return f"{url_name}_{timestamp}"
 
 
-def scrape_url(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int, markdown: str):
-    """Scrape a single URL and save the results."""
+def scrape_url(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int, markdown: str,
+               html: str = None):
+    """Scrape a single URL and save the results. Pass the page's html to use learned extraction templates."""
     try:
         # Save raw data
         save_raw_data(markdown, output_folder, f'rawData_{file_number}.md')
@@ -329,10 +564,18 @@ def scrape_url(url: str, fields: List[str], selected_model: str, output_folder:
         DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
         
         # Format data
-        formatted_data, token_counts = format_data(markdown, DynamicListingsContainer, DynamicListingModel, selected_model)
+        def llm_extract():
+            return format_data_chunked(markdown, DynamicListingsContainer, DynamicListingModel, selected_model, url=url)
+
+        with metering_context(url=url, purpose="extraction"):
+            if html is not None and TEMPLATES_ENABLED:
+                formatted_data, token_counts = extract_with_templates(url, html, field_names(fields), llm_extract)
+            else:
+                formatted_data, token_counts = llm_extract()
         
         # Save formatted data
-        save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json', f'sorted_data_{file_number}.xlsx')
+        save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json', f'sorted_data_{file_number}.xlsx',
+                            fields)
 
         # Calculate and return token usage and cost
         input_tokens, output_tokens, total_cost = calculate_price(token_counts, selected_model)
@@ -342,5 +585,63 @@ def scrape_url(url: str, fields: List[str], selected_model: str, output_folder:
         print(f"An error occurred while processing {url}: {e}")
         return 0, 0, 0, None
 
+
+async def scrape_url_async(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int,
+                           markdown: str, html: str = None, semaphore: asyncio.Semaphore = None):
+    """
+    Async counterpart of scrape_url. With a semaphore, the page's LLM extraction waits for a free slot.
+    File writes and other blocking work run in worker threads, so the loop keeps serving the other pages.
+    """
+    try:
+        await asyncio.to_thread(save_raw_data, markdown, output_folder, f'rawData_{file_number}.md')
+        DynamicListingModel = create_dynamic_listing_model(fields)
+        DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
+
+        async def llm_extract():
+            if semaphore is None:
+                return await format_data_chunked_async(markdown, DynamicListingsContainer, DynamicListingModel,
+                                                       selected_model, url=url)
+            async with semaphore:
+                return await format_data_chunked_async(markdown, DynamicListingsContainer, DynamicListingModel,
+                                                       selected_model, url=url)
+
+        with metering_context(url=url, purpose="extraction"):
+            if html is not None and TEMPLATES_ENABLED:
+                formatted_data, token_counts = await extract_with_templates_async(url, html, field_names(fields),
+                                                                                  llm_extract)
+            else:
+                formatted_data, token_counts = await llm_extract()
+
+        await asyncio.to_thread(save_formatted_data, formatted_data, output_folder, f'sorted_data_{file_number}.json',
+                                f'sorted_data_{file_number}.xlsx', fields)
+        input_tokens, output_tokens, total_cost = calculate_price(token_counts, selected_model)
+        return input_tokens, output_tokens, total_cost, formatted_data
+
+    except Exception as e:
+        print(f"An error occurred while processing {url}: {e}")
+        return 0, 0, 0, None
+
+
+async def scrape_pages_async(pages: List[Tuple[str, str]], fields: List[str], selected_model: str, output_folder: str,
+                             first_file_number: int = 1, max_concurrency: int = ASYNC_SCRAPE_CONCURRENCY):
+    """
+    Extract many already fetched (url, markdown) pages concurrently on one event loop,
+    at most max_concurrency pages talking to the LLM at once.
+
+    Returns one (input_tokens, output_tokens, total_cost, formatted_data) tuple per page, in order.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(
+        scrape_url_async(url, fields, selected_model, output_folder, first_file_number + offset, markdown,
+                         semaphore=semaphore)
+        for offset, (url, markdown) in enumerate(pages)))
+
+
+def scrape_pages(pages: List[Tuple[str, str]], fields: List[str], selected_model: str, output_folder: str,
+                 first_file_number: int = 1, max_concurrency: int = ASYNC_SCRAPE_CONCURRENCY):
+    """Blocking wrapper around scrape_pages_async for callers without an event loop (e.g. Streamlit)."""
+    return asyncio.run(scrape_pages_async(pages, fields, selected_model, output_folder, first_file_number,
+                                          max_concurrency))
+
 # Remove the main execution block if it's not needed for testing purposes
         
\ No newline at end of file
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app's modules live at the repository root, next to this scraper/ folder
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from openai import OpenAI
+
+import batch_extraction
+from batch_extraction import scrape_urls_batch
+from batch_server import LocalBatchServer
+from extraction_cache import ExtractionCache
+from metering import price_tokens
+
+PAGES = [("https://shop.example/list?page=1", "# Shop\n\n## Kettle\n\nR 499.00"),
+         ("https://shop.example/list?page=2", "# Shop\n\n## Toaster\n\nR 899.00")]
+
+
+def answer(body):
+    page = body["messages"][-1]["content"]
+    name = "Kettle" if "Kettle" in page else "Toaster"
+    return json.dumps({"listings": [{"name": name, "price": page.rsplit("\n", 1)[-1]}]})
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    cache = ExtractionCache(path=str(tmp_path / "extractions.db"))
+    monkeypatch.setattr(batch_extraction, "get_extraction_cache", lambda: cache)
+    monkeypatch.setattr(batch_extraction, "strip_site_boilerplate_chunks", lambda url, chunks: chunks)
+    local_server = LocalBatchServer(responder=answer).start()
+    yield local_server
+    local_server.stop()
+
+
+def run_batch(server, output_folder):
+    client = OpenAI(api_key="local", base_url=server.url)
+    return scrape_urls_batch(PAGES, ["name", "price"], "gpt-4o-mini", str(output_folder), client=client,
+                             poll_interval=0.05, max_wait=10)
+
+
+def test_batch_scrape_saves_every_page_at_batch_prices(server, tmp_path):
+    outcomes = run_batch(server, tmp_path / "out")
+
+    assert [data["listings"][0]["name"] for *_, data in outcomes] == ["Kettle", "Toaster"]
+    for input_tokens, output_tokens, total_cost, _ in outcomes:
+        assert input_tokens > 0 and output_tokens > 0
+        assert total_cost == pytest.approx(price_tokens("gpt-4o-mini", input_tokens, output_tokens, batch=True))
+        assert total_cost < price_tokens("gpt-4o-mini", input_tokens, output_tokens)
+    for number in (1, 2):
+        assert (tmp_path / "out" / f"rawData_{number}.md").exists()
+        assert (tmp_path / "out" / f"sorted_data_{number}.xlsx").exists()
+        saved = json.loads((tmp_path / "out" / f"sorted_data_{number}.json").read_text(encoding="utf-8"))
+        assert saved == outcomes[number - 1][3]
+    assert len(server.batches) == 1
+
+
+def test_cached_pages_are_left_out_of_the_batch(server, tmp_path):
+    first = run_batch(server, tmp_path / "first")
+    second = run_batch(server, tmp_path / "second")
+
+    assert len(server.batches) == 1
+    assert [data for *_, data in second] == [data for *_, data in first]
+    assert all(total_cost == 0 for _, _, total_cost, _ in second)
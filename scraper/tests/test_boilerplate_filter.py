@@ -0,0 +1,70 @@
+from boilerplate_filter import BoilerplateFilter, is_listing_markdown, is_pagination_markdown
+
+MENU = "Home Shop About us Contact Track your order Gift cards Customer service and returns"
+PROMOTED = "## Featured: Pikachu plush toy\nOnly R 199.00 today, rated 4.8 out of 5 stars by our customers"
+PAGER = "[1](/shop/page/1/) [2](/shop/page/2/) [3](/shop/page/3/) [Next](/shop/page/2/)"
+
+
+def page(n):
+    return "\n\n".join([MENU, PROMOTED, f"## Product {n}\nA one-off description of product number {n} here", PAGER])
+
+
+def learned_filter(tmp_path, pages=4):
+    boilerplate = BoilerplateFilter(str(tmp_path / "boilerplate.json"))
+    for n in range(pages):
+        boilerplate.strip(f"https://shop.example/page/{n}/", page(n))
+    return boilerplate
+
+
+def test_listing_and_pager_detection():
+    assert is_listing_markdown(PROMOTED)
+    assert is_listing_markdown("Samsung TV 1.299,00 €")
+    assert not is_listing_markdown(MENU)
+    assert is_pagination_markdown(PAGER)
+    assert not is_pagination_markdown(MENU)
+
+
+def test_nothing_is_removed_before_enough_pages(tmp_path):
+    boilerplate = BoilerplateFilter(str(tmp_path / "boilerplate.json"))
+    stripped, report = boilerplate.strip("https://shop.example/", page(0))
+    assert stripped == page(0)
+    assert report.removed_blocks == 0
+
+
+def test_repeated_menu_is_removed_but_listings_and_pager_are_kept(tmp_path):
+    stripped, report = learned_filter(tmp_path).strip("https://shop.example/page/9/", page(9))
+    assert MENU not in stripped
+    assert PROMOTED in stripped
+    assert PAGER in stripped
+    assert "Product 9" in stripped
+    assert report.removed_blocks == 1
+
+
+def test_chunks_of_a_page_are_filtered_separately_and_learned_once(tmp_path):
+    boilerplate = learned_filter(tmp_path)
+    chunks = [MENU + "\n\n## Product 9\nA one-off description of product number 9 here", PROMOTED + "\n\n" + MENU]
+    stripped, report = boilerplate.strip_chunks("https://shop.example/page/9/", chunks)
+    assert [MENU in chunk for chunk in stripped] == [False, False]
+    assert "Product 9" in stripped[0] and PROMOTED in stripped[1]
+    assert report.removed_blocks == 2
+    assert boilerplate._domains["shop.example"]["pages"] == 5
+
+
+def test_profile_persists_and_counts_each_url_once(tmp_path):
+    learned_filter(tmp_path).flush()
+    reloaded = BoilerplateFilter(str(tmp_path / "boilerplate.json"))
+    reloaded.strip("https://shop.example/page/0/", page(0))
+    assert reloaded._domains["shop.example"]["pages"] == 4
+
+
+def test_profiles_are_saved_in_batches(tmp_path):
+    path = tmp_path / "boilerplate.json"
+    boilerplate = BoilerplateFilter(str(path), save_every=3)
+    for n in range(2):
+        boilerplate.strip(f"https://shop.example/page/{n}/", page(n))
+    assert not path.exists()
+    boilerplate.strip("https://shop.example/page/2/", page(2))
+    boilerplate.strip("https://shop.example/page/3/", page(3))
+    assert BoilerplateFilter(str(path))._domains["shop.example"]["pages"] == 3
+    boilerplate.flush()
+    assert BoilerplateFilter(str(path))._domains["shop.example"]["pages"] == 4
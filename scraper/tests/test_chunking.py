@@ -0,0 +1,45 @@
+from assets import EXTRACTION_CHUNK_TOKENS, MODEL_CONTEXT_TOKENS, MODEL_RATE_LIMIT_TPM
+from chunking import chunk_budget, chunk_markdown, listing_key, merge_listings, split_blocks
+from token_accounting import count_tokens
+
+
+def test_split_blocks_starts_a_block_at_every_heading():
+    assert split_blocks("# A\ntext\n## B\nmore\n\n\nlast") == ["# A\ntext", "## B\nmore", "last"]
+
+
+def test_chunk_markdown_keeps_every_block_under_the_budget():
+    markdown = "\n\n".join(f"## Item {i}\nPrice: ${i}.99 and a short description" for i in range(200))
+    chunks = chunk_markdown(markdown, 300, "gpt-4o-mini")
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk, "gpt-4o-mini") <= 300 for chunk in chunks)
+    assert "\n\n".join(chunks) == markdown
+
+
+def test_chunk_markdown_splits_an_oversized_block():
+    chunks = chunk_markdown(" ".join(["word"] * 2000), 100, "gpt-4o-mini")
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk, "gpt-4o-mini") <= 100 for chunk in chunks)
+
+
+def test_chunk_budget_fits_small_contexts():
+    assert chunk_budget("gpt-4o-mini") == EXTRACTION_CHUNK_TOKENS
+    assert chunk_budget("auto") == EXTRACTION_CHUNK_TOKENS
+    assert chunk_budget("Llama3.1 8B", 500) < MODEL_CONTEXT_TOKENS["Llama3.1 8B"] - 500
+    # A request over the per-minute limit is rejected however large the context
+    assert MODEL_CONTEXT_TOKENS["Groq Llama3.1 70b"] > EXTRACTION_CHUNK_TOKENS
+    assert chunk_budget("Groq Llama3.1 70b", 500) < MODEL_RATE_LIMIT_TPM["Groq Llama3.1 70b"] - 500
+
+
+def test_merge_listings_keeps_order_and_drops_duplicates():
+    results = [
+        {"listings": [{"name": "A", "price": "1"}, {"name": "B", "price": "2"}]},
+        {"listings": [{"name": " a ", "price": "1"}, {"name": "C", "price": "3"}]},
+        {},
+        "not a result",
+    ]
+    assert merge_listings(results) == [{"name": "A", "price": "1"}, {"name": "B", "price": "2"},
+                                       {"name": "C", "price": "3"}]
+
+
+def test_listing_key_ignores_case_and_whitespace():
+    assert listing_key({"name": "Big  TV", "price": "$5"}) == listing_key({"price": "$5", "name": "big tv"})
@@ -0,0 +1,130 @@
+import pytest
+
+from crawl_frontier import BloomFilter, CrawlFrontier, pagination_links
+
+
+@pytest.fixture
+def make_frontier(tmp_path):
+    frontiers = []
+
+    def make(**kwargs):
+        frontier = CrawlFrontier("job", directory=str(tmp_path), domain_delay=0, **kwargs)
+        frontiers.append(frontier)
+        return frontier
+
+    yield make
+    for frontier in frontiers:
+        try:
+            frontier.close()
+        except Exception:
+            pass
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"https://x.com/list?page={n}" for n in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert bloom.count == 1000
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for n in range(1000):
+        bloom.add(f"seen-{n}")
+    false_positives = sum(f"other-{n}" in bloom for n in range(10000))
+    assert false_positives < 300
+
+
+def test_urls_are_queued_once(make_frontier):
+    frontier = make_frontier()
+    assert frontier.add("https://x.com/list?page=2&utm_source=mail")
+    assert not frontier.add("https://X.com/list?page=2#top")
+    assert frontier.seen("https://x.com/list?page=2")
+    assert frontier.stats()["queued"] == 1
+
+
+def test_page_and_depth_caps(make_frontier):
+    frontier = make_frontier(max_pages=2, max_depth=1)
+    assert frontier.add_many([(f"https://x.com/{n}", False) for n in range(5)]) == 2
+    assert frontier.capacity() == 0
+    assert make_frontier(max_depth=1).add("https://y.com/", depth=2) is False
+
+
+def test_domains_take_turns(make_frontier):
+    frontier = make_frontier()
+    frontier.add_many([("https://a.com/1", False), ("https://a.com/2", False), ("https://b.com/1", False)])
+    domains = []
+    while (entry := frontier.pop()) is not None:
+        domains.append(entry.url.split("/")[2])
+        frontier.mark_done(entry)
+    assert domains == ["a.com", "b.com", "a.com"]
+
+
+def test_resume_refetches_pages_in_flight(tmp_path):
+    frontier = CrawlFrontier("job", directory=str(tmp_path), domain_delay=0)
+    frontier.add_many([("https://x.com/1", True), ("https://x.com/2", False)])
+    done = frontier.pop()
+    frontier.mark_done(done)
+    in_flight = frontier.pop()
+    frontier.close()  # crash while the second page was being fetched
+
+    resumed = CrawlFrontier("job", directory=str(tmp_path), domain_delay=0)
+    try:
+        assert resumed.seen("https://x.com/1")
+        assert not resumed.add("https://x.com/1")
+        entry = resumed.pop()
+        assert (entry.number, entry.url) == (in_flight.number, in_flight.url)
+        assert resumed.pop() is None
+    finally:
+        resumed.close()
+
+
+def test_failed_pages_are_retried_up_to_max_attempts(make_frontier):
+    frontier = make_frontier(max_attempts=2)
+    frontier.add("https://x.com/1")
+    entry = frontier.pop()
+    frontier.mark_failed(entry, "timeout")
+    retry = frontier.pop()
+    assert (retry.number, retry.attempts) == (entry.number, 1)
+    frontier.mark_failed(retry, "timeout")
+    assert frontier.pop() is None
+    assert frontier.stats()["failed"] == 1
+
+
+def test_skip_after_drops_the_rest_of_the_range(make_frontier):
+    frontier = make_frontier()
+    frontier.add("https://x.com/list")
+    parent = frontier.pop()
+    frontier.add_many([(f"https://x.com/list?page={n}", n == 5) for n in range(2, 6)], depth=1,
+                      parent=parent.number)
+    frontier.add("https://x.com/other", depth=0)
+    frontier.mark_done(parent)
+
+    first = frontier.pop()
+    assert first.url == "https://x.com/other"
+    frontier.mark_done(first)
+    page_2 = frontier.pop()
+    page_3 = frontier.pop()
+    assert frontier.skip_after(page_3) == 2
+    assert frontier.pop() is None
+    assert frontier.stats()["skipped"] == 2
+    assert frontier.skip_after(first) == 0  # start pages belong to no range
+    assert frontier.children(parent.number)[:2] == [page_2.number, page_3.number]
+
+
+class Detected:
+    def __init__(self, urls):
+        self._urls = urls
+
+    def urls(self):
+        return iter(self._urls)
+
+
+def test_pagination_links_skip_known_pages_and_mark_the_last(make_frontier):
+    frontier = make_frontier(max_pages=4)
+    frontier.add("https://x.com/list?page=2")
+    links = pagination_links(frontier, Detected([f"https://x.com/list?page={n}" for n in range(2, 10)]))
+    assert links == [("https://x.com/list?page=3", False), ("https://x.com/list?page=4", False),
+                     ("https://x.com/list?page=5", True)]
@@ -0,0 +1,45 @@
+import driver_pool
+from driver_pool import DriverPool, describe_pool_usage, get_driver_pool_stats
+
+
+class FakeDriver:
+    window_handles = ["main"]
+
+    def __init__(self):
+        self.switch_to = self
+        self.quit_called = False
+
+    def window(self, handle):
+        pass
+
+    def execute_cdp_cmd(self, command, params):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_usage_is_none_without_a_pool(monkeypatch):
+    monkeypatch.setattr(driver_pool, "_pool", None)
+    assert get_driver_pool_stats() is None
+    assert describe_pool_usage(None) is None
+
+
+def test_usage_covers_only_pages_since_the_snapshot(monkeypatch):
+    pool = DriverPool(FakeDriver, size=2, max_pages=2, max_rss_mb=None)
+    monkeypatch.setattr(driver_pool, "_pool", pool)
+    with pool.driver():
+        pass
+    before = get_driver_pool_stats()
+    assert describe_pool_usage(before) is None  # nothing borrowed since the snapshot
+
+    for _ in range(3):
+        with pool.driver():
+            pass
+    usage = describe_pool_usage(before)
+    assert usage.startswith("driver pool: 3 pages on 2 drivers")
+    assert usage.endswith("1 started, 2 recycled")
+    assert describe_pool_usage(None).startswith("driver pool: 4 pages on 2 drivers")
@@ -0,0 +1,20 @@
+from fetch_cache import FetchCache
+
+BROWSER = "browser:default::"
+
+
+def test_browser_entries_keep_the_fragment(tmp_path):
+    cache = FetchCache(str(tmp_path))
+    cache.put("https://spa.example/#/page/1", BROWSER, "<html>page 1</html>")
+    cache.put("https://spa.example/#/page/2", BROWSER, "<html>page 2</html>")
+    assert cache.get("https://spa.example/#/page/1", BROWSER).html == "<html>page 1</html>"
+    assert cache.get("https://SPA.example/#/page/2", BROWSER).html == "<html>page 2</html>"
+    assert cache.get("https://spa.example/", BROWSER) is None
+
+
+def test_http_entries_ignore_the_fragment(tmp_path):
+    cache = FetchCache(str(tmp_path))
+    cache.put("https://shop.example/list#reviews", "http", "<html>list</html>")
+    assert cache.get("https://shop.example/list", "http").html == "<html>list</html>"
+    assert FetchCache.make_key("https://shop.example/list#a", "http") == FetchCache.make_key(
+        "https://shop.example/list", "http")
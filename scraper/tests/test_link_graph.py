@@ -0,0 +1,34 @@
+from link_graph import compact_links, rank_links
+
+PAGE = """# Shop
+
+[Product A](/shop/a/)
+
+[Product B](/shop/b/)
+
+Page 1 of 5
+[1](/shop/page/1/) [2](/shop/page/2/) [3](/shop/page/3/) [→](/shop/page/2/)
+
+[Facebook](https://facebook.com/shop)"""
+
+
+def test_rank_links_keeps_pagination_links_only():
+    urls = [candidate.url for candidate in rank_links("https://x.com/shop/", PAGE)]
+    assert urls == ["https://x.com/shop/page/1/", "https://x.com/shop/page/2/", "https://x.com/shop/page/3/",
+                    "https://x.com/shop/page/2/"]
+
+
+def test_rank_links_respects_the_limit_and_page_order():
+    ranked = rank_links("https://x.com/shop/", PAGE, limit=2)
+    assert len(ranked) == 2
+    assert ranked == sorted(ranked, key=lambda candidate: candidate.position)
+
+
+def test_compact_links_describes_the_signals():
+    lines = compact_links("https://x.com/shop/", PAGE).splitlines()
+    assert lines[-1].startswith("[→](/shop/page/2/) next pager")
+    assert all('"Page 1 of 5"' in line for line in lines)
+
+
+def test_compact_links_is_empty_without_candidates():
+    assert compact_links("https://x.com/about", "[Home](/) [Contact](/contact)") == ""
@@ -0,0 +1,102 @@
+import asyncio
+import gc
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_gateway
+from llm_gateway import LLMGateway, LLMStream
+
+
+def completion_chunks(fail=False):
+    yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content='{"listings": [{"n'))])
+    yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content='ame": "A"}'))])
+    if fail:
+        raise ConnectionError("connection reset")
+    yield SimpleNamespace(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=9), choices=[])
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_gateway, "record_call", lambda *args, **kwargs: calls.append((args, kwargs)))
+    return calls
+
+
+def open_stream(fail=False):
+    return LLMStream(completion_chunks(fail), LLMGateway(), "openai", "gpt-4o-mini", time.monotonic(), prompt_tokens=90)
+
+
+def test_finished_stream_is_metered_with_its_usage(recorded):
+    stream = open_stream()
+    assert "".join(stream) == '{"listings": [{"name": "A"}'
+    assert stream.token_counts == {"input_tokens": 100, "output_tokens": 9}
+    (provider, model, input_tokens, output_tokens, _), details = recorded[-1]
+    assert (provider, model, input_tokens, output_tokens, details["error"]) == ("openai", "gpt-4o-mini", 100, 9, None)
+
+
+def test_failed_stream_is_metered_with_the_tokens_seen(recorded):
+    stream = open_stream(fail=True)
+    with pytest.raises(ConnectionError):
+        list(stream)
+    (_, _, input_tokens, output_tokens, _), details = recorded[-1]
+    assert input_tokens == 90
+    assert output_tokens > 0
+    assert details["error"] == "ConnectionError: connection reset"
+
+
+def test_abandoned_stream_is_metered(recorded):
+    deltas = iter(open_stream())
+    next(deltas)
+    deltas.close()
+    assert len(recorded) == 1
+    assert recorded[-1][1]["error"] is None
+
+
+def test_unread_stream_is_metered_once_when_closed(recorded):
+    with open_stream() as stream:
+        pass
+    stream.close()
+    assert len(recorded) == 1
+    (_, _, input_tokens, output_tokens, _), details = recorded[-1]
+    assert (input_tokens, output_tokens, details["error"]) == (90, 0, None)
+
+
+def test_stream_that_fails_to_open_is_metered(recorded, monkeypatch):
+    def refuse(**kwargs):
+        raise ValueError("model not found")
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=refuse)))
+    gateway = LLMGateway(max_retries=0)
+    monkeypatch.setattr(gateway, "client", lambda provider: client)
+    with pytest.raises(ValueError):
+        gateway.stream_chat("gpt-4o-mini", [{"role": "user", "content": "hi"}])
+    (provider, model, *_), details = recorded[-1]
+    assert (provider, model, details["error"]) == ("openai", "gpt-4o-mini", "ValueError: model not found")
+
+
+def test_opened_stream_is_metered_once(recorded, monkeypatch):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: completion_chunks())))
+    gateway = LLMGateway()
+    monkeypatch.setattr(gateway, "client", lambda provider: client)
+    with gateway.stream_chat("gpt-4o-mini", [{"role": "user", "content": "hi"}]) as stream:
+        list(stream)
+    assert len(recorded) == 1
+    assert recorded[-1][0][2:4] == (100, 9)
+
+
+def test_async_client_survives_garbage_collection_and_closes_with_its_loop(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "get_api_key", lambda name: "sk-test")
+    gateway = LLMGateway()
+
+    async def run():
+        client = gateway.async_client("openai")
+        gc.collect()
+        await asyncio.sleep(0)
+        assert not client.is_closed()
+        assert gateway.async_client("openai") is client
+        return client
+
+    assert asyncio.run(run()).is_closed()
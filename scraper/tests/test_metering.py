@@ -0,0 +1,82 @@
+import csv
+import json
+from datetime import datetime
+
+import pytest
+
+from assets import PRICING
+from metering import MeteringLedger, aggregate, export_report, load_entries, metering_context
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return MeteringLedger("run1", directory=str(tmp_path), budget=None)
+
+
+def test_calls_are_priced_from_pricing(ledger):
+    entry = ledger.record("openai", "gpt-4o-mini", 1_000_000, 100_000, latency=1.23456)
+    prices = PRICING["gpt-4o-mini"]
+    assert entry["cost"] == pytest.approx(prices["input"] * 1_000_000 + prices["output"] * 100_000)
+    assert entry["latency"] == 1.235
+    batch = ledger.record("openai", "gpt-4o-mini", 1_000_000, 100_000, batch=True)
+    assert batch["cost"] == pytest.approx(entry["cost"] / 2)
+    hit = ledger.record(None, "gpt-4o-mini", cache_hit=True,
+                        saved_tokens={"input_tokens": 1_000_000, "output_tokens": 100_000})
+    assert (hit["cost"], hit["saved_cost"]) == (0.0, pytest.approx(entry["cost"]))
+    assert hit["provider"] == "openai"
+
+
+def test_calls_are_attributed_to_the_metering_context(ledger):
+    outside = ledger.record("openai", "gpt-4o-mini", 10, 1)
+    with metering_context(url="https://www.shop.example/list", purpose="extraction"):
+        with metering_context(purpose="pagination"):
+            inner = ledger.record("openai", "gpt-4o-mini", 10, 1)
+    assert (outside["domain"], outside["purpose"]) == (None, None)
+    assert inner["domain"] and "shop.example" in inner["domain"]
+    assert inner["purpose"] == "pagination"
+
+
+def test_ledger_is_appended_to_disk(ledger, tmp_path):
+    ledger.record("openai", "gpt-4o-mini", 10, 1, domain="a.example")
+    ledger.record("openai", "gpt-4o-mini", 20, 2, domain="b.example")
+    assert [entry["input_tokens"] for entry in load_entries(str(tmp_path))] == [10, 20]
+    assert ledger.totals()["calls"] == 2
+
+
+def entry_on(day, domain, input_tokens, cache_hit=False):
+    return {"run": "run1", "time": datetime.fromisoformat(day).timestamp() + 3600, "domain": domain,
+            "purpose": "extraction", "provider": "openai", "model": "gpt-4o-mini", "input_tokens": input_tokens,
+            "output_tokens": 0, "latency": None if cache_hit else 1.0, "cache_hit": cache_hit, "batch": False,
+            "error": None, "cost": 0.0 if cache_hit else input_tokens * 1e-6, "saved_cost": 0.0}
+
+
+ENTRIES = [entry_on("2026-10-01", "a.example", 100), entry_on("2026-10-01", "b.example", 200),
+           entry_on("2026-10-02", "a.example", 300), entry_on("2026-10-02", "a.example", 0, cache_hit=True)]
+
+
+def test_aggregate_groups_by_domain_and_day():
+    groups = aggregate(ENTRIES, ("domain", "day"))
+    assert [(group["domain"], group["day"], group["calls"], group["cache_hits"], group["input_tokens"])
+            for group in groups] == [("a.example", "2026-10-01", 1, 0, 100), ("a.example", "2026-10-02", 1, 1, 300),
+                                     ("b.example", "2026-10-01", 1, 0, 200)]
+    assert groups[1]["cost"] == pytest.approx(0.0003)
+    assert groups[1]["mean_latency"] == 1.0
+
+
+def test_export_report_as_csv(tmp_path):
+    path = export_report(str(tmp_path / "costs.csv"), ENTRIES)
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4
+    assert [row["domain"] for row in rows] == ["a.example", "b.example", "a.example", "a.example"]
+    assert rows[0]["model"] == "gpt-4o-mini"
+
+
+def test_export_report_as_json(tmp_path):
+    with open(export_report(str(tmp_path / "reports" / "costs.json"), ENTRIES), encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["totals"]["calls"] == 3
+    assert report["totals"]["cost"] == pytest.approx(0.0006)
+    assert [group["day"] for group in report["by_day"]] == ["2026-10-01", "2026-10-02"]
+    assert [group["domain"] for group in report["by_domain"]] == ["a.example", "b.example"]
+    assert report["by_model"][0]["model"] == "gpt-4o-mini"
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_gateway
+import scraper
+from extraction_cache import ExtractionCache
+from llm_gateway import LLMResponse
+from model_router import ModelRouter, RoutingDecision
+from scraper import calculate_price, create_dynamic_listing_model, format_data, merge_chunk_results
+
+
+@pytest.fixture(autouse=True)
+def api_keys(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "get_api_key", lambda name: "sk-test")
+
+
+def test_explicit_selection_is_kept():
+    decision = ModelRouter(log_path=None).choose("gpt-4o-mini", 1000)
+    assert (decision.primary, decision.reason) == ("gpt-4o-mini", "selected")
+
+
+def test_explicit_selection_never_moves_to_another_provider():
+    router = ModelRouter(log_path=None, hedge_enabled=True)
+    for model in ("Llama3.1 8B", "Groq Llama3.1 70b"):
+        decision = router.choose(model, 9000)  # more than the model's context or per-minute limit
+        assert decision.primary == model
+        assert decision.hedge is None
+
+
+def test_provider_switch_is_opt_in():
+    router = ModelRouter(log_path=None, allow_provider_switch=True)
+    assert router.choose("Llama3.1 8B", 9000).primary != "Llama3.1 8B"
+
+
+def test_auto_picks_a_candidate_that_fits():
+    router = ModelRouter(candidates=["Groq Llama3.1 70b", "gpt-4o-mini"], log_path=None)
+    assert router.choose("auto", 9000).primary == "gpt-4o-mini"
+
+
+def test_rate_limited_models_wait_for_their_minute_to_free_up():
+    router = ModelRouter(candidates=["Groq Llama3.1 70b", "gpt-4o-mini"], log_path=None)
+    assert router.usable("Groq Llama3.1 70b", 3000)
+    router._record("Groq Llama3.1 70b", 1.0, LLMResponse("{}", 2000, 500, "Groq Llama3.1 70b", "groq", 1.0))
+    assert router.tokens_last_minute("Groq Llama3.1 70b") == 2500
+    assert not router.usable("Groq Llama3.1 70b", 3000)
+    assert router.choose("auto", 3000).primary == "gpt-4o-mini"
+    assert router.usable("gpt-4o-mini", 3000)
+
+
+def test_extractions_are_priced_at_the_serving_model():
+    served = {"input_tokens": 10000, "output_tokens": 2000,
+              "models": {"gpt-4o-mini": {"input_tokens": 10000, "output_tokens": 2000}}}
+    assert calculate_price(served, "auto") == calculate_price(served, "gpt-4o-mini")
+    assert calculate_price(served, "auto")[2] > 0
+    assert calculate_price({"input_tokens": 0, "output_tokens": 0}, "auto") == (0, 0, 0)
+
+
+def test_chunk_results_keep_tokens_per_serving_model():
+    results = [
+        ({"listings": [{"name": "A"}]}, {"input_tokens": 10, "output_tokens": 1,
+                                         "models": {"gpt-4o-mini": {"input_tokens": 10, "output_tokens": 1}}}),
+        ({"listings": [{"name": "A"}, {"name": "B"}]},
+         {"input_tokens": 20, "output_tokens": 2,
+          "models": {"gemini-1.5-flash": {"input_tokens": 20, "output_tokens": 2}}}),
+        ({"listings": []}, {"input_tokens": 0, "output_tokens": 0}),
+    ]
+    data, token_counts = merge_chunk_results(results)
+    assert data == {"listings": [{"name": "A"}, {"name": "B"}]}
+    assert (token_counts["input_tokens"], token_counts["output_tokens"]) == (30, 3)
+    assert token_counts["models"] == {"gpt-4o-mini": {"input_tokens": 10, "output_tokens": 1},
+                                      "gemini-1.5-flash": {"input_tokens": 20, "output_tokens": 2}}
+
+
+def answer(model, delay=0.0, fail=False):
+    time.sleep(delay)
+    if fail:
+        raise ConnectionError(f"{model} is down")
+    return LLMResponse("{}", 10, 1, model, "openai", delay)
+
+
+@pytest.fixture
+def hedging_router(monkeypatch):
+    router = ModelRouter(log_path=None, hedge_enabled=True)
+    monkeypatch.setattr(router, "hedge_delay", lambda model: 0.05)
+    return router
+
+
+def hedged_decision(primary="gpt-4o", hedge="gpt-4o-mini"):
+    return RoutingDecision(primary, primary, hedge, 1000, {}, "selected")
+
+
+def test_call_without_a_hedge_runs_in_the_callers_thread():
+    router = ModelRouter(log_path=None)
+    threads = []
+
+    def request(model):
+        threads.append(threading.current_thread())
+        return answer(model)
+
+    assert router.complete(hedged_decision(hedge=None), request).model == "gpt-4o"
+    assert threads == [threading.current_thread()]
+
+
+def test_slow_primary_is_hedged_to_the_runner_up(hedging_router):
+    response = hedging_router.complete(hedged_decision(),
+                                       lambda model: answer(model, delay=1.0 if model == "gpt-4o" else 0.0))
+    assert response.model == "gpt-4o-mini"
+
+
+def test_failed_primary_fails_over_without_waiting(hedging_router):
+    hedging_router.hedge_delay = lambda model: 30
+    started = time.monotonic()
+    response = hedging_router.complete(hedged_decision(), lambda model: answer(model, fail=model == "gpt-4o"))
+    assert response.model == "gpt-4o-mini"
+    assert time.monotonic() - started < 5
+    assert hedging_router.stats()["gpt-4o"]["errors"] == 1
+
+
+def test_async_hedge_cancels_the_slow_primary(hedging_router):
+    cancelled = []
+
+    async def request(model):
+        try:
+            await asyncio.sleep(1.0 if model == "gpt-4o" else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return answer(model)
+
+    async def run():
+        response = await hedging_router.complete_async(hedged_decision(), request)
+        await asyncio.sleep(0)
+        return response
+
+    assert asyncio.run(run()).model == "gpt-4o-mini"
+    assert cancelled == ["gpt-4o"]
+
+
+def test_extraction_answered_by_a_hedge_is_found_in_the_cache(monkeypatch, tmp_path):
+    cache = ExtractionCache(path=str(tmp_path / "extractions.db"))
+    monkeypatch.setattr(scraper, "get_extraction_cache", lambda: cache)
+    router = ModelRouter(log_path=None)
+    monkeypatch.setattr(scraper, "get_router", lambda: router)
+    calls = []
+
+    def complete(decision, request):
+        calls.append(decision.primary)
+        return LLMResponse('{"listings": [{"name": "A"}]}', 100, 10, "gpt-4o-mini", "openai", 0.1)
+
+    monkeypatch.setattr(router, "complete", complete)
+    listing_model = create_dynamic_listing_model(["name"])
+    first = format_data("# A", None, listing_model, "gpt-4o")
+    second = format_data("# A", None, listing_model, "gpt-4o")
+    assert calls == ["gpt-4o"]
+    assert first[0] == second[0] == {"listings": [{"name": "A"}]}
+    assert second[1] == {"input_tokens": 0, "output_tokens": 0}
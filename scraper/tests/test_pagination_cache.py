@@ -0,0 +1,69 @@
+from pagination_cache import PaginationCache, apply_template, path_shape, template_param
+
+
+def llm_result(url_template, start=2, end=5, kind="page"):
+    return {"url_template": url_template, "kind": kind, "start": start, "step": 1, "end": end,
+            "next_url": None, "page_urls": [], "confidence": 0.9}
+
+
+def test_path_shape_blurs_sibling_categories():
+    assert path_shape("https://scrapeme.live/shop/product-category/pokemon/") == "/shop/product-category/*/"
+    assert (path_shape("https://scrapeme.live/shop/product-category/grass/page/3/")
+            == path_shape("https://scrapeme.live/shop/product-category/pokemon/"))
+
+
+def test_path_shape_ignores_query_names_and_page_params():
+    assert path_shape("https://www.amazon.com/s?k=tv&ref=nb_sb_noss") == path_shape("https://www.amazon.com/s?k=tv")
+    assert path_shape("https://example.com/list?page=3&utm_source=x") == path_shape("https://example.com/list")
+    assert path_shape("https://example.com/list?q=tv") != path_shape("https://example.com/list")
+
+
+def test_template_param():
+    assert template_param("https://example.com/s?k=tv&page={n}") == ("page", False, False)
+    assert template_param("https://example.com/shop/page/{n}/") == ("page", True, True)
+    assert template_param("https://example.com/shop/") is None
+
+
+def test_apply_template_replaces_the_page_number():
+    assert apply_template("https://example.com/s?k=tv&page=3", "page", False) == "https://example.com/s?k=tv&page={n}"
+    assert (apply_template("https://example.com/shop/grass/page/2/", "page", True, True)
+            == "https://example.com/shop/grass/page/{n}/")
+
+
+def test_lookup_same_url_returns_stored_result(tmp_path):
+    cache = PaginationCache(str(tmp_path / "pagination.json"))
+    result = llm_result("https://scrapeme.live/shop/page/{n}/")
+    cache.store("https://scrapeme.live/shop/", "", result, "gpt-4o-mini")
+    assert cache.lookup("https://scrapeme.live/shop/") == result
+
+
+def test_lookup_reuses_template_for_another_category(tmp_path):
+    cache = PaginationCache(str(tmp_path / "pagination.json"))
+    cache.store("https://scrapeme.live/shop/product-category/pokemon/", "",
+                llm_result("https://scrapeme.live/shop/product-category/pokemon/page/{n}/"), "gpt-4o-mini")
+
+    hit = cache.lookup("https://scrapeme.live/shop/product-category/grass/")
+    assert hit["url_template"] == "https://scrapeme.live/shop/product-category/grass/page/{n}/"
+    assert hit["start"] == 2
+    assert hit["end"] is None  # the other category's last page is unknown
+
+    later = cache.lookup("https://scrapeme.live/shop/product-category/grass/page/4/")
+    assert later["url_template"] == "https://scrapeme.live/shop/product-category/grass/page/{n}/"
+    assert later["start"] == 5
+
+
+def test_lookup_misses_other_indications_and_invalidated_entries(tmp_path):
+    cache = PaginationCache(str(tmp_path / "pagination.json"))
+    cache.store("https://example.com/s?k=tv", "", llm_result("https://example.com/s?k=tv&page={n}"), "gpt-4o-mini")
+    assert cache.lookup("https://example.com/s?k=radio", "only the first 3 pages") is None
+    assert cache.lookup("https://example.com/s?k=radio")["url_template"] == "https://example.com/s?k=radio&page={n}"
+
+    cache.invalidate("https://example.com/s?k=radio", "empty page")
+    assert cache.lookup("https://example.com/s?k=tv") is None
+
+
+def test_cache_persists_between_instances(tmp_path):
+    path = str(tmp_path / "pagination.json")
+    PaginationCache(path).store("https://example.com/s?k=tv", "", llm_result("https://example.com/s?k=tv&page={n}"),
+                                "gpt-4o-mini")
+    assert PaginationCache(path).lookup("https://example.com/s?k=tv") is not None
@@ -0,0 +1,22 @@
+import pagination_detector
+from pagination_detector import PaginationData, detect_pagination_elements
+
+
+def test_template_pages_are_listed_in_page_urls(monkeypatch):
+    monkeypatch.setattr(pagination_detector, "cached_pagination", lambda url, indications: None)
+    links = " ".join(f"[{n}](https://x.com/list?page={n})" for n in (1, 2, 3))
+    data, token_counts, price = detect_pagination_elements("https://x.com/list", "", "gpt-4o-mini", links)
+    assert data.source == "heuristic"
+    assert data.page_urls == ["https://x.com/list?page=2", "https://x.com/list?page=3"]
+    assert list(data.urls()) == data.page_urls
+    assert (token_counts["input_tokens"], price) == (0, 0.0)
+
+
+def test_page_urls_are_capped_but_urls_streams_the_whole_range(monkeypatch):
+    monkeypatch.setattr(pagination_detector, "PAGINATION_MAX_PAGES", 3)
+    data = PaginationData(url_template="https://x.com/list?page={n}", kind="page", start=2, step=1, end=10,
+                          page_urls=["https://x.com/archive"]).with_page_urls()
+    assert data.page_urls == ["https://x.com/list?page=2", "https://x.com/list?page=3", "https://x.com/list?page=4",
+                              "https://x.com/archive"]
+    assert len(list(data.urls())) == 10
+    assert list(data.urls(limit=2)) == data.page_urls[:2]
@@ -0,0 +1,95 @@
+from pagination_heuristics import (detect_pagination_heuristic, expand_template, is_cursor_url,
+                                   next_link_template, page_number, template_url)
+
+
+def numbered_links(url_pattern, numbers):
+    return " ".join(f"[{n}]({url_pattern.format(n)})" for n in numbers)
+
+
+def expanded(result):
+    return list(expand_template(result.url_template, result.start, result.step, result.end))
+
+
+def test_expand_template():
+    assert list(expand_template("/list?page={n}", 2, 1, 4)) == ["/list?page=2", "/list?page=3", "/list?page=4"]
+    assert list(expand_template("/list?start={n}", 20, 20, 60)) == ["/list?start=20", "/list?start=40",
+                                                                    "/list?start=60"]
+    assert len(list(expand_template("/list?page={n}", 2, limit=5))) == 5
+    assert list(expand_template("/list?page={n}", 5, 1, 4)) == []
+
+
+def test_template_url():
+    assert template_url("https://x.com/s?k=tv&page=3", "page") == "https://x.com/s?k=tv&page={n}"
+    assert template_url("https://x.com/shop/page/3/", "page", in_path=True) == "https://x.com/shop/page/{n}/"
+
+
+def test_page_number_reads_query_and_path():
+    assert [(param, number) for _, param, number in page_number("https://x.com/s?k=tv&page=3")] == [("page", 3)]
+    assert [(param, number) for _, param, number in page_number("https://x.com/shop/page/4/")] == [("page", 4)]
+    assert page_number("https://x.com/shop/") == []
+
+
+def test_is_cursor_url():
+    assert is_cursor_url("https://x.com/list?cursor=eyJpZCI6MX0")
+    assert not is_cursor_url("https://x.com/list?page=2")
+
+
+def test_series_from_a_first_page():
+    result = detect_pagination_heuristic("https://x.com/list", numbered_links("https://x.com/list?page={}", [1, 2, 3]))
+    assert result.url_template == "https://x.com/list?page={n}"
+    assert expanded(result) == ["https://x.com/list?page=2", "https://x.com/list?page=3"]
+    assert result.confidence >= 0.7
+
+
+def test_series_from_a_middle_page_starts_after_it():
+    result = detect_pagination_heuristic("https://x.com/list?page=3",
+                                         numbered_links("https://x.com/list?page={}", [1, 2, 4, 5]))
+    assert expanded(result) == ["https://x.com/list?page=4", "https://x.com/list?page=5"]
+
+
+def test_series_from_the_last_page_expands_to_nothing():
+    result = detect_pagination_heuristic("https://x.com/list?page=5",
+                                         numbered_links("https://x.com/list?page={}", [1, 2, 3, 4]))
+    assert expanded(result) == []
+
+
+def test_offset_series_steps_by_the_page_size():
+    result = detect_pagination_heuristic("https://x.com/list?start=20",
+                                         numbered_links("https://x.com/list?start={}", [0, 40, 60]))
+    assert result.kind == "offset"
+    assert expanded(result) == ["https://x.com/list?start=40", "https://x.com/list?start=60"]
+
+
+def test_path_series():
+    result = detect_pagination_heuristic("https://x.com/shop/page/2/",
+                                         numbered_links("https://x.com/shop/page/{}/", [1, 3, 4]))
+    assert expanded(result) == ["https://x.com/shop/page/3/", "https://x.com/shop/page/4/"]
+
+
+def test_rel_next_cursor_is_not_expanded():
+    html = '<html><body><a rel="next" href="/list?cursor=abcDEF">Next</a></body></html>'
+    result = detect_pagination_heuristic("https://x.com/list", html_content=html)
+    assert result.kind == "cursor"
+    assert result.next_url == "https://x.com/list?cursor=abcDEF"
+    assert result.url_template is None
+    assert result.confidence >= 0.9
+
+
+def test_lone_next_link_becomes_an_open_ended_template():
+    html = '<html><body><a href="/s?k=tv&page=2">Next</a></body></html>'
+    result = detect_pagination_heuristic("https://www.amazon.com/s?k=tv", html_content=html)
+    assert result.url_template == "https://www.amazon.com/s?k=tv&page={n}"
+    assert (result.start, result.end) == (2, None)
+
+
+def test_next_link_template_steps_offsets_from_the_current_page():
+    template = next_link_template("https://x.com/list?offset=40", "https://x.com/list?offset=20")
+    assert template["kind"] == "offset"
+    assert (template["start"], template["step"]) == (40, 20)
+
+
+def test_no_pagination_and_other_sites_are_ignored():
+    result = detect_pagination_heuristic("https://x.com/about", "[Home](/) [Contact](/contact) "
+                                         + numbered_links("https://other.com/list?page={}", [1, 2, 3]))
+    assert result.confidence == 0.0
+    assert result.url_template is None and result.next_url is None
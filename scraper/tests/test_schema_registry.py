@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from schema_registry import (infer_field_type, parse_field, parse_int_column, parse_money_column,
+                             parse_number_column, parse_url_column, typed_dataframe)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("R 2,499.00", 2499.0),
+    ("2.499,00 €", 2499.0),
+    ("2 499", 2499.0),
+    ("1.234.567", 1234567.0),
+    ("4.1 out of 5 stars", 4.1),
+    ("12", 12.0),
+    ("-3,5", -3.5),
+])
+def test_parse_number_column(text, expected):
+    assert parse_number_column(pd.Series([text]))[0] == pytest.approx(expected)
+
+
+def test_parse_number_column_without_a_number():
+    assert parse_number_column(pd.Series(["Call for price", None])).isna().all()
+
+
+def test_parse_money_column_finds_the_currency():
+    amount, currency = parse_money_column(pd.Series(["R 2,499.00", "$19.99", "EUR 5", "12"]))
+    assert list(amount) == [2499.0, 19.99, 5.0, 12.0]
+    assert list(currency.fillna("")) == ["R", "$", "EUR", ""]
+
+
+def test_parse_money_column_ignores_capitalised_words():
+    amount, currency = parse_money_column(pd.Series(["NEW $999", "SALE 20", "USB EUR 15", "R$ 30"]))
+    assert list(amount) == [999.0, 20.0, 15.0, 30.0]
+    assert list(currency.fillna("")) == ["$", "", "EUR", "R$"]
+    assert typed_dataframe([{"price": "NEW $999"}], ["price"])["price_currency"][0] == "$"
+
+
+def test_parse_int_column():
+    assert list(parse_int_column(pd.Series(["1,234 ratings", "2.3K reviews", "7"]))) == [1234, 2300, 7]
+
+
+def test_parse_url_column():
+    urls = parse_url_column(pd.Series(["https://x.com/a", "/item/1", "www.x.com", "n/a"]))
+    assert list(urls.fillna("")) == ["https://x.com/a", "/item/1", "www.x.com", ""]
+
+
+@pytest.mark.parametrize("name, field_type", [
+    ("price", "money"), ("rating", "rating"), ("score", "rating"), ("reviews", "int"),
+    ("number_of_ratings", "int"), ("product_link", "url"), ("name", "text"),
+])
+def test_infer_field_type(name, field_type):
+    assert infer_field_type(name) == field_type
+
+
+def test_declared_type_wins_over_the_name():
+    assert parse_field("price:text").type == "text"
+    with pytest.raises(ValueError):
+        parse_field("price:euro")
+
+
+def test_typed_dataframe_keeps_unparsed_text():
+    df = typed_dataframe([
+        {"name": "A", "price": "$10.50", "score": "4.5", "reviews": "1,234 ratings"},
+        {"name": "B", "price": "Call for price", "score": "Excellent", "reviews": "12"},
+        {"name": "C", "price": "Free", "score": None, "reviews": None},
+    ])
+    assert list(df.columns) == ["name", "price", "price_currency", "price_raw", "score", "score_raw", "reviews"]
+    assert df["price"][0] == 10.5
+    assert list(df["price_raw"].fillna("")) == ["", "Call for price", "Free"]
+    assert list(df["score_raw"].fillna("")) == ["", "Excellent", ""]
+    assert list(df["reviews"].fillna(-1)) == [1234, 12, -1]
+
+
+def test_typed_dataframe_uses_declared_fields():
+    df = typed_dataframe([{"name": "A", "price": "$10"}], ["name", "price:text"])
+    assert df["price"][0] == "$10"
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import llm_gateway
+import scraper
+from llm_gateway import LLMResponse
+from model_router import ModelRouter
+from streaming_extraction import ListingStreamParser, strict_json_schema
+from scraper import create_dynamic_listing_model, create_listings_container_model, format_data
+
+
+def feed_in_pieces(text, size):
+    parser = ListingStreamParser()
+    listings = []
+    for start in range(0, len(text), size):
+        listings.extend(parser.feed(text[start:start + size]))
+    return listings
+
+
+def test_listings_arrive_as_soon_as_they_close():
+    parser = ListingStreamParser()
+    assert parser.feed('{"listings": [{"name": "A"}, {"na') == [{"name": "A"}]
+    assert parser.feed('me": "B"}') == [{"name": "B"}]
+    assert parser.feed("]}") == []
+
+
+def test_any_split_of_the_stream_gives_the_same_listings():
+    listings = [{"name": "Brace } and \" quote", "price": "$1"}, {"name": "[x]", "price": "{2}"}]
+    text = json.dumps({"listings": listings})
+    for size in (1, 2, 7, len(text)):
+        assert feed_in_pieces(text, size) == listings
+
+
+def test_malformed_listing_is_skipped():
+    parser = ListingStreamParser()
+    assert parser.feed('{"listings": [{"name": "A",}, {"name": "B"}]}') == [{"name": "B"}]
+
+
+def test_strict_schema_requires_every_field():
+    container = create_listings_container_model(create_dynamic_listing_model(["name", "price"]))
+    schema = strict_json_schema(container)
+    listing = next(iter(schema["$defs"].values()))
+    assert listing["required"] == ["name", "price"]
+    assert listing["additionalProperties"] is False
+    assert schema["required"] == ["listings"]
+
+
+class RecordingGateway:
+    def __init__(self):
+        self.calls = []
+
+    def parse(self, model, messages, response_model):
+        self.calls.append(("parse", model, response_model))
+        return LLMResponse(None, 10, 5, model, "openai", 0.1, parsed=response_model(listings=[{"name": "A"}]))
+
+    def chat(self, model, messages, json_mode=False):
+        self.calls.append(("chat", model, json_mode))
+        return LLMResponse('{"listings": [{"name": "B"}]}', 10, 5, model, "groq", 0.1)
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "get_api_key", lambda name: "sk-test")
+    router = ModelRouter(log_path=None)
+    recording = RecordingGateway()
+    monkeypatch.setattr(scraper, "get_router", lambda: router)
+    monkeypatch.setattr(scraper, "get_gateway", lambda: recording)
+    return recording
+
+
+def test_openai_extractions_use_the_container_model_as_structured_output(gateway):
+    listing_model = create_dynamic_listing_model(["name"])
+    container_model = create_listings_container_model(listing_model)
+    data, token_counts = format_data("# A", container_model, listing_model, "gpt-4o-mini", use_cache=False)
+    assert gateway.calls == [("parse", "gpt-4o-mini", container_model)]
+    assert data == {"listings": [{"name": "A"}]}
+    assert (token_counts["input_tokens"], token_counts["output_tokens"]) == (10, 5)
+
+
+def test_other_providers_are_asked_for_a_json_object(gateway):
+    listing_model = create_dynamic_listing_model(["name"])
+    container_model = create_listings_container_model(listing_model)
+    data, _ = format_data("# B", container_model, listing_model, "Groq Llama3.1 70b", use_cache=False)
+    assert gateway.calls == [("chat", "Groq Llama3.1 70b", True)]
+    assert data == {"listings": [{"name": "B"}]}
@@ -0,0 +1,20 @@
+from url_utils import canonicalize_url, normalize_url
+
+
+def test_normalize_url_lowercases_and_drops_defaults():
+    assert normalize_url("HTTPS://Example.COM:443/a?b=2&a=1#frag") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com") == "http://example.com/"
+
+
+def test_normalize_url_keeps_other_ports_path_case_and_blank_values():
+    assert normalize_url("http://Example.com:8080/Path?q=") == "http://example.com:8080/Path?q="
+
+
+def test_canonicalize_url_drops_tracking_parameters():
+    assert canonicalize_url("https://example.com/p?utm_source=x&id=3&gclid=abc") == "https://example.com/p?id=3"
+    assert canonicalize_url("https://example.com/p?utm_medium=email") == "https://example.com/p"
+
+
+def test_canonicalize_url_matches_spellings_of_one_page():
+    assert (canonicalize_url("https://EXAMPLE.com/list?page=2&q=tv&fbclid=1#top")
+            == canonicalize_url("https://example.com:443/list?q=tv&page=2"))
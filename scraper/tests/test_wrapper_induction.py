@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+import wrapper_induction
+from wrapper_induction import (TemplateStore, agreement, extract_with_templates, extract_with_templates_async,
+                               induce_template)
+
+FIELDS = ["name", "price", "url"]
+
+
+def page(products):
+    cards = "".join(
+        f'<li class="product card"><a href="/p/{slug}"><h2 class="title">{name}</h2></a>'
+        f'<span class="price">R {price}</span><button>Add to cart</button></li>'
+        for slug, name, price in products)
+    return (f'<html><body><nav><a href="/">Home</a><a href="/about">About us</a></nav>'
+            f'<main><ul class="products">{cards}</ul></main><footer>Shop Ltd</footer></body></html>')
+
+
+FIRST = [("kettle", "Steel Kettle", "499.00"), ("toaster", "Two Slice Toaster", "899.00"),
+         ("blender", "Glass Blender", "1,299.00"), ("iron", "Steam Iron", "349.00")]
+SECOND = [("mixer", "Stand Mixer", "2,499.00"), ("fryer", "Air Fryer", "1,099.00"),
+          ("grill", "Sandwich Grill", "399.00")]
+
+
+def listings(products, base="https://shop.example"):
+    return [{"name": name, "price": f"R {price}", "url": f"{base}/p/{slug}"} for slug, name, price in products]
+
+
+def test_induced_template_extracts_other_pages_of_the_site():
+    template = induce_template(page(FIRST), listings(FIRST), FIELDS, "https://shop.example/list")
+    assert template is not None
+    assert template.confidence == 1.0
+    assert template.apply(page(SECOND), "https://shop.example/list?page=2") == listings(SECOND)
+
+
+def test_no_template_from_too_few_listings():
+    assert induce_template(page(FIRST[:2]), listings(FIRST[:2]), FIELDS) is None
+
+
+def test_agreement():
+    llm = listings(FIRST)
+    assert agreement(llm, llm, FIELDS) == 1.0
+    assert agreement(llm[:2], llm, FIELDS) == 0.5
+    assert agreement(listings(SECOND), llm, FIELDS) == 0.0
+    assert agreement([{"name": "Steel Kettle 1L", "price": "R 499.00", "url": "https://shop.example/p/kettle"}],
+                     llm[:1], FIELDS) == 1.0
+    assert agreement([], [], FIELDS) == 1.0
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    template_store = TemplateStore(path=str(tmp_path / "templates.json"))
+    monkeypatch.setattr(wrapper_induction, "get_template_store", lambda: template_store)
+    monkeypatch.setattr(wrapper_induction, "TEMPLATE_VERIFY_EVERY", 2)
+    return template_store
+
+
+def run(url, products, llm_listings):
+    calls = []
+
+    def llm_extract():
+        calls.append(url)
+        return {"listings": llm_listings}, {"input_tokens": 100, "output_tokens": 10}
+
+    data, token_counts = extract_with_templates(url, page(products), FIELDS, llm_extract)
+    return data, token_counts, calls
+
+
+def test_template_replaces_the_llm_and_is_verified_and_relearned(store):
+    base = "https://shop.example/list"
+    # First page: the LLM extracts it and a template is learned from its listings
+    data, _, calls = run(base, FIRST, listings(FIRST))
+    assert calls and data == {"listings": listings(FIRST)}
+    assert store.get("shop.example", FIELDS) is not None
+
+    # Next page: the template alone, at no cost
+    data, token_counts, calls = run(f"{base}?page=2", SECOND, [])
+    assert not calls
+    assert data == {"listings": listings(SECOND)}
+    assert token_counts == {"input_tokens": 0, "output_tokens": 0}
+
+    # Every TEMPLATE_VERIFY_EVERY-th page is checked; an LLM that disagrees gets the template relearned
+    disagreeing = [{"name": f"Other {n}", "price": "R 1.00", "url": f"https://shop.example/p/o{n}"} for n in range(3)]
+    data, _, calls = run(f"{base}?page=3", SECOND, disagreeing)
+    assert calls and data == {"listings": disagreeing}
+    assert store.get("shop.example", FIELDS) is None  # the page's listings can't be found in it to relearn
+
+    # With no template left the LLM is asked again and the template learned anew
+    _, _, calls = run(f"{base}?page=4", SECOND, listings(SECOND))
+    assert calls
+    assert store.get("shop.example", FIELDS).uses == 0
+
+
+def test_async_extraction_learns_and_applies_templates(store):
+    calls = []
+
+    async def llm_extract():
+        calls.append(1)
+        return {"listings": listings(FIRST)}, {"input_tokens": 100, "output_tokens": 10}
+
+    async def run_pages():
+        first = await extract_with_templates_async("https://shop.example/list", page(FIRST), FIELDS, llm_extract)
+        second = await extract_with_templates_async("https://shop.example/list?page=2", page(SECOND), FIELDS,
+                                                    llm_extract)
+        return first, second
+
+    (first, _), (second, token_counts) = asyncio.run(run_pages())
+    assert calls == [1]
+    assert first == {"listings": listings(FIRST)}
+    assert second == {"listings": listings(SECOND)}
+    assert token_counts == {"input_tokens": 0, "output_tokens": 0}
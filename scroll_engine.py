@@ -0,0 +1,211 @@
+# scroll_engine.py
+
+"""
+Adaptive, event-driven scrolling for Selenium pages.
+
+Instead of sleeping a fixed time after each scroll, the page is watched with a
+MutationObserver and the Resource Timing API: after every scroll we wait until the
+DOM and the network have been quiet for SCROLL_QUIET_MS, then stop once the page
+stops growing, a target item count is reached, or the time budget runs out.
+How many scrolls each domain actually needed is remembered to cap later pages.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from assets import (
+    CACHE_DIR,
+    NUMBER_SCROLL,
+    SCROLL_MAX_SECONDS,
+    SCROLL_MAX_STEPS,
+    SCROLL_PROFILES_FILE,
+    SCROLL_QUIET_MS,
+    SCROLL_SETTLE_TIMEOUT_MS,
+)
+
+# Scrolls to the bottom (optionally), then resolves once the DOM and network have been quiet
+SETTLE_SCRIPT = """
+const [quietMs, timeoutMs, itemSelector, doScroll] = arguments;
+const done = arguments[arguments.length - 1];
+if (!window.__scrollWatch) {
+    window.__scrollWatch = {mutations: 0, lastMutation: performance.now()};
+    if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(10000);
+    new MutationObserver(records => {
+        window.__scrollWatch.mutations += records.length;
+        window.__scrollWatch.lastMutation = performance.now();
+    }).observe(document.documentElement, {childList: true, subtree: true});
+}
+const watch = window.__scrollWatch;
+const lastNetworkActivity = () => {
+    let last = 0;
+    for (const entry of performance.getEntriesByType('resource')) last = Math.max(last, entry.responseEnd || entry.startTime);
+    return last;
+};
+const countItems = () => itemSelector ? document.querySelectorAll(itemSelector).length : null;
+const height = () => document.body ? document.body.scrollHeight : 0;
+const startMutations = watch.mutations;
+if (doScroll) window.scrollTo(0, height());
+const started = performance.now();
+const check = () => {
+    const now = performance.now();
+    const quiet = now - watch.lastMutation >= quietMs && now - lastNetworkActivity() >= quietMs;
+    if ((quiet && now - started >= quietMs) || now - started >= timeoutMs) {
+        done({height: height(), mutations: watch.mutations - startMutations, items: countItems(), settled: quiet});
+    } else {
+        setTimeout(check, 50);
+    }
+};
+check();
+"""
+
+
+@dataclass
+class ScrollReport:
+    url: str
+    scrolls: int
+    productive_scrolls: int
+    elapsed_ms: float
+    final_height: int
+    items: Optional[int]
+    stop_reason: str
+
+
+class ScrollProfiles:
+    """Learned per-domain scrolling behaviour, persisted between runs."""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, SCROLL_PROFILES_FILE)):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._profiles: Dict[str, Dict] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._profiles = {}
+
+    def limits_for(self, domain: str):
+        """Return (max_scrolls, unproductive_scrolls_before_stop) for a domain."""
+        profile = self._profiles.get(domain)
+        if not profile:
+            return SCROLL_MAX_STEPS, NUMBER_SCROLL
+        max_scrolls = min(SCROLL_MAX_STEPS, math.ceil(profile["max_productive"] * 1.5) + NUMBER_SCROLL)
+        # Pages that never grew when scrolled only need one confirming scroll
+        patience = 1 if profile["pages"] >= 3 and profile["max_productive"] == 0 else NUMBER_SCROLL
+        return max_scrolls, patience
+
+    def record(self, domain: str, report: ScrollReport):
+        with self._lock:
+            profile = self._profiles.setdefault(domain, {"pages": 0, "max_productive": 0, "avg_scrolls": 0.0,
+                                                         "avg_elapsed_ms": 0.0})
+            profile["pages"] += 1
+            # Hitting the cap means the page might have had more to load; don't let that shrink the cap
+            profile["max_productive"] = max(profile["max_productive"], report.productive_scrolls)
+            weight = 1 / min(profile["pages"], 10)
+            profile["avg_scrolls"] += weight * (report.scrolls - profile["avg_scrolls"])
+            profile["avg_elapsed_ms"] += weight * (report.elapsed_ms - profile["avg_elapsed_ms"])
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self._profiles, f, indent=4)
+            except OSError as e:
+                logging.warning(f"Could not save scroll profiles to {self.path}: {e}")
+
+
+_profiles: Optional[ScrollProfiles] = None
+_reports = deque(maxlen=500)
+
+
+def get_scroll_profiles() -> ScrollProfiles:
+    global _profiles
+    if _profiles is None:
+        _profiles = ScrollProfiles()
+    return _profiles
+
+
+def get_scroll_reports() -> List[Dict]:
+    """Reports for the most recently scrolled pages, newest last."""
+    return [asdict(report) for report in _reports]
+
+
+def adaptive_scroll(driver, target_items: Optional[int] = None, item_selector: Optional[str] = None,
+                    max_seconds: float = SCROLL_MAX_SECONDS, max_scrolls: Optional[int] = None,
+                    learn: bool = True) -> ScrollReport:
+    """
+    Scroll the current page until it stops loading new content.
+
+    Args:
+        driver: Selenium WebDriver with the page already loaded.
+        target_items (int): Stop as soon as `item_selector` matches at least this many elements.
+        item_selector (str): CSS selector for listing items, used with target_items.
+        max_seconds (float): Time budget for the whole scroll session.
+        max_scrolls (int): Override the (learned) cap on scrolls.
+        learn (bool): Record the outcome in the per-domain scroll profiles.
+
+    Returns:
+        ScrollReport: How many scrolls and how long the page actually needed.
+    """
+    url = driver.current_url
+    domain = urlparse(url).netloc.lower()
+    profiles = get_scroll_profiles()
+    learned_max, patience = profiles.limits_for(domain)
+    max_scrolls = learned_max if max_scrolls is None else max_scrolls
+
+    started = time.monotonic()
+    deadline = started + max_seconds
+    driver.set_script_timeout(SCROLL_SETTLE_TIMEOUT_MS / 1000 + 5)
+
+    def settle(do_scroll: bool) -> Dict:
+        remaining_ms = max(0.0, (deadline - time.monotonic()) * 1000)
+        timeout_ms = min(SCROLL_SETTLE_TIMEOUT_MS, remaining_ms)
+        return driver.execute_async_script(SETTLE_SCRIPT, SCROLL_QUIET_MS, timeout_ms, item_selector, do_scroll)
+
+    # Let the initial render finish before measuring
+    state = settle(do_scroll=False)
+    height, items = state["height"], state["items"]
+    scrolls = productive = unproductive = 0
+    stop_reason = "max scrolls"
+
+    while scrolls < max_scrolls:
+        if target_items and items is not None and items >= target_items:
+            stop_reason = "target items reached"
+            break
+        if time.monotonic() >= deadline:
+            stop_reason = "time budget exhausted"
+            break
+
+        state = settle(do_scroll=True)
+        scrolls += 1
+        grew = state["height"] > height or (state["items"] or 0) > (items or 0)
+        height, items = state["height"], state["items"]
+        if grew:
+            productive += 1
+            unproductive = 0
+        else:
+            unproductive += 1
+            if unproductive >= patience:
+                stop_reason = "content stopped growing"
+                break
+    else:
+        if target_items and items is not None and items >= target_items:
+            stop_reason = "target items reached"
+
+    report = ScrollReport(
+        url=url,
+        scrolls=scrolls,
+        productive_scrolls=productive,
+        elapsed_ms=round((time.monotonic() - started) * 1000, 1),
+        final_height=height,
+        items=items,
+        stop_reason=stop_reason,
+    )
+    _reports.append(report)
+    if learn and domain:
+        profiles.record(domain, report)
+    return report
@@ -5,7 +5,6 @@ from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.agents import AgentType, initialize_agent
 from langchain.tools import Tool
 from langchain.memory import ConversationBufferMemory
@@ -59,6 +58,9 @@ from selenium.webdriver.chrome.options import Options
 from selenium import webdriver
 from io import StringIO
 
+from http_fetcher import cached_get
+from llm_gateway import get_chat_model
+
 
 # Load environment variables
 load_dotenv()
@@ -372,7 +374,7 @@ ANALYSIS_PROMPTS = [
 # Agent 1: Healthcare Research Agent
 class HealthcareResearchAgent:
     def __init__(self, api_key):
-        self.llm = ChatOpenAI(temperature=0, model=MODEL_NAME)
+        self.llm = get_chat_model(MODEL_NAME)
         self.statistics = KEY_STATISTICS
         self.data_sources = DATA_SOURCES
         self.categories = STATISTICS_CATEGORIES
@@ -436,7 +438,7 @@ class HealthcareResearchAgent:
                 search_url = f"https://www.google.com/search?q={quote(query)}&num={num_results}"
                 headers = {'User-Agent': self.get_random_user_agent()}
                 
-                response = requests.get(search_url, headers=headers, timeout=10)
+                response = cached_get(search_url, headers=headers, timeout=10)
                 soup = BeautifulSoup(response.text, 'html.parser')
                 
                 # Parse Google search results
@@ -473,7 +475,7 @@ class HealthcareResearchAgent:
                 search_url = f"https://html.duckduckgo.com/html/?q={quote(query)}"
                 headers = {'User-Agent': self.get_random_user_agent()}
                 
-                response = requests.get(search_url, headers=headers, timeout=10)
+                response = cached_get(search_url, headers=headers, timeout=10)
                 soup = BeautifulSoup(response.text, 'html.parser')
                 
                 # Parse DuckDuckGo search results
@@ -618,7 +620,7 @@ class HealthcareResearchAgent:
                     try:
                         if result.get('url'):
                             headers = {'User-Agent': self.get_random_user_agent()}
-                            page_response = requests.get(result['url'], headers=headers, timeout=8)
+                            page_response = cached_get(result['url'], headers=headers, timeout=8)
                             page_soup = BeautifulSoup(page_response.text, 'html.parser')
                             
                             # Look for specific statistics in the page content
@@ -760,7 +762,7 @@ class HealthcareResearchAgent:
                             'User-Agent': self.get_random_user_agent(),
                             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
                         }
-                        response = requests.get(base_url, headers=headers, timeout=10)
+                        response = cached_get(base_url, headers=headers, timeout=10)
                         soup = BeautifulSoup(response.text, 'html.parser')
                         
                         # Look for population data in prominent elements
@@ -810,7 +812,7 @@ class HealthcareResearchAgent:
                                 'User-Agent': self.get_random_user_agent(),
                                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
                             }
-                            response = requests.get(url, headers=headers, timeout=10)
+                            response = cached_get(url, headers=headers, timeout=10)
                             soup = BeautifulSoup(response.text, 'html.parser')
                             
                             # Look for data tables
@@ -1123,7 +1125,7 @@ class DataStructuringAgent:
 # Agent 3: Medical Data Cleaning Agent
 class MedicalDataCleaningAgent:
     def __init__(self, api_key):
-        self.llm = ChatOpenAI(temperature=0, model=MODEL_NAME)
+        self.llm = get_chat_model(MODEL_NAME)
     
     def clean_medical_data(self, df):
         """Clean and standardize medical data."""
@@ -1164,7 +1166,7 @@ class MedicalDataCleaningAgent:
 # Agent 4: Medical Analysis Agent
 class MedicalAnalysisAgent:
     def __init__(self, api_key):
-        self.llm = ChatOpenAI(temperature=0, model=MODEL_NAME)
+        self.llm = get_chat_model(MODEL_NAME)
         self.tools = [
             Tool(
                 name="calculate_relative_risk",
@@ -1588,11 +1590,7 @@ class MedicalAnalysisAgent:
 # Agent 5: Healthcare Chat Agent
 class HealthcareChatAgent:
     def __init__(self, api_key):
-        self.llm = ChatOpenAI(
-            temperature=0,
-            model="gpt-4",
-            api_key=api_key
-        )
+        self.llm = get_chat_model("gpt-4", api_key=api_key)
         self.current_df = None
         self.current_country = None
         self.initialize_tools()
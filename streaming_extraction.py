@@ -0,0 +1,280 @@
+# streaming_extraction.py
+
+"""
+Streaming structured extraction.
+
+format_data waits for the whole JSON completion before anything can be shown or saved.
+In streaming mode the request uses strict structured output built from the dynamic
+container model, the completion is streamed, and ListingStreamParser picks each listing
+out of the partial JSON as soon as its closing brace arrives. Listings are handed to the
+caller (UI callback, JSONL writer) one by one, so the first row shows up after roughly one
+second instead of after the whole completion.
+"""
+
+import copy
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Type
+
+from pydantic import BaseModel
+
+from assets import (
+    BOILERPLATE_ENABLED,
+    EXTRACTION_CACHE_ENABLED,
+    EXTRACTION_CHUNK_TOKENS,
+    USER_MESSAGE,
+)
+from boilerplate_filter import strip_site_boilerplate_chunks
+from chunking import chunk_markdown, listing_key
+from extraction_cache import get_extraction_cache
+from llm_gateway import get_gateway, resolve_model
+from metering import metering_context
+from scraper import (
+    calculate_price,
+    create_dynamic_listing_model,
+    create_listings_container_model,
+    generate_system_message,
+    save_formatted_data,
+    save_raw_data,
+)
+
+
+def _tighten(node):
+    if isinstance(node, list):
+        for item in node:
+            _tighten(item)
+        return
+    if not isinstance(node, dict):
+        return
+    node.pop("title", None)
+    node.pop("default", None)
+    if "properties" in node:
+        node["additionalProperties"] = False
+        node["required"] = list(node["properties"])
+        for child in node["properties"].values():
+            _tighten(child)
+    for key in ("items", "anyOf", "allOf"):
+        if key in node:
+            _tighten(node[key])
+    for child in node.get("$defs", {}).values():
+        _tighten(child)
+
+
+def strict_json_schema(model: Type[BaseModel]) -> Dict:
+    """JSON schema of a pydantic model in the form strict structured output accepts."""
+    schema = copy.deepcopy(model.model_json_schema())
+    _tighten(schema)
+    return schema
+
+
+def structured_response_format(container_model: Type[BaseModel]) -> Dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": container_model.__name__, "schema": strict_json_schema(container_model),
+                        "strict": True},
+    }
+
+
+class ListingStreamParser:
+    """
+    Incremental parser for a streamed {"listings": [{...}, {...}]} object.
+
+    feed() takes the next piece of the completion and returns the listings that became
+    complete with it. Only the text of the listing being received is kept in memory.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._array_open = False
+        self._array_seen = False
+        self._object_start: Optional[int] = None
+
+    def feed(self, delta: str) -> List[Dict]:
+        self._text += delta
+        listings = []
+        for index in range(self._position, len(self._text)):
+            char = self._text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and not self._array_seen:
+                    # The container holds a single array: the listings
+                    self._array_open = self._array_seen = True
+                elif char == "{" and self._depth == 3 and self._array_open:
+                    self._object_start = index
+            elif char in "}]":
+                if char == "}" and self._depth == 3 and self._object_start is not None:
+                    try:
+                        listings.append(json.loads(self._text[self._object_start:index + 1]))
+                    except json.JSONDecodeError as e:
+                        logging.warning(f"Skipping malformed listing in stream: {e}")
+                    self._object_start = None
+                elif char == "]" and self._depth == 2:
+                    self._array_open = False
+                self._depth -= 1
+
+        # Drop everything that has been consumed, except an unfinished listing
+        if self._object_start is not None:
+            self._text = self._text[self._object_start:]
+            self._object_start = 0
+        else:
+            self._text = ""
+        self._position = len(self._text)
+        return listings
+
+
+def resolve_model_provider(model: str) -> Optional[str]:
+    try:
+        return resolve_model(model)[0]
+    except ValueError:
+        return None
+
+
+class StreamingExtraction:
+    """
+    Iterate over it to receive listings as the model produces them.
+
+    After iteration, `data`, `token_counts` and `first_listing_seconds` describe the whole extraction.
+    Given the page url, the site's boilerplate is removed from each chunk, which stays cached
+    under its unfiltered text like in format_data_chunked.
+    """
+
+    def __init__(self, markdown_content: str, container_model: Type[BaseModel], listing_model: Type[BaseModel],
+                 selected_model: str, max_tokens: int = EXTRACTION_CHUNK_TOKENS,
+                 use_cache: bool = EXTRACTION_CACHE_ENABLED, url: Optional[str] = None):
+        self.markdown_content = markdown_content
+        self.url = url
+        self.container_model = container_model
+        self.listing_model = listing_model
+        # Strict structured streaming needs an OpenAI model; others (and AUTO_MODEL) use gpt-4o-mini
+        self.model = selected_model if resolve_model_provider(selected_model) == "openai" else "gpt-4o-mini"
+        self.max_tokens = max_tokens
+        self.use_cache = use_cache
+        self.listings: List[Dict] = []
+        self.token_counts = {"input_tokens": 0, "output_tokens": 0}
+        self.first_listing_seconds: Optional[float] = None
+        self._started: Optional[float] = None
+        self._seen = set()
+
+    @property
+    def data(self) -> Dict:
+        return {"listings": self.listings}
+
+    def _deliver(self, listing) -> bool:
+        key = listing_key(listing)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self.listings.append(listing)
+        if self.first_listing_seconds is None:
+            self.first_listing_seconds = time.monotonic() - self._started
+        return True
+
+    def __iter__(self) -> Iterator[Dict]:
+        self._started = time.monotonic()
+        fields = list(self.listing_model.model_fields)
+        system_message = generate_system_message(self.listing_model)
+        response_format = structured_response_format(self.container_model)
+        cache = get_extraction_cache() if self.use_cache else None
+
+        chunks = chunk_markdown(self.markdown_content, self.max_tokens, self.model) or [self.markdown_content]
+        prompts = strip_site_boilerplate_chunks(self.url, chunks) if self.url and BOILERPLATE_ENABLED else chunks
+        for chunk, prompt in zip(chunks, prompts, strict=True):
+            cached = cache.get(chunk, fields, self.model) if cache else None
+            if cached is not None:
+                for listing in cached.data.get("listings", []):
+                    if self._deliver(listing):
+                        yield listing
+                continue
+
+            parser = ListingStreamParser()
+            chunk_listings = []
+            # Closed (and metered) even when the consumer stops reading listings midway
+            with get_gateway().stream_chat(
+                self.model,
+                [
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": USER_MESSAGE + prompt},
+                ],
+                response_format=response_format,
+            ) as stream:
+                for delta in stream:
+                    for listing in parser.feed(delta):
+                        chunk_listings.append(listing)
+                        if self._deliver(listing):
+                            yield listing
+
+            self.token_counts["input_tokens"] += stream.input_tokens
+            self.token_counts["output_tokens"] += stream.output_tokens
+            if cache:
+                cache.put(chunk, fields, self.model, {"listings": chunk_listings}, stream.token_counts)
+
+
+class JsonlListingWriter:
+    """Appends one listing per line and flushes it, so partial results are on disk while extraction runs."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8")  # noqa: SIM115 - the writer is the context manager, close() closes it
+
+    def write(self, listing: Dict):
+        self._file.write(json.dumps(listing, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scrape_url_streaming(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int,
+                         markdown: str, on_listing: Optional[Callable[[Dict], None]] = None):
+    """
+    Streaming counterpart of scrape_url: listings go to sorted_data_N.jsonl and `on_listing`
+    as they arrive, then the usual JSON and Excel files are written.
+    """
+    try:
+        save_raw_data(markdown, output_folder, f'rawData_{file_number}.md')
+        listing_model = create_dynamic_listing_model(fields)
+        container_model = create_listings_container_model(listing_model)
+
+        extraction = StreamingExtraction(markdown, container_model, listing_model, selected_model, url=url)
+        with metering_context(url=url, purpose="extraction"), \
+                JsonlListingWriter(os.path.join(output_folder, f'sorted_data_{file_number}.jsonl')) as writer:
+            for listing in extraction:
+                writer.write(listing)
+                if on_listing is not None:
+                    on_listing(listing)
+        if extraction.first_listing_seconds is not None:
+            print(f"First listing after {extraction.first_listing_seconds:.1f}s, {writer.count} listings streamed")
+
+        save_formatted_data(extraction.data, output_folder, f'sorted_data_{file_number}.json',
+                            f'sorted_data_{file_number}.xlsx', fields)
+        input_tokens, output_tokens, total_cost = calculate_price(extraction.token_counts, extraction.model)
+        return input_tokens, output_tokens, total_cost, extraction.data
+
+    except Exception as e:
+        print(f"An error occurred while processing {url}: {e}")
+        return 0, 0, 0, None
@@ -0,0 +1,100 @@
+# token_accounting.py
+
+"""
+Token counting shared by the scraper and the pagination detector.
+
+- Encoders are created once per model and cached.
+- Counts are memoised by a hash of the text, so the same markdown is never encoded twice.
+- Models without a local tokenizer (Gemini, Llama via LM Studio or Groq) use cl100k as a
+  close estimate, or a characters-per-token estimate when no encoder can be loaded.
+- Budget checks skip encoding entirely when the text is obviously short enough: a BPE
+  token always covers at least one byte, so text with fewer bytes than the budget fits.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+from assets import CHARS_PER_TOKEN
+
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+_counts: "OrderedDict[tuple, int]" = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def is_openai_model(model: str) -> bool:
+    return model.startswith(("gpt-", "o1", "o3", "o4", "text-embedding"))
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str) -> Optional[tiktoken.Encoding]:
+    """Cached tiktoken encoder for a model, or None when no encoder can be loaded (e.g. offline)."""
+    try:
+        if is_openai_model(model):
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                return tiktoken.get_encoding("o200k_base")
+        # Llama 3 and Gemini tokenizers are close to cl100k in tokens per character
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"No tokenizer available for {model}, falling back to estimates: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate that needs no tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Number of tokens `text` takes for `model`, memoised by content hash."""
+    if not text:
+        return 0
+    encoder = get_encoder(model)
+    key = (encoder.name if encoder else "estimate", hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+    with _counts_lock:
+        if key in _counts:
+            _counts.move_to_end(key)
+            return _counts[key]
+
+    count = len(encoder.encode(text, disallowed_special=())) if encoder else estimate_tokens(text)
+
+    with _counts_lock:
+        _counts[key] = count
+        if len(_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return count
+
+
+def fits_budget(text: str, max_tokens: int, model: str) -> bool:
+    """True if `text` is at most max_tokens tokens, without encoding it when that's obvious."""
+    if len(text.encode("utf-8")) <= max_tokens:
+        return True
+    return count_tokens(text, model) <= max_tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut text down to max_tokens tokens (or the equivalent number of characters without an encoder)."""
+    if fits_budget(text, max_tokens, model):
+        return text
+    encoder = get_encoder(model)
+    if encoder is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+
+
+def split_to_tokens(text: str, max_tokens: int, model: str):
+    """Split text into consecutive pieces of at most max_tokens tokens."""
+    encoder = get_encoder(model)
+    if encoder is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoder.encode(text, disallowed_special=())
+    return [encoder.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
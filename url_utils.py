@@ -0,0 +1,43 @@
+# url_utils.py
+
+"""
+URL helpers shared by the fetch cache and the crawler.
+"""
+
+from fnmatch import fnmatch
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from assets import URL_TRACKING_PARAMS
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalise a URL so equivalent spellings map to the same key.
+
+    Lowercases scheme and host, drops default ports and the fragment,
+    sorts query parameters and gives an empty path a trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    if parts.username:
+        credentials = parts.username + (f":{parts.password}" if parts.password else "")
+        netloc = f"{credentials}@{netloc}"
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), doseq=True)
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    normalize_url, also dropping tracking parameters (URL_TRACKING_PARAMS: utm_*, gclid, ...)
+    that don't change the page, so links to the same page from different places match.
+    """
+    parts = urlsplit(normalize_url(url))
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not any(fnmatch(name.lower(), pattern) for pattern in URL_TRACKING_PARAMS)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
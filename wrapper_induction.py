@@ -0,0 +1,432 @@
+# wrapper_induction.py
+
+"""
+Learned per-domain extraction templates (wrapper induction).
+
+Pages of the same site share their listing markup, so after the LLM has extracted one page
+the extracted values are located in that page's DOM and turned into selectors:
+
+1. Each field value is matched to the element whose text (or link/image attribute) holds it.
+2. The matched elements of each listing are grouped under their record element, the child of
+   the list container that all listings share.
+3. One XPath selects the records and one relative XPath per field selects the value, taking
+   the path shared by most listings.
+
+The template is replayed on the same page and only kept if it reproduces the LLM's listings.
+Later pages of the domain are then extracted by the template alone, with every
+TEMPLATE_VERIFY_EVERY-th page checked against the LLM; a template whose agreement drops, or
+that stops finding listings, is dropped and relearned from the LLM's extraction of that page.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from lxml import etree
+
+from assets import (
+    CACHE_DIR,
+    TEMPLATE_MIN_AGREEMENT,
+    TEMPLATE_MIN_FIELD_COVERAGE,
+    TEMPLATE_MIN_LISTINGS,
+    TEMPLATE_VERIFY_EVERY,
+    TEMPLATES_FILE,
+)
+from html_processing import WHITESPACE, clean_tree, parse_html
+from http_fetcher import get_domain
+
+VALUE_ATTRIBUTES = ["href", "src", "content", "title", "alt", "datetime", "data-price"]
+URL_ATTRIBUTES = {"href", "src"}
+MAX_MATCH_TEXT = 500
+
+
+def normalize_value(value) -> str:
+    return WHITESPACE.sub(" ", str(value if value is not None else "")).strip().lower()
+
+
+def _text(element) -> str:
+    return WHITESPACE.sub(" ", element.text_content()).strip()
+
+
+def _class_tokens(element) -> List[str]:
+    return [token for token in (element.get("class") or "").split() if not any(ch.isdigit() for ch in token)]
+
+
+def _step(element, classes: Optional[List[str]] = None) -> str:
+    """One XPath step for element: its tag, narrowed by id or class when it has them."""
+    if element.get("id") and not any(ch.isdigit() for ch in element.get("id")):
+        return f"{element.tag}[@id='{element.get('id')}']"
+    classes = _class_tokens(element) if classes is None else classes
+    if classes:
+        return f"{element.tag}[contains(concat(' ', normalize-space(@class), ' '), ' {classes[0]} ')]"
+    return element.tag
+
+
+def _ancestors(element) -> List:
+    chain = []
+    while element is not None:
+        chain.append(element)
+        element = element.getparent()
+    return chain
+
+
+def _common_ancestor(elements):
+    chains = [list(reversed(_ancestors(element))) for element in elements]
+    common = None
+    for level in zip(*chains, strict=False):  # chains differ in depth
+        if all(node is level[0] for node in level):
+            common = level[0]
+        else:
+            break
+    return common
+
+
+def _child_towards(ancestor, element):
+    """The child of `ancestor` on the path down to `element`."""
+    while element is not None and element.getparent() is not ancestor:
+        element = element.getparent()
+    return element
+
+
+class PageIndex:
+    """Short text and attribute values of a page, for locating extracted values."""
+
+    def __init__(self, tree, base_url: Optional[str]):
+        self.base_url = base_url
+        self.by_text: Dict[str, List] = {}
+        self.by_attribute: Dict[str, List[Tuple]] = {}
+        for element in tree.iter():
+            if not isinstance(element.tag, str):
+                continue
+            text = element.text_content()
+            if len(text) <= MAX_MATCH_TEXT:
+                self.by_text.setdefault(normalize_value(text), []).append(element)
+            for attribute in VALUE_ATTRIBUTES:
+                value = element.get(attribute)
+                if value:
+                    self.by_attribute.setdefault(normalize_value(value), []).append((element, attribute))
+                    if attribute in URL_ATTRIBUTES and base_url:
+                        self.by_attribute.setdefault(normalize_value(urljoin(base_url, value)), []).append(
+                            (element, attribute))
+
+    def locate(self, value) -> List[Tuple]:
+        """(element, attribute or None) pairs holding value, most specific elements first."""
+        key = normalize_value(value)
+        if not key:
+            return []
+        elements = self.by_text.get(key)
+        if elements:
+            # An element whose child has the same text is a wrapper; keep the innermost ones
+            candidates = set(elements)
+            return [(element, None) for element in elements
+                    if not any(child in candidates for child in element.iterchildren())]
+        return list(self.by_attribute.get(key, []))
+
+
+class ExtractionTemplate:
+    def __init__(self, record_xpath: str, fields: Dict[str, Dict], confidence: float = 0.0, uses: int = 0,
+                 verifications: int = 0, learned_at: Optional[float] = None):
+        self.record_xpath = record_xpath
+        self.fields = fields  # field name -> {"xpath": relative xpath, "attr": attribute or None}
+        self.confidence = confidence
+        self.uses = uses
+        self.verifications = verifications
+        self.learned_at = learned_at or time.time()
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ExtractionTemplate":
+        return cls(**data)
+
+    def apply(self, html_content, base_url: Optional[str] = None) -> List[Dict[str, str]]:
+        tree = clean_tree(parse_html(html_content))
+        return self.apply_to_tree(tree, base_url)
+
+    def apply_to_tree(self, tree, base_url: Optional[str] = None) -> List[Dict[str, str]]:
+        listings = []
+        try:
+            records = tree.xpath(self.record_xpath)
+        except etree.XPathError as e:
+            logging.warning(f"Invalid template xpath {self.record_xpath}: {e}")
+            return []
+        for record in records:
+            listing = {}
+            for name, selector in self.fields.items():
+                matches = record.xpath(selector["xpath"]) if selector else []
+                value = ""
+                if matches:
+                    element = matches[0]
+                    attribute = selector.get("attr")
+                    if attribute:
+                        value = (element.get(attribute) or "").strip()
+                        if attribute in URL_ATTRIBUTES and base_url and value:
+                            value = urljoin(base_url, value)
+                    else:
+                        value = _text(element)
+                listing[name] = value
+            if any(listing.values()):
+                listings.append(listing)
+        return listings
+
+
+def field_coverage(listings: List[Dict], fields: List[str]) -> float:
+    """Share of field values a set of listings actually filled."""
+    if not listings or not fields:
+        return 0.0
+    filled = sum(1 for listing in listings for field in fields if listing.get(field))
+    return filled / (len(listings) * len(fields))
+
+
+def _values_agree(template_value, llm_value) -> bool:
+    expected, actual = normalize_value(llm_value), normalize_value(template_value)
+    if not expected:
+        return True
+    return expected == actual or (expected in actual and len(actual) <= 2 * len(expected) + 20)
+
+
+def agreement(template_listings: List[Dict], llm_listings: List[Dict], fields: List[str]) -> float:
+    """Share of the LLM's listings the template reproduced (each template listing used once)."""
+    llm_listings = [listing for listing in llm_listings if isinstance(listing, dict)]
+    if not llm_listings:
+        return 1.0 if not template_listings else 0.0
+    unused = list(template_listings)
+    matched = 0
+    for llm_listing in llm_listings:
+        for index, template_listing in enumerate(unused):
+            same = sum(1 for field in fields if _values_agree(template_listing.get(field), llm_listing.get(field)))
+            if same >= 0.8 * len(fields):
+                matched += 1
+                del unused[index]
+                break
+    return matched / max(len(llm_listings), len(template_listings))
+
+
+def induce_template(html_content, listings: List[Dict], fields: List[str],
+                    base_url: Optional[str] = None) -> Optional[ExtractionTemplate]:
+    """Derive a record selector and per-field selectors from listings the LLM extracted from this page."""
+    listings = [listing for listing in listings if isinstance(listing, dict)]
+    if len(listings) < TEMPLATE_MIN_LISTINGS:
+        return None
+    tree = clean_tree(parse_html(html_content))
+    index = PageIndex(tree, base_url)
+
+    # 1. Locate each listing's values; keep listings where most fields were found exactly once
+    located = []
+    for listing in listings:
+        matches = {}
+        for field in fields:
+            candidates = index.locate(listing.get(field))
+            if len(candidates) == 1:
+                matches[field] = candidates[0]
+        if len(matches) >= max(1, (len(fields) + 1) // 2):
+            located.append(matches)
+    if len(located) < TEMPLATE_MIN_LISTINGS:
+        return None
+
+    # 2. Records: children of the container shared by all listings, one per listing
+    anchors = [_common_ancestor([element for element, _ in matches.values()]) for matches in located]
+    container = _common_ancestor(anchors)
+    if container is None:
+        return None
+    records = [_child_towards(container, anchor) if anchor is not container else None for anchor in anchors]
+    pairs = [(record, matches) for record, matches in zip(records, located, strict=True) if record is not None]
+    if len({id(record) for record, _ in pairs}) < TEMPLATE_MIN_LISTINGS:
+        return None
+
+    record_tag = Counter(record.tag for record, _ in pairs).most_common(1)[0][0]
+    pairs = [(record, matches) for record, matches in pairs if record.tag == record_tag]
+    shared_classes = set.intersection(*(set(_class_tokens(record)) for record, _ in pairs))
+    record_step = _step(pairs[0][0], [token for token in _class_tokens(pairs[0][0]) if token in shared_classes])
+    if "@id=" in record_step:
+        record_step = record_tag  # an id can't be shared by all records
+    container_steps = [_step(element) for element in reversed(_ancestors(container)[:3])]
+    record_xpath = "//" + "/".join(container_steps) + "/" + record_step
+
+    # 3. Per field, the relative path most listings agree on
+    field_selectors = {}
+    for field in fields:
+        paths = Counter()
+        for record, matches in pairs:
+            if field not in matches:
+                continue
+            element, attribute = matches[field]
+            steps = [_step(node) for node in reversed(_ancestors(element)[:_ancestors(element).index(record)])]
+            paths[("./" + "/".join(steps)) if steps else ".", attribute] += 1
+        if paths:
+            (xpath, attribute), _ = paths.most_common(1)[0]
+            field_selectors[field] = {"xpath": xpath, "attr": attribute}
+        else:
+            field_selectors[field] = None
+
+    template = ExtractionTemplate(record_xpath, field_selectors)
+    replayed = template.apply_to_tree(tree, base_url)
+    template.confidence = agreement(replayed, listings, fields)
+    return template
+
+
+class TemplateStore:
+    """Learned extraction templates per domain and field list, persisted between runs."""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, TEMPLATES_FILE)):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._templates: Dict[str, Dict[str, Dict]] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._templates = {}
+
+    @staticmethod
+    def fields_key(fields: List[str]) -> str:
+        return json.dumps(list(fields))
+
+    def get(self, domain: str, fields: List[str]) -> Optional[ExtractionTemplate]:
+        with self._lock:
+            data = self._templates.get(domain, {}).get(self.fields_key(fields))
+        return ExtractionTemplate.from_dict(data) if data else None
+
+    def put(self, domain: str, fields: List[str], template: ExtractionTemplate):
+        with self._lock:
+            self._templates.setdefault(domain, {})[self.fields_key(fields)] = template.as_dict()
+            self._save()
+
+    def drop(self, domain: str, fields: List[str]):
+        with self._lock:
+            self._templates.get(domain, {}).pop(self.fields_key(fields), None)
+            self._save()
+
+    def _save(self):
+        # Called with the lock held
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._templates, f, indent=4)
+        except OSError as e:
+            logging.warning(f"Could not save extraction templates to {self.path}: {e}")
+
+
+_store: Optional[TemplateStore] = None
+_store_lock = threading.Lock()
+_stats = Counter()
+
+
+def get_template_store() -> TemplateStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TemplateStore()
+        return _store
+
+
+def get_template_stats() -> Dict[str, int]:
+    """Pages extracted by template, verified, or sent to the LLM since start-up."""
+    return dict(_stats)
+
+
+def _learn(store: TemplateStore, domain: str, url: str, html_content, data, fields: List[str]):
+    listings = data.get("listings", []) if isinstance(data, dict) else []
+    try:
+        template = induce_template(html_content, listings, fields, url)
+    except Exception as e:
+        logging.warning(f"Could not induce an extraction template for {domain}: {e}")
+        return
+    if template is not None and template.confidence >= TEMPLATE_MIN_AGREEMENT:
+        store.put(domain, fields, template)
+        _stats["learned"] += 1
+        print(f"Learned extraction template for {domain} ({template.confidence:.0%} agreement)")
+
+
+def extract_with_templates(url: str, html_content, fields: List[str],
+                           llm_extract: Callable[[], Tuple[Dict, Dict]]) -> Tuple[Dict, Dict[str, int]]:
+    """
+    Extract listings with the domain's learned template, falling back to `llm_extract`.
+
+    Args:
+        url (str): Page URL, used for the domain and to resolve relative links.
+        html_content (str): The page's html.
+        fields (List[str]): Requested fields.
+        llm_extract (Callable): Runs the LLM extraction, returning (formatted_data, token_counts).
+    """
+    steps = _template_extraction(url, html_content, fields)
+    done, result = _advance(steps)
+    while not done:
+        done, result = _advance(steps, llm_extract())
+    return result
+
+
+async def extract_with_templates_async(url: str, html_content, fields: List[str],
+                                       llm_extract: Callable[[], Awaitable[Tuple[Dict, Dict]]]
+                                       ) -> Tuple[Dict, Dict[str, int]]:
+    """
+    Async counterpart of extract_with_templates; `llm_extract` returns an awaitable. Parsing
+    the page, inducing templates and saving them block, so those steps run in a worker thread.
+    """
+    steps = _template_extraction(url, html_content, fields)
+    done, result = await asyncio.to_thread(_advance, steps)
+    while not done:
+        llm_result = await llm_extract()
+        done, result = await asyncio.to_thread(_advance, steps, llm_result)
+    return result
+
+
+def _advance(steps, llm_result=None) -> Tuple[bool, Optional[Tuple[Dict, Dict[str, int]]]]:
+    """
+    Run a _template_extraction generator to its next request for the LLM: (False, None), or
+    (True, the page's result) once it returns. StopIteration can't cross a future, hence the pair.
+    """
+    try:
+        steps.send(llm_result)
+    except StopIteration as finished:
+        return True, finished.value
+    return False, None
+
+
+def _template_extraction(url: str, html_content, fields: List[str]):
+    """
+    The template-or-LLM decision as a generator shared by the sync and async entry points:
+    it yields whenever it needs the LLM's (formatted_data, token_counts), which the caller
+    sends back, and returns the page's result.
+    """
+    domain = get_domain(url)
+    store = get_template_store()
+    template = store.get(domain, fields)
+
+    if template is not None and template.confidence >= TEMPLATE_MIN_AGREEMENT:
+        listings = template.apply(html_content, url)
+        if len(listings) >= TEMPLATE_MIN_LISTINGS and field_coverage(listings, fields) >= TEMPLATE_MIN_FIELD_COVERAGE:
+            template.uses += 1
+            if template.uses % TEMPLATE_VERIFY_EVERY:
+                store.put(domain, fields, template)
+                _stats["templated"] += 1
+                return {"listings": listings}, {"input_tokens": 0, "output_tokens": 0}
+
+            # Spot check against the LLM; its result is the one returned for this page
+            data, token_counts = yield
+            score = agreement(listings, data.get("listings", []) if isinstance(data, dict) else [], fields)
+            template.verifications += 1
+            template.confidence = 0.5 * template.confidence + 0.5 * score
+            _stats["verified"] += 1
+            if score < TEMPLATE_MIN_AGREEMENT:
+                logging.info(f"Extraction template for {domain} disagreed with the LLM ({score:.0%}), relearning")
+                store.drop(domain, fields)
+                _learn(store, domain, url, html_content, data, fields)
+            else:
+                store.put(domain, fields, template)
+            return data, token_counts
+
+        # The markup changed or this page is laid out differently: relearn from the LLM's result
+        logging.info(f"Extraction template for {domain} found too little on {url}, falling back to the LLM")
+        store.drop(domain, fields)
+
+    _stats["llm"] += 1
+    data, token_counts = yield
+    _learn(store, domain, url, html_content, data, fields)
+    return data, token_counts